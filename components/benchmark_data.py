@@ -8,15 +8,21 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Iterable, Tuple
 import pandas as pd
-import yfinance as yf
 import threading
+import time
 import logging
 
+from components.market_data import get_provider
+from components.shared_cache import (
+    cache_get_entry, cache_set, cache_stored_at, try_acquire_lease, release_lease,
+)
+
 log = logging.getLogger(__name__)
 
 # Cache directory
 CACHE_DIR = Path.home() / ".pytr"
-BENCHMARK_CACHE_FILE = CACHE_DIR / "benchmark_cache.json"
+BENCHMARK_CACHE_FILE = CACHE_DIR / "benchmark_cache.json"  # legacy, read once for migration
+_SHARED_NAMESPACE = "benchmark"
 
 # Benchmark symbols
 BENCHMARKS = {
@@ -32,6 +38,7 @@ CACHE_VALIDITY_HOURS = 24
 
 # Global cache
 _benchmark_cache: Dict[str, pd.DataFrame] = {}
+_benchmark_stamps: Dict[str, float] = {}  # shared-cache timestamp of each in-process series
 _cache_loaded = False
 _fetch_lock = threading.Lock()
 
@@ -80,55 +87,72 @@ def _signature_transactions(transactions: List[Dict]) -> str:
         return "err"
 
 
-def _load_cache() -> Dict:
-    """Load benchmark cache from disk."""
-    global _benchmark_cache, _cache_loaded
-    
-    if BENCHMARK_CACHE_FILE.exists():
-        try:
-            data = json.loads(BENCHMARK_CACHE_FILE.read_text(encoding="utf-8"))
-            cached_at = datetime.fromisoformat(data.get("cached_at", "2000-01-01"))
-            age_hours = (datetime.now() - cached_at).total_seconds() / 3600
-            
-            if age_hours < CACHE_VALIDITY_HOURS:
-                # Convert cached data back to DataFrames
-                for symbol, records in data.get("benchmarks", {}).items():
-                    if records:
-                        df = pd.DataFrame(records)
-                        df['Date'] = pd.to_datetime(df['Date'])
-                        df = df.set_index('Date')
-                        _benchmark_cache[symbol] = df
-                _cache_loaded = True
-                log.debug("Loaded benchmark cache with %s indices", len(_benchmark_cache))
-                return data
-        except Exception as e:
-            log.debug("Error loading benchmark cache: %s", e)
-    
-    return {}
-
-
-def _save_cache():
-    """Save benchmark cache to disk."""
+def _load_legacy_json_cache() -> Dict[str, pd.DataFrame]:
+    """Read the pre-shared-cache benchmark_cache.json, if it is still fresh."""
+    frames: Dict[str, pd.DataFrame] = {}
+    if not BENCHMARK_CACHE_FILE.exists():
+        return frames
     try:
-        CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        
-        # Convert DataFrames to serializable format
-        benchmarks_data = {}
-        for symbol, df in _benchmark_cache.items():
-            if df is not None and len(df) > 0:
-                df_reset = df.reset_index()
-                df_reset['Date'] = df_reset['Date'].dt.strftime('%Y-%m-%d')
-                benchmarks_data[symbol] = df_reset[['Date', 'Close']].to_dict('records')
-        
-        data = {
-            "cached_at": datetime.now().isoformat(),
-            "benchmarks": benchmarks_data
-        }
-        
-        BENCHMARK_CACHE_FILE.write_text(json.dumps(data), encoding="utf-8")
-        log.debug("Saved benchmark cache with %s indices", len(benchmarks_data))
+        data = json.loads(BENCHMARK_CACHE_FILE.read_text(encoding="utf-8"))
+        cached_at = datetime.fromisoformat(data.get("cached_at", "2000-01-01"))
+        age_hours = (datetime.now() - cached_at).total_seconds() / 3600
+        if age_hours < CACHE_VALIDITY_HOURS:
+            for symbol, records in data.get("benchmarks", {}).items():
+                if records:
+                    df = pd.DataFrame(records)
+                    df['Date'] = pd.to_datetime(df['Date'])
+                    frames[symbol] = df.set_index('Date')
     except Exception as e:
-        log.debug("Error saving benchmark cache: %s", e)
+        log.debug("Error loading legacy benchmark cache: %s", e)
+    return frames
+
+
+def _load_cache() -> Dict:
+    """Load benchmark series from the cross-worker shared cache."""
+    global _benchmark_cache, _cache_loaded
+
+    max_age = CACHE_VALIDITY_HOURS * 3600
+    for symbol in BENCHMARKS:
+        entry = cache_get_entry(_SHARED_NAMESPACE, symbol, max_age=max_age)
+        if entry is not None:
+            _benchmark_cache[symbol], _benchmark_stamps[symbol] = entry
+
+    if not _benchmark_cache:
+        # One-time migration: seed the shared cache from the old JSON file
+        legacy = _load_legacy_json_cache()
+        if legacy:
+            _benchmark_cache.update(legacy)
+            _save_cache()
+
+    if _benchmark_cache:
+        _cache_loaded = True
+        log.debug("Loaded benchmark cache with %s indices", len(_benchmark_cache))
+    return dict(_benchmark_cache)
+
+
+def _save_cache(symbols: Optional[Iterable[str]] = None):
+    """Publish in-process benchmark series (all, or just *symbols*) to the shared cache."""
+    saved = 0
+    for symbol in list(symbols if symbols is not None else _benchmark_cache.keys()):
+        df = _benchmark_cache.get(symbol)
+        if df is not None and len(df) > 0:
+            stamp = cache_set(_SHARED_NAMESPACE, symbol, df[['Close']])
+            if stamp is not None:
+                _benchmark_stamps[symbol] = stamp
+                saved += 1
+    log.debug("Saved benchmark cache with %s indices", saved)
+
+
+def _sync_from_shared(symbol: str) -> None:
+    """Pick up a series another worker refreshed since we last loaded it."""
+    stamp = cache_stored_at(_SHARED_NAMESPACE, symbol)
+    if stamp is None or stamp <= _benchmark_stamps.get(symbol, 0):
+        return
+    if time.time() - stamp > CACHE_VALIDITY_HOURS * 3600:
+        return
+    entry = cache_get_entry(_SHARED_NAMESPACE, symbol)
+    if entry is not None:
+        _benchmark_cache[symbol], _benchmark_stamps[symbol] = entry
 
 
 def fetch_benchmark(symbol: str, start_date: datetime, end_date: datetime = None) -> Optional[pd.DataFrame]:
@@ -137,8 +161,7 @@ def fetch_benchmark(symbol: str, start_date: datetime, end_date: datetime = None
         end_date = datetime.now()
     
     try:
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(start=start_date, end=end_date)
+        df = get_provider().history(symbol, start=start_date, end=end_date)
         if len(df) > 0:
             return df[['Close']]
     except Exception as e:
@@ -148,25 +171,36 @@ def fetch_benchmark(symbol: str, start_date: datetime, end_date: datetime = None
 
 
 def prefetch_all_benchmarks(years_back: int = 6):
-    """Pre-fetch all benchmark data for the last N years."""
+    """Pre-fetch all benchmark data for the last N years.
+
+    Only one worker does the download; the others pick the result up from the
+    shared cache on their next lookup.
+    """
     global _benchmark_cache
     
-    with _fetch_lock:
-        log.info("Pre-fetching benchmark data...")
-        start_date = datetime.now() - timedelta(days=years_back * 365)
-        end_date = datetime.now()
-        
-        for symbol in BENCHMARKS.keys():
-            log.info("  Fetching %s (%s)...", symbol, BENCHMARKS[symbol]['name'])
-            df = fetch_benchmark(symbol, start_date, end_date)
-            if df is not None and len(df) > 0:
-                _benchmark_cache[symbol] = df
-                log.info("    Got %s data points", len(df))
-            else:
-                log.info("    No data for %s", symbol)
-        
-        _save_cache()
-        log.info("Benchmark pre-fetch complete")
+    if not try_acquire_lease("benchmark_prefetch", ttl=15 * 60):
+        log.info("Benchmark pre-fetch already running in another worker")
+        return
+
+    try:
+        with _fetch_lock:
+            log.info("Pre-fetching benchmark data...")
+            start_date = datetime.now() - timedelta(days=years_back * 365)
+            end_date = datetime.now()
+            
+            for symbol in BENCHMARKS.keys():
+                log.info("  Fetching %s (%s)...", symbol, BENCHMARKS[symbol]['name'])
+                df = fetch_benchmark(symbol, start_date, end_date)
+                if df is not None and len(df) > 0:
+                    _benchmark_cache[symbol] = df
+                    log.info("    Got %s data points", len(df))
+                else:
+                    log.info("    No data for %s", symbol)
+            
+            _save_cache()
+            log.info("Benchmark pre-fetch complete")
+    finally:
+        release_lease("benchmark_prefetch")
 
 
 def get_benchmark_data(symbol: str, start_date = None, end_date = None) -> Optional[pd.DataFrame]:
@@ -192,7 +226,8 @@ def get_benchmark_data(symbol: str, start_date = None, end_date = None) -> Optio
     if isinstance(end_date, str):
         end_date = pd.to_datetime(end_date)
     
-    # Check cache
+    # Check cache (another worker may have refreshed it in the meantime)
+    _sync_from_shared(symbol)
     if symbol in _benchmark_cache:
         df = _benchmark_cache[symbol].copy()
         if start_date:
@@ -211,7 +246,7 @@ def get_benchmark_data(symbol: str, start_date = None, end_date = None) -> Optio
     df = fetch_benchmark(symbol, start_date, end_date)
     if df is not None:
         _benchmark_cache[symbol] = df
-        _save_cache()
+        _save_cache([symbol])
     
     return df
 
@@ -426,16 +461,19 @@ def get_benchmark_simulation(
     return results
 
 
-def initialize_benchmarks():
-    """Initialize benchmark data on startup (non-blocking)."""
+def initialize_benchmarks(fetch: bool = True):
+    """Initialize benchmark data on startup (non-blocking).
+
+    With ``fetch=False`` only the cached series are loaded; this is what the
+    pre-fork warm-up calls, since a thread started in the gunicorn master
+    would not survive into the workers. Each worker then calls it again with
+    ``fetch=True`` to start the background download if needed.
+    """
     # Load cache first
-    _load_cache()
+    if not _cache_loaded:
+        _load_cache()
     
     # If cache is empty or old, fetch in background
-    if not _benchmark_cache:
+    if fetch and not _benchmark_cache:
         thread = threading.Thread(target=prefetch_all_benchmarks, daemon=True)
         thread.start()
-
-
-# Initialize on import
-initialize_benchmarks()
@@ -0,0 +1,183 @@
+"""
+Fetch Executor
+Bounded concurrency, per-provider rate limits and retries for market-data I/O.
+
+Portfolio refreshes fetch prices for dozens of ISINs. Running those requests
+one after another makes a refresh take the sum of all round trips; here they
+run on a small thread pool so the refresh approaches the slowest request.
+
+Each upstream API has a token bucket (requests per second plus a burst), so
+the pool never sends more than the API tolerates, no matter how many threads
+wait. Transient failures (timeouts, connection errors, HTTP 429) are retried
+with exponential backoff and full jitter.
+
+The buckets adapt: a 429 halves the provider's rate and empties its bucket,
+and every success wins a little of the configured rate back (AIMD), so a
+provider that tightens its limit is followed instead of hammered.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+import requests
+
+log = logging.getLogger(__name__)
+
+# Threads per fetch batch (env: FETCH_WORKERS)
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", 8))
+
+# {provider: (requests per second, burst)}
+RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "yfinance": (5.0, 10),
+    "coingecko": (0.4, 3),   # free tier: ~30 calls/minute
+    "openfigi": (0.4, 5),    # unauthenticated: 25 calls/minute
+}
+
+# Adaptive budget: a 429 multiplies the rate by RATE_BACKOFF (never below
+# RATE_FLOOR of the configured one); each success adds RATE_RECOVERY of it
+RATE_BACKOFF = 0.5
+RATE_FLOOR = 0.1
+RATE_RECOVERY = 0.05
+
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+
+class RateLimited(Exception):
+    """Upstream answered 'too many requests'; worth retrying later."""
+
+
+def _transient_errors() -> Tuple[type, ...]:
+    errors = [RateLimited, requests.Timeout, requests.ConnectionError, TimeoutError, ConnectionError]
+    try:
+        from yfinance.exceptions import YFRateLimitError
+        errors.append(YFRateLimitError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+TRANSIENT_ERRORS = _transient_errors()
+RATE_LIMIT_ERRORS = tuple(e for e in TRANSIENT_ERRORS if e is RateLimited or e.__name__ == "YFRateLimitError")
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, RATE_LIMIT_ERRORS)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: *rate* tokens per second, at most *burst* stored."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.max_rate = self.rate
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns the wait."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def penalize(self) -> None:
+        """Upstream said 'too many requests': slow down and drop saved tokens."""
+        with self._lock:
+            self.rate = max(self.max_rate * RATE_FLOOR, self.rate * RATE_BACKOFF)
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+    def reward(self) -> None:
+        """A request went through: win back part of the configured rate."""
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket(provider: str) -> Optional[TokenBucket]:
+    limit = RATE_LIMITS.get(provider)
+    if limit is None:
+        return None
+    bucket = _buckets.get(provider)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.setdefault(provider, TokenBucket(*limit))
+    return bucket
+
+
+def rate_limit(provider: str) -> None:
+    """Block until *provider*'s rate limit allows one more request."""
+    bucket = _bucket(provider)
+    if bucket is not None:
+        bucket.acquire()
+
+
+def call_with_retries(fn: Callable, *args, provider: Optional[str] = None,
+                      attempts: int = RETRY_ATTEMPTS, **kwargs) -> Any:
+    """Call *fn* under *provider*'s rate limit, retrying transient errors.
+
+    Backoff is exponential with full jitter, so concurrent callers that failed
+    together do not retry together.
+    """
+    bucket = _bucket(provider) if provider else None
+    for attempt in range(attempts):
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            result = fn(*args, **kwargs)
+        except TRANSIENT_ERRORS as e:
+            if bucket is not None and _is_rate_limit(e):
+                bucket.penalize()
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            log.debug(f"{provider or getattr(fn, '__name__', 'call')} failed ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+        else:
+            if bucket is not None:
+                bucket.reward()
+            return result
+
+
+def fetch_concurrently(items: Iterable, fn: Callable[[Any], Any],
+                       max_workers: int = None) -> Iterator[Tuple[Any, Any]]:
+    """Run ``fn(item)`` for all *items* on a bounded pool.
+
+    Yields ``(item, result)`` as each call finishes, so callers can store
+    results while others are still in flight. A call that raises yields
+    ``(item, None)`` after logging the error.
+    """
+    items = list(items)
+    if not items:
+        return
+    workers = max(1, min(max_workers or FETCH_WORKERS, len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as pool:
+        futures = {pool.submit(fn, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result()
+            except Exception as e:
+                log.warning(f"Fetch failed for {item}: {e}")
+                yield item, None
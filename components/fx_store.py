@@ -0,0 +1,294 @@
+"""
+FX Store
+Daily EUR exchange rates per currency in a local SQLite table.
+
+Historical prices used to be converted with today's spot rate, which distorts
+the past value of USD/GBP/CHF positions. Here every currency has a daily
+series of "EUR per unit", backfilled once from the earliest date anyone asked
+for and then appended as new days are requested. All missing pairs are fetched
+with one grouped download.
+
+:func:`to_eur` converts a whole (date x ISIN) price matrix at once: the rate
+series are aligned into a (date x currency) matrix, its columns are picked per
+ISIN and the two matrices are multiplied element-wise.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from components.local_db import get_connection
+from components.market_data import get_provider
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = Path.home() / ".pytr"
+FX_DB_FILE = CACHE_DIR / "fx_store.sqlite"
+
+# {currency: (Yahoo symbol, inverted)}; inverted pairs quote units per EUR
+FX_SYMBOLS: Dict[str, tuple] = {
+    "USD": ("EURUSD=X", True),
+    "JPY": ("JPYEUR=X", False),
+    "HKD": ("HKDEUR=X", False),
+    "GBP": ("GBPEUR=X", False),
+    "DKK": ("DKKEUR=X", False),
+    "CHF": ("CHFEUR=X", False),
+    "SEK": ("SEKEUR=X", False),
+    "NOK": ("NOKEUR=X", False),
+    "CAD": ("CADEUR=X", False),
+    "AUD": ("AUDEUR=X", False),
+    "CNY": ("CNYEUR=X", False),
+    "PLN": ("PLNEUR=X", False),
+    "SGD": ("SGDEUR=X", False),
+    "ILS": ("ILSEUR=X", False),
+    "ZAR": ("ZAREUR=X", False),
+    "MXN": ("MXNEUR=X", False),
+    "BRL": ("BRLEUR=X", False),
+    "INR": ("INREUR=X", False),
+    "KRW": ("KRWEUR=X", False),
+    "TWD": ("TWDEUR=X", False),
+}
+
+# Quote units Yahoo uses for some listings: {unit: (currency, factor)}
+CURRENCY_UNITS: Dict[str, tuple] = {
+    "GBp": ("GBP", 0.01),  # British pence
+    "ILA": ("ILS", 0.01),  # Israeli agorot
+    "CNH": ("CNY", 1.0),   # offshore yuan
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fx_rates (
+    currency TEXT NOT NULL,
+    date     TEXT NOT NULL,
+    eur      REAL NOT NULL,
+    PRIMARY KEY (currency, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fx_coverage (
+    currency   TEXT PRIMARY KEY,
+    first_date TEXT NOT NULL,
+    last_date  TEXT NOT NULL
+)
+"""
+
+# Returned rates count as covering a range when they reach to within this many
+# days of its ends (weekends and holidays have no FX bars)
+MAX_TRADING_GAP_DAYS = 4
+# A currency whose download returned nothing is tried again after this long (seconds)
+FAILED_RETRY_AFTER = 15 * 60
+
+_lock = threading.RLock()
+_failed_at: Dict[str, float] = {}  # currency -> time of its last empty download
+_series: Dict[str, pd.Series] = {}  # read cache: EUR per unit, by date
+_series_coverage: Dict[str, tuple] = {}  # coverage when each series was read
+_schema_ready_pid: Optional[int] = None
+
+
+def _conn():
+    global _schema_ready_pid
+    conn = get_connection(FX_DB_FILE)
+    if _schema_ready_pid != os.getpid():
+        conn.executescript(_SCHEMA)
+        _schema_ready_pid = os.getpid()
+    return conn
+
+
+def base_currency(currency: str) -> tuple:
+    """``(currency, factor)`` so that 1 *currency* = factor units of the result."""
+    return CURRENCY_UNITS.get(currency, (currency, 1.0))
+
+
+def _coverage(currencies: Iterable[str]) -> Dict[str, tuple]:
+    currencies = list(currencies)
+    rows = _conn().execute(
+        f"SELECT currency, first_date, last_date FROM fx_coverage WHERE currency IN ({','.join('?' * len(currencies))})",
+        currencies,
+    ).fetchall()
+    return {c: (first, last) for c, first, last in rows}
+
+
+def _download(currencies: List[str], start: str, end: str) -> Dict[str, Dict[str, float]]:
+    """EUR per unit for *currencies* between start and end (inclusive), one grouped download."""
+    symbols = {FX_SYMBOLS[c][0]: c for c in currencies}
+    start_dt = datetime.strptime(start, "%Y-%m-%d") - timedelta(days=5)  # lead-in over weekends
+    end_dt = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)
+    histories = get_provider().history_many(sorted(symbols), start=start_dt, end=end_dt)
+    result = {}
+    for symbol, hist in histories.items():
+        currency = symbols[symbol]
+        if hist is None or hist.empty or "Close" not in hist.columns:
+            continue
+        close = hist["Close"].dropna()
+        close = close[close > 0]
+        if FX_SYMBOLS[currency][1]:
+            close = 1.0 / close
+        result[currency] = {d.strftime("%Y-%m-%d"): float(v) for d, v in close.items()}
+    return result
+
+
+def _days(a: str, b: str) -> int:
+    return (datetime.strptime(b, "%Y-%m-%d") - datetime.strptime(a, "%Y-%m-%d")).days
+
+
+def _covered_range(dates: List[str], gap: tuple, current: Optional[tuple]) -> Optional[tuple]:
+    """Coverage after a download of *gap* returned rates on *dates*, or None if unchanged.
+
+    Only the returned dates count; they stand for the whole gap at an end
+    they reach to within MAX_TRADING_GAP_DAYS. A download that does not
+    connect to the current coverage leaves it as it is.
+    """
+    if not dates:
+        return None
+    gap_start, gap_end = gap
+    first = gap_start if _days(gap_start, dates[0]) <= MAX_TRADING_GAP_DAYS else dates[0]
+    last = gap_end if _days(dates[-1], gap_end) <= MAX_TRADING_GAP_DAYS else dates[-1]
+    if current is None:
+        return first, last
+    if first > current[1] or last < current[0]:
+        return None
+    return min(first, current[0]), max(last, current[1])
+
+
+def ensure_rates(currencies: Iterable[str], start: str, end: str) -> None:
+    """Make sure the daily series of *currencies* cover start..end.
+
+    Missing history is backfilled and new days appended; all currencies
+    missing the same range share one download. Coverage is recorded only
+    over the dates a download actually returned, and never past yesterday,
+    so today's rate is fetched again tomorrow. A currency that came back
+    empty is retried after FAILED_RETRY_AFTER.
+    """
+    currencies = sorted({base_currency(c)[0] for c in currencies} & set(FX_SYMBOLS))
+    if not currencies:
+        return
+    yesterday = (datetime.now().date() - timedelta(days=1)).strftime("%Y-%m-%d")
+    end = min(end, yesterday)
+    if start > end:
+        return
+    with _lock:
+        coverage = _coverage(currencies)
+        # {(start, end): [currency, ...]}
+        gaps: Dict[tuple, List[str]] = {}
+        now = time.time()
+        for currency in currencies:
+            if now - _failed_at.get(currency, 0.0) < FAILED_RETRY_AFTER:
+                continue
+            first, last = coverage.get(currency, (None, None))
+            if first is None:
+                gaps.setdefault((start, end), []).append(currency)
+                continue
+            if start < first:
+                gaps.setdefault((start, first), []).append(currency)
+            if end > last:
+                gaps.setdefault((last, end), []).append(currency)
+        fetched_any = set()
+        for (gap_start, gap_end), gap_currencies in gaps.items():
+            try:
+                fetched = _download(gap_currencies, gap_start, gap_end)
+            except Exception as e:
+                log.warning(f"FX history download failed for {', '.join(gap_currencies)}: {e}")
+                _failed_at.update(dict.fromkeys(gap_currencies, now))
+                continue
+            rows = [(c, d, v) for c, by_date in fetched.items() for d, v in by_date.items()]
+            new_coverage = {}
+            for currency in gap_currencies:
+                covered = _covered_range(sorted(fetched.get(currency, {})), (gap_start, gap_end),
+                                         coverage.get(currency))
+                if covered is not None:
+                    new_coverage[currency] = covered
+                elif not fetched.get(currency):
+                    # Left uncovered so it is retried, but not on every call
+                    _failed_at[currency] = now
+                    log.warning(f"FX history download returned no rates for {currency} ({gap_start} to {gap_end})")
+            conn = _conn()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("INSERT OR REPLACE INTO fx_rates (currency, date, eur) VALUES (?, ?, ?)", rows)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO fx_coverage (currency, first_date, last_date) VALUES (?, ?, ?)",
+                    [(c, first, last) for c, (first, last) in new_coverage.items()],
+                )
+                conn.execute("COMMIT")
+            except Exception as e:
+                conn.execute("ROLLBACK")
+                log.warning(f"FX store write failed: {e}")
+                continue
+            coverage.update(new_coverage)
+            fetched_any.update(fetched)
+            log.info(f"FX store: {len(rows)} daily rates for {', '.join(sorted(fetched))} ({gap_start} to {gap_end})")
+        # Another worker may have extended a series this one has cached (or rates
+        # were stored without extending the coverage)
+        for currency in currencies:
+            if currency in fetched_any or _series_coverage.get(currency) != coverage.get(currency):
+                _series.pop(currency, None)
+                _series_coverage[currency] = coverage.get(currency)
+
+
+def _load(currency: str) -> pd.Series:
+    series = _series.get(currency)
+    if series is None:
+        rows = _conn().execute(
+            "SELECT date, eur FROM fx_rates WHERE currency = ? ORDER BY date", (currency,)
+        ).fetchall()
+        series = pd.Series(dict(rows), dtype=float)
+        _series[currency] = series
+    return series
+
+
+def eur_rates(currencies: Iterable[str], date_strs: List[str]) -> pd.DataFrame:
+    """(date x currency) matrix of EUR per unit on each date.
+
+    A date without a rate takes the last earlier one (weekends, holidays),
+    or the first later one before the series starts. NaN where a currency
+    has no stored rates at all; EUR is always 1.
+    """
+    currencies = list(dict.fromkeys(currencies))
+    index = pd.Index(sorted(set(date_strs)), name="date")
+    with _lock:
+        columns = {c: _load(c) for c in currencies if c != "EUR"}
+    frame = pd.DataFrame(index=index, columns=currencies, dtype=float)
+    for currency, series in columns.items():
+        if series.empty:
+            continue
+        aligned = series.reindex(series.index.union(index)).ffill().bfill()
+        frame[currency] = aligned.reindex(index)
+    if "EUR" in frame.columns:
+        frame["EUR"] = 1.0
+    return frame
+
+
+def to_eur(prices: pd.DataFrame, currencies: Dict[str, str],
+           fallback: Dict[str, float] = None) -> pd.DataFrame:
+    """Convert a (date x ISIN) price matrix to EUR with each date's rates.
+
+    Args:
+        prices: Prices indexed by date string, one column per ISIN
+        currencies: {isin: quote currency}, e.g. "USD" or "GBp"; missing means EUR
+        fallback: {currency: EUR per unit} used where no daily series exists
+
+    Returns:
+        Same shape as *prices*, in EUR
+    """
+    if prices.empty:
+        return prices
+    units = {isin: base_currency(currencies.get(isin, "EUR")) for isin in prices.columns}
+    for isin, (currency, _) in units.items():
+        if currency != "EUR" and currency not in FX_SYMBOLS:
+            log.warning(f"Unknown currency '{currency}' for {isin}, assuming EUR - prices may be wrong!")
+            units[isin] = ("EUR", units[isin][1])
+    wanted = sorted({currency for currency, _ in units.values()})
+    dates = [str(d) for d in prices.index]
+    ensure_rates(wanted, min(dates), max(dates))
+    rates = eur_rates(wanted, dates)
+    if fallback:
+        rates = rates.fillna({c: v for c, v in fallback.items() if c in rates.columns})
+    # (date x ISIN) rate matrix: each ISIN's currency column times its unit factor
+    picked = rates.reindex(index=dates, columns=[units[i][0] for i in prices.columns]).to_numpy()
+    factors = np.array([units[i][1] for i in prices.columns])
+    return pd.DataFrame(prices.to_numpy(dtype=float) * picked * factors, index=prices.index, columns=prices.columns)
@@ -1,9 +1,10 @@
 from openai import OpenAI
 import json
-import pandas as pd
 from core.conf import PREPROC_FILENAME
+from core.datasets import read_columns
 
-available_columns = pd.read_csv(PREPROC_FILENAME, low_memory=False).columns.tolist()
+# Header only — the full frame is loaded lazily by whoever needs the rows
+available_columns = read_columns(PREPROC_FILENAME)
 available_columns_list = "', '".join(available_columns[:39])
 
 context_description = f"""
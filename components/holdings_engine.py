@@ -0,0 +1,73 @@
+"""
+Holdings Engine
+Shares and invested amount per ISIN at many dates, computed as matrices.
+
+Transactions become a (change day x ISIN) delta matrix; a cumulative sum
+along the days gives the position after each change day, and every query
+date reads the row of the last change day on or before it (searchsorted).
+The cost no longer depends on dates x ISINs x transactions, so daily
+histories are about as cheap as weekly ones.
+"""
+
+from datetime import date, datetime
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+def _days(dates: Sequence) -> np.ndarray:
+    """Calendar days (datetime64[D]) of dates or datetimes."""
+    return np.array([d.date() if isinstance(d, datetime) else d for d in dates], dtype="datetime64[D]")
+
+
+def holdings_matrix(
+    changes: Dict[str, List[Tuple[datetime, float, float]]],
+    query_dates: Sequence[date],
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Cumulative shares and invested amount at each query date.
+
+    Args:
+        changes: {isin: [(timestamp, shares_change, cost_change), ...]}
+        query_dates: Dates to evaluate (a change counts from its calendar day on)
+
+    Returns:
+        (isins, shares, invested) with both arrays shaped
+        (len(query_dates), len(isins)); zeros before an ISIN's first change.
+    """
+    isins = list(changes)
+    n_query = len(query_dates)
+    if not isins or n_query == 0:
+        empty = np.zeros((n_query, len(isins)))
+        return isins, empty, empty.copy()
+
+    event_days, columns, share_deltas, cost_deltas = [], [], [], []
+    for col, isin in enumerate(isins):
+        for when, shares_change, cost_change in changes[isin]:
+            event_days.append(when)
+            columns.append(col)
+            share_deltas.append(shares_change)
+            cost_deltas.append(cost_change)
+
+    if not event_days:
+        zeros = np.zeros((n_query, len(isins)))
+        return isins, zeros, zeros.copy()
+
+    days = _days(event_days)
+    change_days, rows = np.unique(days, return_inverse=True)
+
+    # Delta matrix: one row per distinct change day
+    shares = np.zeros((len(change_days), len(isins)))
+    invested = np.zeros_like(shares)
+    np.add.at(shares, (rows, columns), share_deltas)
+    np.add.at(invested, (rows, columns), cost_deltas)
+    np.cumsum(shares, axis=0, out=shares)
+    np.cumsum(invested, axis=0, out=invested)
+
+    # Row of the last change day on or before each query date (-1: none yet)
+    pos = np.searchsorted(change_days, _days(query_dates), side="right") - 1
+    before_first = pos < 0
+    pos[before_first] = 0
+    shares_at, invested_at = shares[pos], invested[pos]
+    shares_at[before_first] = 0.0
+    invested_at[before_first] = 0.0
+    return isins, shares_at, invested_at
@@ -0,0 +1,242 @@
+"""
+Instrument Store
+Everything learned about an instrument at runtime, in one local SQLite file.
+
+Replaces several overlapping caches: the ISIN -> Yahoo symbol JSON (which
+was read and rewritten on every lookup), the in-process currency cache filled
+by slow ``Ticker.info`` calls, the per-user TR instrument name cache and the
+position-name -> ISIN map. The hand-maintained ticker tables in
+portfolio_history stay in code and take precedence.
+
+The whole store is small, so each process loads it once and answers lookups
+from memory. A miss re-reads the row in case another worker stored it;
+writes go straight to SQLite and into the memory copy.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from components.local_db import get_connection
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = Path.home() / ".pytr"
+INSTRUMENT_DB_FILE = CACHE_DIR / "instrument_store.sqlite"
+LEGACY_SYMBOL_FILE = CACHE_DIR / "isin_symbol_cache.json"  # {isin: symbol or null}
+
+# Instrument fields; symbol_failed_at is set while no Yahoo symbol is known,
+# details_at when name/type/image were last fetched from TR
+FIELDS = ("symbol", "symbol_failed_at", "name", "type_id", "image_id", "details_at")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS instruments (
+    isin             TEXT PRIMARY KEY,
+    symbol           TEXT,
+    symbol_failed_at REAL,
+    name             TEXT,
+    type_id          TEXT,
+    image_id         TEXT,
+    details_at       REAL,
+    updated_at       REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS symbol_currencies (
+    symbol   TEXT PRIMARY KEY,
+    currency TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS instrument_names (
+    name TEXT PRIMARY KEY,
+    isin TEXT NOT NULL
+)
+"""
+
+_lock = threading.RLock()
+_instruments: Dict[str, Dict] = {}
+_currencies: Dict[str, str] = {}
+_names: Dict[str, str] = {}
+_loaded_pid: Optional[int] = None
+_schema_ready_pid: Optional[int] = None
+
+
+def _conn():
+    global _schema_ready_pid
+    conn = get_connection(INSTRUMENT_DB_FILE)
+    if _schema_ready_pid != os.getpid():
+        conn.executescript(_SCHEMA)
+        _add_missing_columns(conn)
+        _schema_ready_pid = os.getpid()
+        _migrate_symbol_json(conn)
+    return conn
+
+
+def _add_missing_columns(conn) -> None:
+    """Add instrument columns introduced after the table was created."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(instruments)")}
+    for field in FIELDS:
+        if field not in existing:
+            try:
+                conn.execute(f"ALTER TABLE instruments ADD COLUMN {field} {'REAL' if field.endswith('_at') else 'TEXT'}")
+            except Exception as e:
+                log.debug(f"Could not add column {field}: {e}")  # another worker added it first
+
+
+def _migrate_symbol_json(conn) -> None:
+    """Import the legacy ``isin_symbol_cache.json`` once, then move it aside."""
+    if not LEGACY_SYMBOL_FILE.exists():
+        return
+    try:
+        data = json.loads(LEGACY_SYMBOL_FILE.read_text(encoding="utf-8"))
+    except Exception as e:
+        log.warning(f"Could not read {LEGACY_SYMBOL_FILE.name} for migration: {e}")
+        return
+    now = time.time()
+    rows = []
+    for isin, entry in data.items():
+        if isinstance(entry, str):
+            rows.append((isin, entry, None, now))
+        elif isinstance(entry, dict):
+            rows.append((isin, None, entry.get("failed_at", 0.0), now))
+        else:
+            rows.append((isin, None, 0.0, now))  # old failure: retried once
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT OR IGNORE INTO instruments (isin, symbol, symbol_failed_at, updated_at) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        log.warning(f"Symbol cache migration failed: {e}")
+        return
+    try:
+        LEGACY_SYMBOL_FILE.replace(LEGACY_SYMBOL_FILE.with_name(LEGACY_SYMBOL_FILE.name + ".migrated"))
+    except OSError:
+        pass  # another worker moved it first
+    log.info(f"Migrated {len(rows)} symbols from {LEGACY_SYMBOL_FILE.name}")
+
+
+def _write(sql: str, rows) -> None:
+    conn = _conn()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(sql, rows)
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        log.warning(f"Instrument store write failed: {e}")
+
+
+def _row(values) -> Dict:
+    return dict(zip(FIELDS, values))
+
+
+def _ensure_loaded() -> None:
+    global _loaded_pid
+    if _loaded_pid == os.getpid():
+        return
+    conn = _conn()
+    rows = conn.execute(f"SELECT isin, {', '.join(FIELDS)} FROM instruments").fetchall()
+    _instruments.clear()
+    _instruments.update({r[0]: _row(r[1:]) for r in rows})
+    _currencies.clear()
+    _currencies.update(conn.execute("SELECT symbol, currency FROM symbol_currencies").fetchall())
+    _names.clear()
+    _names.update(conn.execute("SELECT name, isin FROM instrument_names").fetchall())
+    _loaded_pid = os.getpid()
+
+
+def get(isin: str) -> Optional[Dict]:
+    """Stored fields of *isin* (see FIELDS), or None if unknown. Do not modify."""
+    with _lock:
+        _ensure_loaded()
+        entry = _instruments.get(isin)
+        if entry is None:
+            # Another worker may have stored it since we loaded
+            row = _conn().execute(f"SELECT {', '.join(FIELDS)} FROM instruments WHERE isin = ?", (isin,)).fetchone()
+            if row is not None:
+                entry = _instruments[isin] = _row(row)
+        return entry
+
+
+def all_instruments() -> Dict[str, Dict]:
+    """``{isin: fields}`` for every stored instrument. Do not modify."""
+    with _lock:
+        _ensure_loaded()
+        return dict(_instruments)
+
+
+def update_many(updates: Dict[str, Dict]) -> None:
+    """Set fields for many ISINs in one transaction (unlisted fields are kept)."""
+    updates = {isin: {k: v for k, v in fields.items() if k in FIELDS} for isin, fields in updates.items() if isin}
+    if not updates:
+        return
+    now = time.time()
+    with _lock:
+        _ensure_loaded()
+        merged = {}
+        for isin, fields in updates.items():
+            current = get(isin) or dict.fromkeys(FIELDS)
+            merged[isin] = {**current, **fields}
+        _write(
+            f"INSERT OR REPLACE INTO instruments (isin, {', '.join(FIELDS)}, updated_at) "
+            f"VALUES (?, {', '.join('?' * len(FIELDS))}, ?)",
+            [(isin, *(entry[f] for f in FIELDS), now) for isin, entry in merged.items()],
+        )
+        # Keep the memory copy even if the write failed
+        _instruments.update(merged)
+
+
+def update(isin: str, **fields) -> None:
+    update_many({isin: fields})
+
+
+def symbol_currency(symbol: str) -> Optional[str]:
+    """Currency Yahoo quotes *symbol* in, if known."""
+    with _lock:
+        _ensure_loaded()
+        currency = _currencies.get(symbol)
+        if currency is None:
+            row = _conn().execute("SELECT currency FROM symbol_currencies WHERE symbol = ?", (symbol,)).fetchone()
+            if row is not None:
+                currency = _currencies[symbol] = row[0]
+        return currency
+
+
+def set_symbol_currency(symbol: str, currency: str) -> None:
+    with _lock:
+        _ensure_loaded()
+        _currencies[symbol] = currency
+        _write("INSERT OR REPLACE INTO symbol_currencies (symbol, currency) VALUES (?, ?)", [(symbol, currency)])
+
+
+def isin_for_name(name: str) -> Optional[str]:
+    """ISIN last seen under instrument name *name* (exact or normalized)."""
+    with _lock:
+        _ensure_loaded()
+        return _names.get(name) or _names.get(normalize_name(name))
+
+
+def add_names(names: Dict[str, str]) -> None:
+    """Remember ``{instrument name: isin}``, under the name as-is and normalized."""
+    rows = {}
+    for name, isin in names.items():
+        if name and isin:
+            rows[name] = isin
+            rows[normalize_name(name)] = isin
+    with _lock:
+        _ensure_loaded()
+        new = {n: i for n, i in rows.items() if _names.get(n) != i}
+        if not new:
+            return
+        _names.update(new)
+        _write("INSERT OR REPLACE INTO instrument_names (name, isin) VALUES (?, ?)", list(new.items()))
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase with single spaces, for matching names across sources."""
+    return ' '.join(name.lower().split())
@@ -0,0 +1,42 @@
+"""
+Local SQLite helpers
+Connection handling for the small SQLite files under ~/.pytr that are shared
+between gunicorn workers.
+
+Connections are kept per (process, thread, path): sqlite3 connections must not
+cross a fork, and Dash callbacks run on several threads. WAL mode lets one
+worker write while the others keep reading.
+"""
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+_local = threading.local()
+
+# Seconds a writer waits for a lock held by another worker before giving up
+BUSY_TIMEOUT_SECONDS = 10
+
+
+def get_connection(path: Path) -> sqlite3.Connection:
+    """Return a connection to *path* that is private to this process and thread."""
+    pid = os.getpid()
+    conns: Dict[Tuple[int, str], sqlite3.Connection] = getattr(_local, "conns", None)
+    if conns is None or getattr(_local, "pid", None) != pid:
+        # First use in this thread, or we are in a freshly forked child:
+        # never reuse the parent's handles.
+        conns = {}
+        _local.conns = conns
+        _local.pid = pid
+
+    key = (pid, str(path))
+    conn = conns.get(key)
+    if conn is None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[key] = conn
+    return conn
@@ -0,0 +1,515 @@
+"""
+Market Data Providers
+One interface for price history, quotes, FX rates and instrument metadata.
+
+Call sites ask for a provider by kind instead of talking to yfinance or
+CoinGecko directly:
+
+    get_provider().history("AAPL", start=..., end=...)
+    get_provider("crypto").quote("bitcoin")
+
+Kinds:
+  - "default": stocks, ETFs, indices and FX (Yahoo Finance)
+  - "crypto":  CoinGecko coin ids, prices in EUR
+
+Live providers are wrapped in ThrottledProvider: every call waits for the
+API's rate limit and transient errors are retried (components.fetch_executor).
+
+MARKET_DATA_MODE selects how they are built:
+  - "live"   (default) talk to the real APIs
+  - "record" talk to the real APIs and save every answer as a fixture
+  - "replay" serve only recorded fixtures from disk, no network at all
+
+Replay is deterministic, so the whole app can be benchmarked or load-tested
+offline. MARKET_DATA_REPLAY_LATENCY adds latency to each replayed call: a
+number of seconds, or "recorded" to sleep as long as the original call took.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import requests
+import yfinance as yf
+
+from components.fetch_executor import RateLimited, call_with_retries, fetch_concurrently, rate_limit
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = Path.home() / ".pytr"
+DEFAULT_FIXTURE_DIR = CACHE_DIR / "market_fixtures"
+
+HISTORY_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+COINGECKO_API = "https://api.coingecko.com/api/v3"
+# CoinGecko's free market_chart endpoint serves at most ~5 years of dailies
+COINGECKO_MAX_DAYS = 365 * 5
+
+
+class MarketDataError(Exception):
+    """A provider could not answer (HTTP error, rate limit, missing fixture)."""
+
+
+class RateLimitError(MarketDataError, RateLimited):
+    """The upstream API answered HTTP 429; retried by ThrottledProvider."""
+
+
+def _normalize_history(df: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """OHLCV frame with a tz-naive, sorted, unique DatetimeIndex named Date."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=["Close"])
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = [c[0] for c in df.columns]
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df.index = pd.to_datetime(df.index)
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    df.index.name = "Date"
+    df = df[[c for c in HISTORY_COLUMNS if c in df.columns]]
+    df = df.sort_index()
+    return df[~df.index.duplicated(keep="last")]
+
+
+def _period_start(index: pd.DatetimeIndex, period: str) -> Optional[pd.Timestamp]:
+    """Translate a yfinance-style period ("5d", "1mo", "2y", "max") to a start date."""
+    if not period or period == "max" or len(index) == 0:
+        return None
+    m = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if not m:
+        return None
+    n, unit = int(m.group(1)), m.group(2)
+    offset = {"d": pd.Timedelta(days=n), "wk": pd.Timedelta(weeks=n),
+              "mo": pd.DateOffset(months=n), "y": pd.DateOffset(years=n)}[unit]
+    return index[-1] - offset
+
+
+def _slice_history(df: pd.DataFrame, start=None, end=None, period: str = None) -> pd.DataFrame:
+    """Apply yfinance's start (inclusive) / end (exclusive) / period semantics."""
+    if start is None and period:
+        start = _period_start(df.index, period)
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df.index < pd.Timestamp(end)]
+    return df
+
+
+class MarketDataProvider(ABC):
+    """Base interface. Methods raise MarketDataError when they cannot answer."""
+
+    name = "base"
+    # True if quote_many() costs one upstream request however many symbols
+    quotes_in_one_request = False
+
+    @abstractmethod
+    def history(self, symbol: str, start=None, end=None, period: str = None) -> pd.DataFrame:
+        """Daily bars indexed by (tz-naive) Date; empty frame if there is no data."""
+
+    def history_many(self, symbols: List[str], start=None, end=None) -> Dict[str, pd.DataFrame]:
+        """``{symbol: history}`` for several symbols over one date range.
+
+        Providers with a multi-symbol endpoint override this; the default
+        makes one history() call per symbol.
+        """
+        return {symbol: self.history(symbol, start=start, end=end) for symbol in symbols}
+
+    @abstractmethod
+    def quote(self, symbol: str) -> float:
+        """Latest price in the instrument's trading currency."""
+
+    def quote_many(self, symbols: List[str]) -> Dict[str, float]:
+        """``{symbol: latest price}`` for several symbols; symbols that fail are left out.
+
+        Providers with a multi-symbol endpoint override this; the default
+        runs quote() for the symbols concurrently.
+        """
+        return {symbol: price for symbol, price in fetch_concurrently(symbols, self.quote) if price}
+
+    @abstractmethod
+    def fx_rate(self, pair: str) -> float:
+        """Spot rate for a pair like "EURUSD" (units of quote per unit of base)."""
+
+    def fx_rates(self, pairs: List[str]) -> Dict[str, float]:
+        """``{pair: spot rate}`` for several pairs; pairs that fail are left out.
+
+        Providers with a multi-symbol endpoint override this; the default
+        runs fx_rate() for the pairs concurrently.
+        """
+        return {pair: rate for pair, rate in fetch_concurrently(pairs, self.fx_rate) if rate}
+
+    @abstractmethod
+    def metadata(self, symbol: str) -> Dict[str, Any]:
+        """Instrument info (at least "currency" when known)."""
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+
+    def history(self, symbol, start=None, end=None, period=None):
+        kwargs = {"start": start, "end": end} if start is not None or end is not None else {"period": period or "1mo"}
+        return _normalize_history(yf.Ticker(symbol).history(**kwargs))
+
+    def history_many(self, symbols, start=None, end=None):
+        symbols = list(symbols)
+        if len(symbols) == 1:
+            return {symbols[0]: self.history(symbols[0], start=start, end=end)}
+        raw = yf.download(symbols, start=start, end=end, group_by="ticker", auto_adjust=True,
+                          actions=False, threads=True, progress=False)
+        result = {}
+        for symbol in symbols:
+            part = None
+            if raw is not None and isinstance(raw.columns, pd.MultiIndex) and symbol in raw.columns.get_level_values(0):
+                # Rows where only other symbols traded are all-NaN for this one
+                part = raw[symbol].dropna(how="all")
+            result[symbol] = _normalize_history(part)
+        return result
+
+    def quote(self, symbol):
+        price = yf.Ticker(symbol).fast_info.last_price
+        if price is None:
+            raise MarketDataError(f"No quote for {symbol}")
+        return float(price)
+
+    def quote_many(self, symbols):
+        symbols = list(symbols)
+        # One grouped download of the last few daily bars; today's bar is live
+        try:
+            histories = self.history_many(symbols, start=datetime.now() - timedelta(days=7))
+        except Exception as e:
+            log.debug(f"Grouped quote download failed, quoting symbols one by one: {e}")
+            histories = {}
+        prices = {}
+        for symbol in symbols:
+            hist = histories.get(symbol)
+            close = hist["Close"].dropna() if hist is not None and "Close" in hist.columns else None
+            if close is not None and not close.empty and close.iloc[-1] > 0:
+                prices[symbol] = float(close.iloc[-1])
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        if missing:
+            prices.update(super().quote_many(missing))
+        return prices
+
+    def fx_rate(self, pair):
+        return self.quote(f"{pair}=X")
+
+    def fx_rates(self, pairs):
+        pairs = list(pairs)
+        # One grouped download of the last few daily bars; today's bar is live
+        try:
+            histories = self.history_many([f"{pair}=X" for pair in pairs], start=datetime.now() - timedelta(days=7))
+        except Exception as e:
+            log.debug(f"Grouped FX download failed, fetching pairs one by one: {e}")
+            histories = {}
+        rates = {}
+        for pair in pairs:
+            hist = histories.get(f"{pair}=X")
+            close = hist["Close"].dropna() if hist is not None and "Close" in hist.columns else None
+            if close is not None and not close.empty and close.iloc[-1] > 0:
+                rates[pair] = float(close.iloc[-1])
+        missing = [pair for pair in pairs if pair not in rates]
+        if missing:
+            rates.update(super().fx_rates(missing))
+        return rates
+
+    def metadata(self, symbol):
+        return dict(yf.Ticker(symbol).info or {})
+
+
+class CoinGeckoProvider(MarketDataProvider):
+    """Symbols are CoinGecko coin ids ("bitcoin"); all prices are in EUR."""
+
+    name = "coingecko"
+    vs_currency = "eur"
+    quotes_in_one_request = True
+
+    def _get(self, path: str, params: Dict, timeout: int) -> Any:
+        resp = requests.get(f"{COINGECKO_API}{path}", params=params, timeout=timeout)
+        if resp.status_code == 429:
+            raise RateLimitError(f"CoinGecko rate limit hit for {path}")
+        if resp.status_code != 200:
+            raise MarketDataError(f"CoinGecko API error {resp.status_code} for {path}")
+        return resp.json()
+
+    def history(self, symbol, start=None, end=None, period=None):
+        start_ts = pd.Timestamp(start) if start is not None else pd.Timestamp(datetime.now() - timedelta(days=COINGECKO_MAX_DAYS))
+        days_back = (datetime.now() - start_ts.to_pydatetime()).days + 10  # buffer
+        data = self._get(
+            f"/coins/{symbol}/market_chart",
+            {"vs_currency": self.vs_currency, "days": min(days_back, COINGECKO_MAX_DAYS), "interval": "daily"},
+            timeout=30,
+        )
+        prices = data.get("prices", [])
+        if not prices:
+            return _normalize_history(None)
+        # One point per local calendar day; the last one of a day wins
+        by_date: Dict[str, float] = {}
+        for timestamp_ms, price in prices:
+            by_date[datetime.fromtimestamp(timestamp_ms / 1000).strftime("%Y-%m-%d")] = price
+        df = pd.DataFrame({"Close": list(by_date.values())}, index=pd.to_datetime(list(by_date.keys())))
+        return _slice_history(_normalize_history(df), start=None, end=end)
+
+    def quote(self, symbol):
+        data = self._get("/simple/price", {"ids": symbol, "vs_currencies": self.vs_currency}, timeout=10)
+        price = data.get(symbol, {}).get(self.vs_currency)
+        if not price:
+            raise MarketDataError(f"No CoinGecko quote for {symbol}")
+        return float(price)
+
+    def quote_many(self, symbols):
+        # /simple/price takes a comma-separated id list: one request for all coins
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        data = self._get("/simple/price", {"ids": ",".join(symbols), "vs_currencies": self.vs_currency}, timeout=10)
+        prices = {s: (data.get(s) or {}).get(self.vs_currency) for s in symbols}
+        return {s: float(p) for s, p in prices.items() if p}
+
+    def fx_rate(self, pair):
+        raise MarketDataError("CoinGecko does not serve FX rates")
+
+    def metadata(self, symbol):
+        return {"symbol": symbol, "currency": self.vs_currency.upper()}
+
+
+class FallbackProvider(MarketDataProvider):
+    """Stack of providers: each call goes to the first one that can answer."""
+
+    def __init__(self, providers: List[MarketDataProvider]):
+        self.providers = providers
+        self.name = "+".join(p.name for p in providers)
+
+    def _first(self, method: str, *args, **kwargs):
+        last_error = None
+        for provider in self.providers:
+            try:
+                result = getattr(provider, method)(*args, **kwargs)
+            except Exception as e:
+                last_error = e
+                continue
+            if method == "history" and result.empty:
+                continue
+            return result
+        if method == "history":
+            return _normalize_history(None)
+        raise MarketDataError(f"No provider could answer {method}{args}: {last_error}")
+
+    def history(self, symbol, start=None, end=None, period=None):
+        return self._first("history", symbol, start=start, end=end, period=period)
+
+    def quote(self, symbol):
+        return self._first("quote", symbol)
+
+    def fx_rate(self, pair):
+        return self._first("fx_rate", pair)
+
+    def metadata(self, symbol):
+        return self._first("metadata", symbol)
+
+
+class ThrottledProvider(MarketDataProvider):
+    """Applies the fetch executor's rate limit and retries to a live provider."""
+
+    def __init__(self, inner: MarketDataProvider):
+        self.inner = inner
+        self.name = inner.name
+
+    def _call(self, method: str, *args, **kwargs):
+        return call_with_retries(getattr(self.inner, method), *args, provider=self.name, **kwargs)
+
+    def history(self, symbol, start=None, end=None, period=None):
+        return self._call("history", symbol, start=start, end=end, period=period)
+
+    def history_many(self, symbols, start=None, end=None):
+        # Yahoo still serves one chart request per symbol: charge a token each
+        for _ in list(symbols)[1:]:
+            rate_limit(self.name)
+        return self._call("history_many", list(symbols), start=start, end=end)
+
+    def quote(self, symbol):
+        return self._call("quote", symbol)
+
+    def quote_many(self, symbols):
+        symbols = list(symbols)
+        if type(self.inner).quote_many is MarketDataProvider.quote_many:
+            # No multi-symbol endpoint: throttled quote() per symbol
+            return super().quote_many(symbols)
+        if not self.inner.quotes_in_one_request:
+            # Like history_many: one token per symbol
+            for _ in symbols[1:]:
+                rate_limit(self.name)
+        return self._call("quote_many", symbols)
+
+    def fx_rate(self, pair):
+        return self._call("fx_rate", pair)
+
+    def fx_rates(self, pairs):
+        # Like history_many: one token per pair
+        for _ in list(pairs)[1:]:
+            rate_limit(self.name)
+        return self._call("fx_rates", list(pairs))
+
+    def metadata(self, symbol):
+        return self._call("metadata", symbol)
+
+
+class FixtureStore:
+    """Recorded provider answers on disk: <dir>/<provider>/<method>/<symbol>.pkl"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def _path(self, provider: str, method: str, symbol: str) -> Path:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", symbol)
+        digest = hashlib.sha1(symbol.encode("utf-8")).hexdigest()[:8]
+        return self.root / provider / method / f"{safe}-{digest}.pkl"
+
+    def load(self, provider: str, method: str, symbol: str) -> Optional[Dict[str, Any]]:
+        path = self._path(provider, method, symbol)
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def save(self, provider: str, method: str, symbol: str, value: Any, elapsed: float) -> None:
+        path = self._path(provider, method, symbol)
+        with self._lock:
+            if method == "history":
+                # Keep everything ever recorded so replays can slice any range
+                previous = self.load(provider, method, symbol)
+                if previous is not None and not previous["value"].empty:
+                    value = _normalize_history(pd.concat([previous["value"], value]))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump({"value": value, "elapsed": elapsed}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+
+
+class RecordingProvider(MarketDataProvider):
+    """Passes calls to *inner* and records each successful answer."""
+
+    def __init__(self, inner: MarketDataProvider, fixtures: FixtureStore):
+        self.inner = inner
+        self.fixtures = fixtures
+        self.name = inner.name
+
+    def _call(self, method: str, symbol: str, **kwargs):
+        t0 = time.perf_counter()
+        result = getattr(self.inner, method)(symbol, **kwargs)
+        elapsed = time.perf_counter() - t0
+        try:
+            self.fixtures.save(self.name, method, symbol, result, elapsed)
+        except Exception as e:
+            log.warning(f"Could not record {self.name}.{method}({symbol}): {e}")
+        return result
+
+    def history(self, symbol, start=None, end=None, period=None):
+        return self._call("history", symbol, start=start, end=end, period=period)
+
+    def quote(self, symbol):
+        return self._call("quote", symbol)
+
+    def fx_rate(self, pair):
+        return self._call("fx_rate", pair)
+
+    def metadata(self, symbol):
+        return self._call("metadata", symbol)
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serves recorded fixtures only; never touches the network.
+
+    *latency* is None (answer immediately), a number of seconds, or
+    "recorded" (sleep as long as the recorded call took).
+    """
+
+    def __init__(self, name: str, fixtures: FixtureStore, latency=None):
+        self.name = name
+        self.fixtures = fixtures
+        self.latency = latency
+
+    def _replay(self, method: str, symbol: str):
+        entry = self.fixtures.load(self.name, method, symbol)
+        if entry is None:
+            raise MarketDataError(f"No {self.name} fixture for {method}({symbol})")
+        if self.latency == "recorded":
+            time.sleep(entry.get("elapsed", 0.0))
+        elif self.latency:
+            time.sleep(float(self.latency))
+        return entry["value"]
+
+    def history(self, symbol, start=None, end=None, period=None):
+        try:
+            df = self._replay("history", symbol)
+        except MarketDataError as e:
+            log.debug(str(e))
+            return _normalize_history(None)
+        return _slice_history(df, start=start, end=end, period=period).copy()
+
+    def quote(self, symbol):
+        return self._replay("quote", symbol)
+
+    def fx_rate(self, pair):
+        return self._replay("fx_rate", pair)
+
+    def metadata(self, symbol):
+        return dict(self._replay("metadata", symbol))
+
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+_LIVE_FACTORIES = {
+    "default": YFinanceProvider,
+    "crypto": CoinGeckoProvider,
+}
+
+_providers: Dict[str, MarketDataProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def _build_provider(kind: str) -> MarketDataProvider:
+    live = ThrottledProvider(_LIVE_FACTORIES[kind]())
+    mode = os.environ.get("MARKET_DATA_MODE", "live").lower()
+    if mode == "live":
+        return live
+    fixtures = FixtureStore(Path(os.environ.get("MARKET_DATA_FIXTURES", DEFAULT_FIXTURE_DIR)))
+    if mode == "record":
+        return RecordingProvider(live, fixtures)
+    if mode == "replay":
+        latency = os.environ.get("MARKET_DATA_REPLAY_LATENCY") or None
+        return ReplayProvider(live.name, fixtures, latency=latency)
+    log.warning(f"Unknown MARKET_DATA_MODE={mode!r}, using live providers")
+    return live
+
+
+def get_provider(kind: str = "default") -> MarketDataProvider:
+    """Return the provider serving *kind* ("default" or "crypto")."""
+    provider = _providers.get(kind)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(kind)
+            if provider is None:
+                provider = _providers[kind] = _build_provider(kind)
+    return provider
+
+
+def set_provider(provider: Optional[MarketDataProvider], kind: str = "default") -> None:
+    """Replace (or with None, reset) the provider for *kind*."""
+    with _providers_lock:
+        if provider is None:
+            _providers.pop(kind, None)
+        else:
+            _providers[kind] = provider
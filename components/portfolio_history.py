@@ -5,23 +5,32 @@ Builds accurate historical portfolio values using transaction data and market pr
 This is a SEPARATE step from TR sync - called explicitly via "Recalculate History" button.
 """
 
+import hashlib
 import json
 import re
 import requests
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
 import pandas as pd
-import yfinance as yf
 import logging
 
+from components import fx_store, instrument_store, price_store
+from components.holdings_engine import holdings_matrix
+from components.fetch_executor import RateLimited, call_with_retries, fetch_concurrently
+from components.shared_cache import cache_get, cache_get_entry, cache_set, cache_stored_at, release_lease, try_acquire_lease
+from components.market_data import MarketDataError, get_provider
+
 log = logging.getLogger(__name__)
 
 # Cache directory
 CACHE_DIR = Path.home() / ".pytr"
-PRICE_CACHE_FILE = CACHE_DIR / "price_cache.json"  # {isin: {date: price}}
 PORTFOLIO_HISTORY_CACHE_FILE = CACHE_DIR / "portfolio_history_cache.json"
-ISIN_SYMBOL_CACHE_FILE = CACHE_DIR / "isin_symbol_cache.json"
 
 # ============================================================================
 # TICKER MAPPINGS - See docs/portfolio_valuation.md for full documentation
@@ -160,6 +169,31 @@ EXCHANGE_SUFFIXES = [
     ".VI",    # Austria Vienna
 ]
 
+# Suffixes to try first per ISIN country code
+ISIN_PRIORITY_SUFFIXES = {
+    "US": [""],  # US stocks don't need suffix
+    "DE": [".DE", ".F"],
+    "GB": [".L"],
+    "JE": [".L"],
+    "FR": [".PA"],
+    "NL": [".AS"],
+    "IE": [".DE", ".L", ".AS", ".SW"],  # Irish ETFs often trade elsewhere
+    "LU": [".DE", ".PA", ".SW"],  # Luxembourg ETFs
+    "AT": [".VI", ".DE"],
+    "CH": [".SW"],
+    "FI": [".HE"],
+    "DK": [".CO"],
+    "SE": [".ST"],
+    "NO": [".OL"],
+    "PL": [".WA"],
+    "JP": [".T"],
+    "AU": [".AX"],
+    "CA": [".TO", ".V"],
+    "HK": [".HK"],
+    "CN": [".HK"],
+    "SG": [".SG"],
+}
+
 # Legacy mapping for backward compatibility with existing code
 KNOWN_ISIN_MAPPINGS = {
     **US_STOCK_TICKERS,
@@ -171,89 +205,81 @@ KNOWN_ISIN_MAPPINGS = {
 # COINGECKO CRYPTO PRICES
 # ============================================================================
 
-def get_crypto_prices_coingecko(isin: str, dates: List[datetime]) -> Dict[str, float]:
+def get_crypto_prices_coingecko(isin: str, dates: List[datetime],
+                                quote: Optional[float] = None) -> Dict[str, float]:
     """
-    Get historical crypto prices from CoinGecko API (free, no API key needed).
-    Returns prices in EUR for the requested dates.
-    
-    CoinGecko provides free historical data for cryptocurrencies.
-    Rate limit: ~10-30 requests/minute without API key.
+    Get historical crypto prices in EUR for the requested dates.
+    
+    Each coin's daily series is fetched from CoinGecko once, starting at the
+    earliest day the price store is missing, and stored whole (except today,
+    whose close is not final). Later calls only fetch the days since. The
+    first day fetched is remembered per coin, so days CoinGecko has no price
+    for (before the coin's listing) are not requested again.
+    Today's price is the live quote: pass *quote* when it was already fetched
+    for several coins at once (get_crypto_quotes_eur).
     """
     if isin not in CRYPTO_COINGECKO_IDS:
         return {}
     
     coin_id = CRYPTO_COINGECKO_IDS[isin]
-    result = {}
-    
-    # Get date range
     date_strs = sorted(set(d.strftime("%Y-%m-%d") for d in dates))
     if not date_strs:
         return {}
     
-    min_date = datetime.strptime(date_strs[0], "%Y-%m-%d")
-    max_date = datetime.strptime(date_strs[-1], "%Y-%m-%d")
+    today = datetime.now().strftime("%Y-%m-%d")
+    known = dict(price_store.get_isin_prices(isin))
+    # Days from the first fetched one up to the last stored price are covered
+    fetched_from = cache_get("coingecko_fetched_from", coin_id)
+    last_known = max(known) if known else None
+    missing = [
+        d for d in date_strs
+        if d < today and d not in known
+        and not (fetched_from and last_known and fetched_from <= d <= last_known)
+    ]
+    if missing:
+        try:
+            # CoinGecko market_chart (daily prices in EUR) via the crypto provider
+            start = datetime.strptime(missing[0], "%Y-%m-%d") - timedelta(days=1)
+            hist = get_provider("crypto").history(coin_id, start=start)
+            series = {
+                d.strftime("%Y-%m-%d"): float(p) for d, p in hist["Close"].items()
+                if d.strftime("%Y-%m-%d") < today
+            }
+            if series:
+                price_store.put_prices(isin, series)
+                known.update(series)
+                cache_set("coingecko_fetched_from", coin_id, min(missing[0], fetched_from or missing[0]))
+                log.info(f"  CoinGecko: stored {len(series)} daily prices for {coin_id}")
+        except Exception as e:
+            log.warning(f"CoinGecko fetch failed for {coin_id}: {e}")
     
-    # Calculate days from now to max_date (CoinGecko uses days parameter)
-    days_back = (datetime.now() - min_date).days + 10  # Add buffer
+    if date_strs[-1] >= today:
+        if quote is None:
+            quote = get_crypto_quotes_eur([isin]).get(isin)
+        if quote:
+            known[today] = quote
     
+    # Match requested dates (use closest previous date if exact not found)
+    known_dates = sorted(known)
+    result = {}
+    for date_str in date_strs:
+        i = bisect_right(known_dates, date_str)
+        if i:
+            result[date_str] = known[known_dates[i - 1]]
+    return result
+
+
+def get_crypto_quotes_eur(isins: List[str]) -> Dict[str, float]:
+    """Live EUR prices of the crypto ISINs among *isins*, in one CoinGecko request."""
+    coins = {isin: CRYPTO_COINGECKO_IDS[isin] for isin in isins if isin in CRYPTO_COINGECKO_IDS}
+    if not coins:
+        return {}
     try:
-        # CoinGecko market_chart endpoint - returns daily prices
-        url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
-        params = {
-            "vs_currency": "eur",
-            "days": min(days_back, 365 * 5),  # Max 5 years
-            "interval": "daily"
-        }
-        
-        resp = requests.get(url, params=params, timeout=30)
-        if resp.status_code == 429:
-            log.warning(f"CoinGecko rate limit hit for {coin_id}")
-            return {}
-        if resp.status_code != 200:
-            log.warning(f"CoinGecko API error {resp.status_code} for {coin_id}")
-            return {}
-        
-        data = resp.json()
-        prices = data.get("prices", [])
-        
-        if not prices:
-            return {}
-        
-        # Convert to dict: {date_str: price}
-        price_by_date = {}
-        for timestamp_ms, price in prices:
-            dt = datetime.fromtimestamp(timestamp_ms / 1000)
-            date_str = dt.strftime("%Y-%m-%d")
-            price_by_date[date_str] = price
-        
-        # Match requested dates (use closest previous date if exact not found)
-        sorted_price_dates = sorted(price_by_date.keys())
-        for date_str in date_strs:
-            if date_str in price_by_date:
-                result[date_str] = price_by_date[date_str]
-            else:
-                # Find closest previous date
-                for pd in reversed(sorted_price_dates):
-                    if pd <= date_str:
-                        result[date_str] = price_by_date[pd]
-                        break
-        
-        log.info(f"  CoinGecko: Got {len(result)} prices for {coin_id}")
-        return result
-        
+        prices = get_provider("crypto").quote_many(sorted(set(coins.values())))
     except Exception as e:
-        log.warning(f"CoinGecko fetch failed for {coin_id}: {e}")
+        log.debug(f"CoinGecko quotes failed for {', '.join(sorted(set(coins.values())))}: {e}")
         return {}
-
-
-def _load_json_cache(path: Path) -> Dict:
-    """Load a JSON cache file."""
-    if path.exists():
-        try:
-            return json.loads(path.read_text(encoding="utf-8"))
-        except:
-            pass
-    return {}
+    return {isin: prices[coin_id] for isin, coin_id in coins.items() if coin_id in prices}
 
 
 def _save_json_cache(path: Path, data: Dict):
@@ -266,77 +292,107 @@ def _save_json_cache(path: Path, data: Dict):
 # FX RATE FUNCTIONS
 # ============================================================================
 
-# Cached FX rates to avoid repeated API calls
+# Spot rate key per currency (the Yahoo pair without "=X"), derived from
+# fx_store.FX_SYMBOLS so spot and daily conversion know the same currencies.
+# All are EUR per unit except the inverted pairs (EURUSD: USD per EUR).
+FX_RATE_KEYS: Dict[str, str] = {
+    currency: symbol.removesuffix("=X") for currency, (symbol, _) in fx_store.FX_SYMBOLS.items()
+}
+_INVERTED_RATE_KEYS = {
+    FX_RATE_KEYS[currency] for currency, (_, inverted) in fx_store.FX_SYMBOLS.items() if inverted
+}
+
+# Fallback rates (approximate)
+FX_FALLBACK_RATES: Dict[str, float] = {
+    'EURUSD': 1.10, 'JPYEUR': 0.0061, 'HKDEUR': 0.12, 'GBPEUR': 1.17, 
+    'DKKEUR': 0.13, 'CHFEUR': 1.05, 'SEKEUR': 0.088, 'NOKEUR': 0.085,
+    'CADEUR': 0.68, 'AUDEUR': 0.60, 'CNYEUR': 0.13, 'PLNEUR': 0.23,
+    'SGDEUR': 0.69, 'ILSEUR': 0.25, 'ZAREUR': 0.05, 'MXNEUR': 0.05,
+    'BRLEUR': 0.17, 'INREUR': 0.011, 'KRWEUR': 0.00068, 'TWDEUR': 0.029
+}
+
+# Spot FX snapshot: refreshed in the background once it is older than
+# FX_REFRESH_AFTER; request paths keep serving the last snapshot meanwhile
+FX_REFRESH_AFTER = 50 * 60
 _fx_rates_cache: Dict[str, float] = {}
 _fx_rates_timestamp: float = 0
+_fx_refresh_lock = threading.Lock()
+
 
 def get_fx_rates() -> Dict[str, float]:
     """
     Get current FX rates for converting to EUR.
-    Caches rates for 1 hour to avoid repeated API calls.
+    
+    Returns the persisted snapshot (shared by all workers, survives restarts)
+    and starts a background refresh once it is due. Only the very first call,
+    with no snapshot on disk at all, fetches synchronously.
     """
     global _fx_rates_cache, _fx_rates_timestamp
-    import time
     
-    # Return cached rates if less than 1 hour old
-    if _fx_rates_cache and (time.time() - _fx_rates_timestamp) < 3600:
+    if _fx_rates_cache and (time.time() - _fx_rates_timestamp) < FX_REFRESH_AFTER:
         return _fx_rates_cache
     
-    rates = {}
-    
-    # Define all currency pairs we need
-    # Format: dict key -> (Yahoo symbol, is_inverted)
-    # is_inverted=True means rate is XXX/EUR (direct), False means EUR/XXX (need to invert)
-    currency_pairs = [
-        ('EURUSD', 'EURUSD=X', False),   # EUR/USD - invert for USD->EUR
-        ('JPYEUR', 'JPYEUR=X', True),    # JPY/EUR - direct
-        ('HKDEUR', 'HKDEUR=X', True),    # HKD/EUR - direct
-        ('GBPEUR', 'GBPEUR=X', True),    # GBP/EUR - direct
-        ('DKKEUR', 'DKKEUR=X', True),    # DKK/EUR - direct
-        ('CHFEUR', 'CHFEUR=X', True),    # CHF/EUR - direct
-        ('SEKEUR', 'SEKEUR=X', True),    # SEK/EUR - direct
-        ('NOKEUR', 'NOKEUR=X', True),    # NOK/EUR - direct
-        ('CADEUR', 'CADEUR=X', True),    # CAD/EUR - direct
-        ('AUDEUR', 'AUDEUR=X', True),    # AUD/EUR - direct
-        ('CNYEUR', 'CNYEUR=X', True),    # CNY/EUR - direct
-        ('PLNEUR', 'PLNEUR=X', True),    # PLN/EUR - direct
-        ('SGDEUR', 'SGDEUR=X', True),    # SGD/EUR - direct
-        ('ILSEUR', 'ILSEUR=X', True),    # ILS/EUR - direct
-        ('ZAREUR', 'ZAREUR=X', True),    # ZAR/EUR - direct
-        ('MXNEUR', 'MXNEUR=X', True),    # MXN/EUR - direct
-        ('BRLEUR', 'BRLEUR=X', True),    # BRL/EUR - direct
-        ('INREUR', 'INREUR=X', True),    # INR/EUR - direct
-        ('KRWEUR', 'KRWEUR=X', True),    # KRW/EUR - direct
-        ('TWDEUR', 'TWDEUR=X', True),    # TWD/EUR - direct
-    ]
+    # Another worker may already have refreshed them
+    entry = cache_get_entry("fx", "spot")
+    if entry is not None and entry[1] > _fx_rates_timestamp:
+        _fx_rates_cache, _fx_rates_timestamp = entry
     
-    # Fallback rates (approximate)
-    fallback_rates = {
-        'EURUSD': 1.10, 'JPYEUR': 0.0061, 'HKDEUR': 0.12, 'GBPEUR': 1.17, 
-        'DKKEUR': 0.13, 'CHFEUR': 1.05, 'SEKEUR': 0.088, 'NOKEUR': 0.085,
-        'CADEUR': 0.68, 'AUDEUR': 0.60, 'CNYEUR': 0.13, 'PLNEUR': 0.23,
-        'SGDEUR': 0.69, 'ILSEUR': 0.25, 'ZAREUR': 0.05, 'MXNEUR': 0.05,
-        'BRLEUR': 0.17, 'INREUR': 0.011, 'KRWEUR': 0.00068, 'TWDEUR': 0.029
-    }
+    if not _fx_rates_cache:
+        return refresh_fx_rates()
+    if (time.time() - _fx_rates_timestamp) >= FX_REFRESH_AFTER:
+        refresh_fx_rates_async()
+    return _fx_rates_cache
+
+
+def refresh_fx_rates() -> Dict[str, float]:
+    """Fetch all spot rates in one grouped request and persist the snapshot.
     
+    Pairs that fail keep their last known rate; the hard-coded table is only
+    used for pairs that were never fetched.
+    """
+    global _fx_rates_cache, _fx_rates_timestamp
+    
+    rates = dict(FX_FALLBACK_RATES)
+    rates.update(_fx_rates_cache)
     try:
-        for key, symbol, is_direct in currency_pairs:
-            try:
-                rate = yf.Ticker(symbol).fast_info.last_price
-                rates[key] = rate
-            except:
-                rates[key] = fallback_rates.get(key, 1.0)
-        
-        log.info(f"FX rates loaded: EUR/USD={rates.get('EURUSD', 0):.4f}, GBP/EUR={rates.get('GBPEUR', 0):.4f}, PLN/EUR={rates.get('PLNEUR', 0):.4f}")
+        fetched = get_provider().fx_rates(list(FX_RATE_KEYS.values()))
+        rates.update(fetched)
+        log.info(f"FX rates loaded ({len(fetched)}/{len(FX_RATE_KEYS)}): EUR/USD={rates.get('EURUSD', 0):.4f}, GBP/EUR={rates.get('GBPEUR', 0):.4f}, PLN/EUR={rates.get('PLNEUR', 0):.4f}")
     except Exception as e:
         log.warning(f"Failed to get FX rates: {e}")
-        rates = fallback_rates
+        if _fx_rates_cache:
+            return _fx_rates_cache  # keep the old stamp so the next call retries
     
     _fx_rates_cache = rates
-    _fx_rates_timestamp = time.time()
+    _fx_rates_timestamp = cache_set("fx", "spot", rates) or time.time()
     return rates
 
 
+def initialize_fx_rates() -> None:
+    """Start a background refresh if the persisted snapshot is missing or due."""
+    stored_at = cache_stored_at("fx", "spot")
+    if stored_at is None or time.time() - stored_at >= FX_REFRESH_AFTER:
+        refresh_fx_rates_async()
+
+
+def refresh_fx_rates_async() -> None:
+    """Refresh the snapshot on a background thread (one worker at a time)."""
+    if not _fx_refresh_lock.acquire(blocking=False):
+        return  # already refreshing in this process
+    
+    def _run():
+        try:
+            if try_acquire_lease("fx_spot_refresh", ttl=120):
+                try:
+                    refresh_fx_rates()
+                finally:
+                    release_lease("fx_spot_refresh")
+        finally:
+            _fx_refresh_lock.release()
+    
+    threading.Thread(target=_run, name="fx-refresh", daemon=True).start()
+
+
 def convert_to_eur(price: float, currency: str, fx_rates: Dict[str, float]) -> float:
     """Convert a price from any currency to EUR.
     
@@ -358,59 +414,53 @@ def convert_to_eur(price: float, currency: str, fx_rates: Dict[str, float]) -> f
     - AUD: Australian Dollar
     - CNY/CNH: Chinese Yuan
     """
-    if currency == 'EUR':
-        return price
-    elif currency == 'USD':
-        return price / fx_rates.get('EURUSD', 1.10)
-    elif currency == 'JPY':
-        return price * fx_rates.get('JPYEUR', 0.0061)
-    elif currency == 'HKD':
-        return price * fx_rates.get('HKDEUR', 0.12)
-    elif currency == 'GBP':
-        return price * fx_rates.get('GBPEUR', 1.17)
-    elif currency == 'GBp':  # British PENCE - divide by 100 first!
-        price_gbp = price / 100.0
-        return price_gbp * fx_rates.get('GBPEUR', 1.17)
-    elif currency == 'DKK':
-        return price * fx_rates.get('DKKEUR', 0.13)
-    elif currency == 'CHF':
-        return price * fx_rates.get('CHFEUR', 1.05)
-    elif currency == 'SEK':
-        return price * fx_rates.get('SEKEUR', 0.088)
-    elif currency == 'NOK':
-        return price * fx_rates.get('NOKEUR', 0.085)
-    elif currency == 'CAD':
-        return price * fx_rates.get('CADEUR', 0.68)
-    elif currency == 'AUD':
-        return price * fx_rates.get('AUDEUR', 0.60)
-    elif currency in ('CNY', 'CNH'):
-        return price * fx_rates.get('CNYEUR', 0.13)
-    elif currency == 'PLN':
-        return price * fx_rates.get('PLNEUR', 0.23)
-    elif currency == 'SGD':
-        return price * fx_rates.get('SGDEUR', 0.69)
-    elif currency == 'ILA' or currency == 'ILS':  # Israeli shekel (Yahoo uses ILA for agorot)
-        price_ils = price / 100.0 if currency == 'ILA' else price
-        return price_ils * fx_rates.get('ILSEUR', 0.25)
-    elif currency == 'ZAR':
-        return price * fx_rates.get('ZAREUR', 0.05)
-    elif currency == 'MXN':
-        return price * fx_rates.get('MXNEUR', 0.05)
-    elif currency == 'BRL':
-        return price * fx_rates.get('BRLEUR', 0.17)
-    elif currency == 'INR':
-        return price * fx_rates.get('INREUR', 0.011)
-    elif currency == 'KRW':
-        return price * fx_rates.get('KRWEUR', 0.00068)
-    elif currency == 'TWD':
-        return price * fx_rates.get('TWDEUR', 0.029)
-    else:
+    rate = eur_per_unit(currency, fx_rates)
+    if rate is None:
         log.warning(f"Unknown currency '{currency}', assuming EUR - prices may be wrong!")
         return price
+    return price * rate
+
+
+def eur_per_unit(currency: str, fx_rates: Dict[str, float]) -> Optional[float]:
+    """Spot EUR value of one unit of *currency* (GBp/ILA are 1/100), None if unknown."""
+    currency, factor = fx_store.base_currency(currency)
+    if currency == 'EUR':
+        return factor
+    key = FX_RATE_KEYS.get(currency)
+    if key is None:
+        return None
+    rate = fx_rates.get(key, FX_FALLBACK_RATES.get(key))
+    if not rate:
+        return None
+    return factor / rate if key in _INVERTED_RATE_KEYS else factor * rate
+
+
+def _closes_to_eur(closes: Dict[str, Dict[str, float]], currencies: Dict[str, str]) -> Dict[str, Dict[str, float]]:
+    """
+    Convert {isin: {date: close}} to EUR with the FX rate of each date.
+    
+    One (date x ISIN) matrix times the aligned daily rates (fx_store); spot
+    rates only stand in for currencies without a stored series.
+    """
+    frame = pd.DataFrame({isin: pd.Series(prices, dtype=float) for isin, prices in closes.items() if prices})
+    if frame.empty:
+        return {}
+    fallback = None
+    if any(fx_store.base_currency(currencies.get(isin, 'EUR'))[0] != 'EUR' for isin in frame.columns):
+        fx_rates = get_fx_rates()
+        fallback = {c: eur_per_unit(c, fx_rates) for c in FX_RATE_KEYS}
+    converted = fx_store.to_eur(frame.sort_index(), currencies, fallback)
+    return {isin: col.dropna().to_dict() for isin, col in converted.items()}
 
 
-# Cache for currency lookups from Yahoo Finance
-_currency_cache: Dict[str, str] = {}
+def _yahoo_currency(symbol: str) -> str:
+    """Currency Yahoo quotes *symbol* in; Ticker.info is only asked once per symbol."""
+    currency = instrument_store.symbol_currency(symbol)
+    if currency is None:
+        currency = get_provider().metadata(symbol).get('currency')
+        if currency:
+            instrument_store.set_symbol_currency(symbol, currency)
+    return currency or 'EUR'
 
 
 def get_currency_for_isin(isin: str, symbol: str = None) -> str:
@@ -422,10 +472,6 @@ def get_currency_for_isin(isin: str, symbol: str = None) -> str:
     to get the actual currency. This is critical because many IE-prefixed
     ETFs trade on London Stock Exchange and return GBp (pence).
     """
-    # Check cache first
-    if isin in _currency_cache:
-        return _currency_cache[isin]
-    
     # US stocks return USD
     if isin in US_STOCK_TICKERS:
         return 'USD'
@@ -462,10 +508,7 @@ def get_currency_for_isin(isin: str, symbol: str = None) -> str:
     # trade on London Stock Exchange and return GBp (pence)
     if isin.startswith('IE'):
         try:
-            ticker_symbol = symbol or isin
-            t = yf.Ticker(ticker_symbol)
-            currency = t.info.get('currency', 'EUR')
-            _currency_cache[isin] = currency
+            currency = _yahoo_currency(symbol or isin)
             log.debug(f"Yahoo currency for {isin}: {currency}")
             return currency
         except Exception as e:
@@ -475,6 +518,13 @@ def get_currency_for_isin(isin: str, symbol: str = None) -> str:
     return 'EUR'
 
 
+# Live quotes are shared by every caller in the process for this long (seconds)
+QUOTE_TTL = 60
+# {isin: (fetched_at, (price_eur, ticker) or None)}
+_quote_cache: Dict[str, Tuple[float, Optional[Tuple[float, str]]]] = {}
+_quote_lock = threading.Lock()
+
+
 def get_current_price_eur(isin: str, name: str = "") -> Optional[Tuple[float, str]]:
     """
     Get current price for an ISIN, converted to EUR.
@@ -482,134 +532,191 @@ def get_current_price_eur(isin: str, name: str = "") -> Optional[Tuple[float, st
     Returns:
         (price_eur, ticker) or None if not available
     """
-    fx_rates = get_fx_rates()
-    
-    # 0. CRYPTO: Use CoinGecko for TR crypto ISINs
-    if isin in CRYPTO_COINGECKO_IDS:
-        coin_id = CRYPTO_COINGECKO_IDS[isin]
-        try:
-            url = f"https://api.coingecko.com/api/v3/simple/price"
-            params = {"ids": coin_id, "vs_currencies": "eur"}
-            resp = requests.get(url, params=params, timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
-                price_eur = data.get(coin_id, {}).get("eur")
-                if price_eur:
-                    return (price_eur, coin_id)
-        except Exception as e:
-            log.debug(f"CoinGecko current price failed for {coin_id}: {e}")
-        return None
-    
-    # Skip known no-external-data ISINs (bonds, etc.)
-    if isin in NO_EXTERNAL_DATA:
-        return None
+    return get_current_prices_eur({isin: name}).get(isin)
+
+
+def get_current_prices_eur(isin_names: Dict[str, str]) -> Dict[str, Optional[Tuple[float, str]]]:
+    """
+    Current EUR prices for many ISINs: ``{isin: (price_eur, ticker) or None}``.
     
-    # 1. Check if it's a US stock (needs explicit ticker)
+    Quotes younger than QUOTE_TTL come from a process-wide cache. The rest
+    are fetched together: crypto with one CoinGecko request, everything else
+    with one grouped Yahoo request, converted with the spot FX snapshot.
+    """
+    now = time.time()
+    result = {}
+    with _quote_lock:
+        for isin in isin_names:
+            entry = _quote_cache.get(isin)
+            if entry is not None and now - entry[0] < QUOTE_TTL:
+                result[isin] = entry[1]
+    
+    todo = [isin for isin in isin_names if isin not in result]
+    if todo:
+        fetched = _fetch_quotes_eur(todo)
+        with _quote_lock:
+            for isin in todo:
+                result[isin] = fetched.get(isin)
+                _quote_cache[isin] = (now, result[isin])
+    return result
+
+
+def _quote_source(isin: str) -> Tuple[str, Optional[str]]:
+    """(Yahoo symbol, currency if known without a lookup) for a live quote."""
     if isin in US_STOCK_TICKERS:
-        ticker = US_STOCK_TICKERS[isin]
-        try:
-            t = yf.Ticker(ticker)
-            price_usd = t.fast_info.last_price
-            price_eur = convert_to_eur(price_usd, 'USD', fx_rates)
-            return (price_eur, ticker)
-        except Exception as e:
-            log.debug(f"Failed to get price for {ticker}: {e}")
-            return None
-    
-    # 2. Check if it's a foreign stock with explicit ticker + currency
+        return US_STOCK_TICKERS[isin], 'USD'
     if isin in FOREIGN_STOCK_TICKERS:
-        ticker, currency = FOREIGN_STOCK_TICKERS[isin]
-        try:
-            t = yf.Ticker(ticker)
-            price = t.fast_info.last_price
-            price_eur = convert_to_eur(price, currency, fx_rates)
-            return (price_eur, ticker)
-        except Exception as e:
-            log.debug(f"Failed to get price for {ticker}: {e}")
-            return None
-    
-    # 3. Try ISIN directly (works for most ETFs)
+        return FOREIGN_STOCK_TICKERS[isin]
+    # Most ETFs are quoted under their ISIN directly
+    return isin, None
+
+
+def _quote_currency(isin: str) -> Optional[str]:
     try:
-        t = yf.Ticker(isin)
-        price = t.fast_info.last_price
-        # Get currency from ticker info
-        currency = t.info.get('currency', 'EUR')
-        price_eur = convert_to_eur(price, currency, fx_rates)
-        return (price_eur, isin)
+        return _yahoo_currency(isin)
     except Exception as e:
-        log.debug(f"ISIN direct lookup failed for {isin}: {e}")
+        log.debug(f"Currency lookup failed for {isin}: {e}")
+        return ETF_ISIN_CURRENCY.get(isin)
+
+
+def _fetch_quotes_eur(isins: List[str]) -> Dict[str, Tuple[float, str]]:
+    """Live EUR prices for *isins*, one grouped request per provider."""
+    fx_rates = get_fx_rates()
+    result = {isin: (price, CRYPTO_COINGECKO_IDS[isin]) for isin, price in get_crypto_quotes_eur(isins).items()}
     
-    # 4. Check ETF_ISIN_CURRENCY for known currency
-    if isin in ETF_ISIN_CURRENCY:
-        currency = ETF_ISIN_CURRENCY[isin]
-        try:
-            t = yf.Ticker(isin)
-            price = t.fast_info.last_price
-            price_eur = convert_to_eur(price, currency, fx_rates)
-            return (price_eur, isin)
-        except:
-            pass
+    sources = {
+        isin: _quote_source(isin) for isin in isins
+        if isin and isin not in CRYPTO_COINGECKO_IDS and isin not in NO_EXTERNAL_DATA
+    }
+    if not sources:
+        return result
+    try:
+        prices = get_provider().quote_many(sorted({symbol for symbol, _ in sources.values()}))
+    except Exception as e:
+        log.debug(f"Grouped quote request failed: {e}")
+        return result
     
+    quoted = [isin for isin, (symbol, _) in sources.items() if symbol in prices]
+    # Currencies not pinned in code are looked up (and cached) concurrently
+    currencies = dict(fetch_concurrently(quoted, lambda isin: sources[isin][1] or _quote_currency(isin)))
+    for isin in quoted:
+        symbol, _ = sources[isin]
+        if currencies.get(isin):
+            result[isin] = (convert_to_eur(prices[symbol], currencies[isin], fx_rates), symbol)
+    return result
+
+
+# Yahoo suffix for OpenFIGI exchange codes
+FIGI_EXCHANGE_SUFFIXES = {
+    "GY": ".DE",  # German XETRA
+    "GF": ".F",   # Frankfurt
+    "LN": ".L",   # London
+    "NA": ".AS",  # Amsterdam
+    "SW": ".SW",  # Swiss
+    "FP": ".PA",  # Paris
+    "US": "", "UN": "", "UW": "", "UQ": "",  # US exchanges
+}
+
+# Jobs per OpenFIGI mapping request (the limit without an API key)
+OPENFIGI_JOBS_PER_REQUEST = 10
+
+# Failed lookups are retried after this many seconds
+NEGATIVE_SYMBOL_TTL = 7 * 24 * 3600
+
+# Concurrent history probes per ISIN in the suffix search
+SUFFIX_PROBE_WORKERS = 6
+
+
+def _figi_symbol(results: List[Dict]) -> Optional[str]:
+    """Yahoo symbol for the first OpenFIGI result with a ticker."""
+    for item in results:
+        ticker = item.get("ticker")
+        if ticker:
+            # Try to determine the right Yahoo suffix
+            return ticker + FIGI_EXCHANGE_SUFFIXES.get(item.get("exchCode", ""), "")
     return None
 
 
-def _lookup_isin_openfigi(isin: str) -> Optional[str]:
+def _lookup_isins_openfigi(isins: List[str]) -> Dict[str, Optional[str]]:
     """
-    Look up ISIN using OpenFIGI API to get a ticker symbol.
+    Look up many ISINs with the OpenFIGI mapping API, several jobs per request.
     OpenFIGI is a free, industry-standard API for financial instrument identification.
+    
+    Returns {isin: symbol or None}; ISINs whose request failed are left out.
     """
-    try:
-        url = "https://api.openfigi.com/v3/mapping"
-        headers = {"Content-Type": "application/json"}
-        payload = [{"idType": "ID_ISIN", "idValue": isin}]
-        
-        resp = requests.post(url, headers=headers, json=payload, timeout=10)
-        if resp.status_code != 200:
-            return None
-            
-        data = resp.json()
-        if not data or not data[0].get("data"):
-            return None
+    url = "https://api.openfigi.com/v3/mapping"
+    headers = {"Content-Type": "application/json"}
+    found: Dict[str, Optional[str]] = {}
+    
+    for i in range(0, len(isins), OPENFIGI_JOBS_PER_REQUEST):
+        chunk = isins[i:i + OPENFIGI_JOBS_PER_REQUEST]
+        payload = [{"idType": "ID_ISIN", "idValue": isin} for isin in chunk]
         
-        # Get the first result - prefer common stock or ETF
-        results = data[0]["data"]
-        for item in results:
-            ticker = item.get("ticker")
-            exch_code = item.get("exchCode", "")
-            mkt_sector = item.get("marketSector", "")
-            
-            if ticker:
-                # Try to determine the right Yahoo suffix
-                suffix = ""
-                if exch_code == "GY":  # German XETRA
-                    suffix = ".DE"
-                elif exch_code == "GF":  # Frankfurt
-                    suffix = ".F"
-                elif exch_code == "LN":  # London
-                    suffix = ".L"
-                elif exch_code == "NA":  # Amsterdam
-                    suffix = ".AS"
-                elif exch_code == "SW":  # Swiss
-                    suffix = ".SW"
-                elif exch_code == "FP":  # Paris
-                    suffix = ".PA"
-                elif exch_code in ("US", "UN", "UW", "UQ"):  # US exchanges
-                    suffix = ""
-                
-                return ticker + suffix
+        def post():
+            resp = requests.post(url, headers=headers, json=payload, timeout=10)
+            if resp.status_code == 429:
+                raise RateLimited("OpenFIGI rate limit hit")
+            return resp
         
+        try:
+            resp = call_with_retries(post, provider="openfigi")
+            if resp.status_code != 200:
+                continue
+            # One answer per job, in request order
+            for isin, job in zip(chunk, resp.json() or []):
+                found[isin] = _figi_symbol(job.get("data") or [])
+        except Exception as e:
+            log.debug(f"OpenFIGI lookup failed for {len(chunk)} ISINs: {e}")
+    
+    return found
+
+
+def _lookup_isin_openfigi(isin: str) -> Optional[str]:
+    """Look up one ISIN using the OpenFIGI API to get a ticker symbol."""
+    return _lookup_isins_openfigi([isin]).get(isin)
+
+
+def _probe_suffixes(isin: str, suffixes: List[str]) -> Optional[str]:
+    """First isin+suffix in *suffixes* order with recent history.
+    
+    Probes run concurrently, but a hit only wins once every higher-priority
+    probe has answered; pending probes are cancelled then. Raises
+    MarketDataError when nothing was found and some probe failed, since the
+    ISIN may well be listed on that exchange.
+    """
+    def probe(suffix):
+        # Quick check - try to get recent history
+        hist = get_provider().history(isin + suffix, period="5d")
+        return isin + suffix if len(hist) > 0 else None
+    
+    pool = ThreadPoolExecutor(max_workers=SUFFIX_PROBE_WORKERS, thread_name_prefix="probe")
+    try:
+        futures = [pool.submit(probe, suffix) for suffix in suffixes]
+        error = None
+        # In priority order: waits only for probes ahead of a hit
+        for future in futures:
+            try:
+                symbol = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if symbol:
+                return symbol
+        if error is not None:
+            raise MarketDataError(f"Suffix probe failed for {isin}: {error}")
         return None
-    except Exception as e:
-        log.debug(f"OpenFIGI lookup failed for {isin}: {e}")
-        return None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 def _lookup_isin_yfinance_search(isin: str) -> Optional[str]:
-    """Try to find the symbol by searching yfinance directly with multiple exchange suffixes."""
+    """Try to find the symbol by searching yfinance directly with multiple exchange suffixes.
+    
+    Returns None only if every probe answered; raises MarketDataError otherwise.
+    """
     try:
         # yfinance can sometimes resolve ISIN directly
-        ticker = yf.Ticker(isin)
-        info = ticker.info
+        info = get_provider().metadata(isin)
         if info and info.get("symbol") and info.get("regularMarketPrice"):
             return info["symbol"]
     except:
@@ -618,64 +725,102 @@ def _lookup_isin_yfinance_search(isin: str) -> Optional[str]:
     # Try with ALL known exchange suffixes (defined in EXCHANGE_SUFFIXES)
     # Prioritize based on ISIN country code for faster matching
     isin_prefix = isin[:2] if len(isin) >= 2 else ""
+    priority_suffixes = ISIN_PRIORITY_SUFFIXES.get(isin_prefix, [])
     
-    # Country-specific prioritization
-    priority_suffixes = []
-    if isin_prefix == "US":
-        priority_suffixes = [""]  # US stocks don't need suffix
-    elif isin_prefix == "DE":
-        priority_suffixes = [".DE", ".F"]
-    elif isin_prefix == "GB" or isin_prefix == "JE":
-        priority_suffixes = [".L"]
-    elif isin_prefix == "FR":
-        priority_suffixes = [".PA"]
-    elif isin_prefix == "NL":
-        priority_suffixes = [".AS"]
-    elif isin_prefix == "IE":
-        priority_suffixes = [".DE", ".L", ".AS", ".SW"]  # Irish ETFs often trade elsewhere
-    elif isin_prefix == "LU":
-        priority_suffixes = [".DE", ".PA", ".SW"]  # Luxembourg ETFs
-    elif isin_prefix == "AT":
-        priority_suffixes = [".VI", ".DE"]
-    elif isin_prefix == "CH":
-        priority_suffixes = [".SW"]
-    elif isin_prefix == "FI":
-        priority_suffixes = [".HE"]
-    elif isin_prefix == "DK":
-        priority_suffixes = [".CO"]
-    elif isin_prefix == "SE":
-        priority_suffixes = [".ST"]
-    elif isin_prefix == "NO":
-        priority_suffixes = [".OL"]
-    elif isin_prefix == "PL":
-        priority_suffixes = [".WA"]
-    elif isin_prefix == "JP":
-        priority_suffixes = [".T"]
-    elif isin_prefix == "AU":
-        priority_suffixes = [".AX"]
-    elif isin_prefix == "CA":
-        priority_suffixes = [".TO", ".V"]
-    elif isin_prefix in ("HK", "CN"):
-        priority_suffixes = [".HK"]
-    elif isin_prefix == "SG":
-        priority_suffixes = [".SG"]
-    
-    # Combine priority suffixes with full list (removing duplicates)
-    all_suffixes = priority_suffixes + [s for s in EXCHANGE_SUFFIXES if s not in priority_suffixes]
-    
-    for suffix in all_suffixes:
+    # Likely exchanges first, then the rest (removing duplicates)
+    symbol, error = None, None
+    if priority_suffixes:
         try:
-            test_symbol = isin + suffix
-            ticker = yf.Ticker(test_symbol)
-            # Quick check - try to get recent history
-            hist = ticker.history(period="5d")
-            if len(hist) > 0:
-                log.debug(f"Found {isin} with suffix {suffix}")
-                return test_symbol
-        except:
+            symbol = _probe_suffixes(isin, priority_suffixes)
+        except MarketDataError as e:
+            error = e
+    if symbol is None:
+        symbol = _probe_suffixes(isin, [s for s in EXCHANGE_SUFFIXES if s not in priority_suffixes])
+    if symbol is None and error is not None:
+        raise error
+    if symbol:
+        log.debug(f"Found {isin} as {symbol}")
+    return symbol
+
+
+def _cached_symbol(isin: str) -> Tuple[bool, Optional[str]]:
+    """(known, symbol) from the instrument store; expired failures are not known."""
+    entry = instrument_store.get(isin)
+    if entry is None:
+        return False, None
+    if entry["symbol"]:
+        return True, entry["symbol"]
+    failed_at = entry["symbol_failed_at"]
+    if failed_at is None:
+        return False, None  # stored for its name only, never looked up
+    return time.time() - failed_at < NEGATIVE_SYMBOL_TTL, None
+
+
+def resolve_isin_symbols(isin_names: Dict[str, str]) -> Dict[str, Optional[str]]:
+    """
+    Yahoo symbols for many ISINs: ``{isin: symbol or None}``.
+    
+    Known mappings and the cache answer first. All remaining ISINs go to
+    OpenFIGI in grouped jobs; what it cannot map is searched on yfinance,
+    several ISINs at a time. Definite failures are cached for
+    NEGATIVE_SYMBOL_TTL; lookups that hit a request error are not.
+    """
+    result: Dict[str, Optional[str]] = {}
+    unknown = []
+    for isin in isin_names:
+        if not isin:
+            continue
+        # 1. Check known mappings (fastest)
+        if isin in KNOWN_ISIN_MAPPINGS:
+            result[isin] = KNOWN_ISIN_MAPPINGS[isin]
             continue
+        # 2. Check cache
+        known, symbol = _cached_symbol(isin)
+        if known:
+            result[isin] = symbol
+        else:
+            unknown.append(isin)
     
-    return None
+    if not unknown:
+        return result
+    log.info(f"Looking up symbols for {len(unknown)} ISIN(s)...")
+    
+    # 3. OpenFIGI API, grouped
+    figi = _lookup_isins_openfigi(unknown)
+    found = {isin: symbol for isin, symbol in figi.items() if symbol}
+    for isin, symbol in found.items():
+        log.info(f"  OpenFIGI found: {isin} -> {symbol}")
+    
+    # 4. yfinance search as fallback
+    def search(isin):
+        try:
+            return _lookup_isin_yfinance_search(isin), True
+        except Exception as e:
+            log.debug(f"yfinance search incomplete for {isin}: {e}")
+            return None, False
+    
+    rest = [isin for isin in unknown if isin not in found]
+    unanswered = set()
+    for isin, (symbol, answered) in fetch_concurrently(rest, search, max_workers=4):
+        if symbol:
+            log.info(f"  yfinance search found: {isin} -> {symbol}")
+            found[isin] = symbol
+        else:
+            log.warning(f"  Could not find Yahoo symbol for {isin} ({isin_names.get(isin, '')})")
+            if not answered:
+                unanswered.add(isin)
+    
+    # 5. Remember failures too, so they are not looked up again until the TTL runs out.
+    # Only definite ones: an outage at OpenFIGI or an exchange is retried next time.
+    failed_at = time.time()
+    updates = {isin: {"symbol": symbol, "symbol_failed_at": None} for isin, symbol in found.items()}
+    for isin in unknown:
+        if isin not in found and isin in figi and isin not in unanswered:
+            updates[isin] = {"symbol": None, "symbol_failed_at": failed_at}
+    instrument_store.update_many(updates)
+    for isin in unknown:
+        result[isin] = found.get(isin)
+    return result
 
 
 def isin_to_symbol(isin: str, name: str = "") -> Optional[str]:
@@ -685,48 +830,11 @@ def isin_to_symbol(isin: str, name: str = "") -> Optional[str]:
     """
     if not isin:
         return None
-    
-    # 1. Check known mappings (fastest)
-    if isin in KNOWN_ISIN_MAPPINGS:
-        return KNOWN_ISIN_MAPPINGS[isin]
-    
-    # 2. Check cache
-    cache = _load_json_cache(ISIN_SYMBOL_CACHE_FILE)
-    if isin in cache:
-        symbol = cache[isin]
-        if symbol:  # Can be None if previously failed
-            return symbol
-        # If it's None, we already tried and failed - don't retry
-        return None
-    
-    log.info(f"Looking up symbol for ISIN {isin} ({name})...")
-    
-    # 3. Try OpenFIGI API
-    symbol = _lookup_isin_openfigi(isin)
-    if symbol:
-        log.info(f"  OpenFIGI found: {symbol}")
-        cache[isin] = symbol
-        _save_json_cache(ISIN_SYMBOL_CACHE_FILE, cache)
-        return symbol
-    
-    # 4. Try yfinance search as fallback
-    symbol = _lookup_isin_yfinance_search(isin)
-    if symbol:
-        log.info(f"  yfinance search found: {symbol}")
-        cache[isin] = symbol
-        _save_json_cache(ISIN_SYMBOL_CACHE_FILE, cache)
-        return symbol
-    
-    # 5. Mark as not found in cache to avoid repeated lookups
-    log.warning(f"  Could not find Yahoo symbol for {isin} ({name})")
-    cache[isin] = None
-    _save_json_cache(ISIN_SYMBOL_CACHE_FILE, cache)
-    return None
+    return resolve_isin_symbols({isin: name}).get(isin)
 
 
-# Global mapping for name → ISIN lookups (populated from current positions)
+# Name → ISIN lookups live in the instrument store (populated from current positions)
 # This handles cases where transactions have different icons/ISINs than current positions
-_NAME_TO_ISIN_MAP: Dict[str, str] = {}
 _OLD_ISIN_TO_NEW_ISIN: Dict[str, str] = {}
 
 
@@ -739,21 +847,14 @@ def set_isin_mappings(positions: List[Dict]) -> None:
     2. ISIN changes from corporate restructuring
     3. Instruments where the transaction icon differs from current position
     """
-    global _NAME_TO_ISIN_MAP, _OLD_ISIN_TO_NEW_ISIN
-    _NAME_TO_ISIN_MAP = {}
+    global _OLD_ISIN_TO_NEW_ISIN
     _OLD_ISIN_TO_NEW_ISIN = {}
     
-    for pos in positions:
-        isin = pos.get('isin', '')
-        name = pos.get('name', '')
-        if isin and name:
-            # Normalize name for matching (remove extra spaces, lowercase)
-            normalized_name = ' '.join(name.lower().split())
-            _NAME_TO_ISIN_MAP[normalized_name] = isin
-            # Also map the name as-is
-            _NAME_TO_ISIN_MAP[name] = isin
+    # Stored as-is and normalized (extra spaces removed, lowercase)
+    names = {pos.get('name', ''): pos.get('isin', '') for pos in positions}
+    instrument_store.add_names(names)
     
-    log.info(f"Set up ISIN mappings for {len(_NAME_TO_ISIN_MAP)} position names")
+    log.info(f"Set up ISIN mappings for {len(names)} position names")
 
 
 def add_isin_mapping(old_isin: str, new_isin: str) -> None:
@@ -792,14 +893,8 @@ def extract_isin_from_icon(icon: str, title: str = None) -> Optional[str]:
     
     # ISIN not in icon - try name-based lookup
     if title:
-        # Try exact match first
-        if title in _NAME_TO_ISIN_MAP:
-            return _NAME_TO_ISIN_MAP[title]
-        
-        # Try normalized match
-        normalized = ' '.join(title.lower().split())
-        if normalized in _NAME_TO_ISIN_MAP:
-            return _NAME_TO_ISIN_MAP[normalized]
+        # Exact match first, then normalized
+        return instrument_store.isin_for_name(title)
     
     return None
 
@@ -812,9 +907,9 @@ def get_price_at_date(isin: str, name: str, date: datetime) -> Optional[float]:
     date_str = date.strftime("%Y-%m-%d")
     
     # Check cache first
-    cache = _load_json_cache(PRICE_CACHE_FILE)
-    if isin in cache and date_str in cache[isin]:
-        return cache[isin][date_str]
+    cached = price_store.get_price(isin, date_str)
+    if cached is not None:
+        return cached
     
     # Get Yahoo symbol
     symbol = isin_to_symbol(isin, name)
@@ -822,18 +917,16 @@ def get_price_at_date(isin: str, name: str, date: datetime) -> Optional[float]:
         return None
     
     try:
-        ticker = yf.Ticker(symbol)
         # Fetch a small window around the date (handles weekends/holidays)
         start = date - timedelta(days=5)
         end = date + timedelta(days=1)
         
-        hist = ticker.history(start=start, end=end)
+        hist = get_provider().history(symbol, start=start, end=end)
         
         if len(hist) == 0:
             return None
         
         # Get the closest date <= requested date
-        hist.index = hist.index.tz_localize(None)
         target_date = pd.Timestamp(date_str)
         
         # Filter to dates <= target
@@ -842,10 +935,7 @@ def get_price_at_date(isin: str, name: str, date: datetime) -> Optional[float]:
             price = float(valid["Close"].iloc[-1])
             
             # Cache it
-            if isin not in cache:
-                cache[isin] = {}
-            cache[isin][date_str] = price
-            _save_json_cache(PRICE_CACHE_FILE, cache)
+            price_store.put_prices(isin, {date_str: price})
             
             return price
         
@@ -880,19 +970,10 @@ def get_prices_for_dates(isin: str, name: str, dates: List[datetime]) -> Dict[st
     
     date_strs = sorted(set(d.strftime("%Y-%m-%d") for d in dates))
     
-    # Load cache
-    cache = _load_json_cache(PRICE_CACHE_FILE)
-    isin_cache = cache.get(isin, {})
-    
     # Find which dates we already have (delta loading)
-    result = {}
-    missing_dates = []
-    
-    for date_str in date_strs:
-        if date_str in isin_cache:
-            result[date_str] = isin_cache[date_str]
-        else:
-            missing_dates.append(date_str)
+    result = price_store.get_prices(isin, date_strs)
+    missing_dates = [d for d in date_strs if d not in result]
+    new_prices: Dict[str, float] = {}
     
     # Log cache hit/miss summary
     cached_count = len(result)
@@ -905,18 +986,8 @@ def get_prices_for_dates(isin: str, name: str, dates: List[datetime]) -> Dict[st
     # ============================================================
     if isin in CRYPTO_COINGECKO_IDS:
         log.info(f"  Fetching {len(missing_dates)} crypto prices from CoinGecko...")
-        crypto_prices = get_crypto_prices_coingecko(isin, [datetime.strptime(d, "%Y-%m-%d") for d in missing_dates])
-        
-        total_new = 0
-        for date_str, price_eur in crypto_prices.items():
-            result[date_str] = price_eur
-            isin_cache[date_str] = price_eur
-            total_new += 1
-        
-        if total_new > 0:
-            cache[isin] = isin_cache
-            _save_json_cache(PRICE_CACHE_FILE, cache)
-            log.info(f"  ✓ Got {total_new} new + {cached_count} cached = {total_new + cached_count} crypto prices (in EUR)")
+        # Stores what it fetches itself (today excluded)
+        result.update(get_crypto_prices_coingecko(isin, [datetime.strptime(d, "%Y-%m-%d") for d in missing_dates]))
         return result
     
     # ============================================================
@@ -945,58 +1016,32 @@ def get_prices_for_dates(isin: str, name: str, dates: List[datetime]) -> Dict[st
     
     total_new = 0
     currency = None  # Will be fetched from Yahoo Finance
-    fx_rates = None
     
+    provider = get_provider()
     for range_start, range_end in missing_ranges:
         try:
-            ticker = yf.Ticker(symbol)
-            
-            # Get currency DIRECTLY from Yahoo Finance - this is the authoritative source
-            # This handles ALL currencies correctly: USD, EUR, GBp, JPY, HKD, etc.
             if currency is None:
-                try:
-                    currency = ticker.info.get('currency', 'EUR')
-                    log.debug(f"Yahoo currency for {symbol}: {currency}")
-                    fx_rates = get_fx_rates() if currency != 'EUR' else {}
-                except:
-                    # Fallback to our mapping if Yahoo info fails
-                    currency = get_currency_for_isin(isin, symbol)
-                    fx_rates = get_fx_rates() if currency != 'EUR' else {}
-            
-            start = datetime.strptime(range_start, "%Y-%m-%d") - timedelta(days=5)
-            end = datetime.strptime(range_end, "%Y-%m-%d") + timedelta(days=1)
+                currency = _price_currency(isin, symbol)
             
+            start, end = _range_bounds(range_start, range_end)
             log.debug(f"Delta load: Fetching {range_start} to {range_end} for {symbol}")
-            hist = ticker.history(start=start, end=end)
-            
-            if len(hist) == 0:
-                continue
-            
-            hist.index = hist.index.tz_localize(None)
-            hist = hist.sort_index()
+            hist = provider.history(symbol, start=start, end=end)
             
             # For each missing date in this range, find the closest valid price
-            for date_str in missing_dates:
-                if range_start <= date_str <= range_end:
-                    target = pd.Timestamp(date_str)
-                    
-                    # Get dates <= target
-                    valid = hist[hist.index <= target]
-                    if len(valid) > 0:
-                        raw_price = float(valid["Close"].iloc[-1])
-                        # Convert to EUR using the currency from Yahoo
-                        price_eur = convert_to_eur(raw_price, currency, fx_rates)
-                        result[date_str] = price_eur
-                        isin_cache[date_str] = price_eur
-                        total_new += 1
+            in_range = [d for d in missing_dates if range_start <= d <= range_end]
+            closes = _closes_on_or_before(hist, in_range)
+            # Convert to EUR using the currency from Yahoo and each date's FX rate
+            prices_eur = _closes_to_eur({isin: closes}, {isin: currency}).get(isin, {})
+            result.update(prices_eur)
+            new_prices.update(prices_eur)
+            total_new += len(prices_eur)
                         
         except Exception as e:
             log.warning(f"Failed to fetch prices for {symbol} ({range_start} to {range_end}): {e}")
     
     # Save updated cache if we got new data
     if total_new > 0:
-        cache[isin] = isin_cache
-        _save_json_cache(PRICE_CACHE_FILE, cache)
+        price_store.put_prices(isin, new_prices)
         log.info(f"  ✓ Got {total_new} new + {cached_count} cached = {total_new + cached_count} total (in EUR)")
     elif cached_count > 0:
         log.info(f"  ✓ {cached_count} from cache (fetch failed)")
@@ -1004,6 +1049,122 @@ def get_prices_for_dates(isin: str, name: str, dates: List[datetime]) -> Dict[st
     return result
 
 
+def _price_currency(isin: str, symbol: str) -> str:
+    """Trading currency of *symbol* (as Yahoo quotes it, e.g. "GBp")."""
+    # Get currency DIRECTLY from Yahoo Finance - this is the authoritative source
+    # This handles ALL currencies correctly: USD, EUR, GBp, JPY, HKD, etc.
+    try:
+        currency = _yahoo_currency(symbol)
+        log.debug(f"Yahoo currency for {symbol}: {currency}")
+    except Exception:
+        # Fallback to our mapping if Yahoo info fails
+        currency = get_currency_for_isin(isin, symbol)
+    return currency
+
+
+def _range_bounds(range_start: str, range_end: str) -> Tuple[datetime, datetime]:
+    # 5 days of lead-in so a date after a weekend/holiday still finds a close
+    start = datetime.strptime(range_start, "%Y-%m-%d") - timedelta(days=5)
+    end = datetime.strptime(range_end, "%Y-%m-%d") + timedelta(days=1)
+    return start, end
+
+
+def _closes_on_or_before(hist: pd.DataFrame, date_strs: List[str]) -> Dict[str, float]:
+    """Last close on or before each date (dates before the first bar are left out)."""
+    if hist is None or hist.empty or "Close" not in hist.columns:
+        return {}
+    close = hist["Close"].dropna()
+    if close.empty:
+        return {}
+    aligned = close.reindex(pd.DatetimeIndex(pd.to_datetime(date_strs)), method="ffill")
+    return {d: float(p) for d, p in zip(date_strs, aligned.to_numpy()) if not np.isnan(p)}
+
+
+# Symbols per multi-ticker download
+MAX_SYMBOLS_PER_DOWNLOAD = 50
+
+
+def get_prices_for_isins(isin_names: Dict[str, str], dates: List[datetime]) -> Dict[str, Dict[str, float]]:
+    """
+    Prices in EUR for many ISINs at the same dates: ``{isin: {date: price}}``.
+    
+    Yahoo-backed ISINs are backfilled together: their missing dates are
+    grouped into ranges (_group_dates_into_ranges), and all symbols that miss
+    the same range are fetched with one multi-ticker download. Crypto coins
+    share one quote request for today; their history and anything the grouped
+    download could not resolve go through get_prices_for_dates one ISIN at a
+    time.
+    """
+    if not dates or not isin_names:
+        return {}
+    date_strs = sorted(set(d.strftime("%Y-%m-%d") for d in dates))
+    
+    missing: Dict[str, List[str]] = {}
+    for isin in isin_names:
+        if isin in CRYPTO_COINGECKO_IDS or isin in NO_EXTERNAL_DATA:
+            continue
+        have = price_store.get_prices(isin, date_strs)
+        todo = [d for d in date_strs if d not in have]
+        if todo:
+            missing[isin] = todo
+    
+    # Symbol and currency per ISIN (lookups run concurrently)
+    symbols = resolve_isin_symbols({isin: isin_names[isin] for isin in missing})
+    
+    def resolve(isin):
+        symbol = symbols.get(isin)
+        return (symbol, _price_currency(isin, symbol)) if symbol else None
+    
+    resolved = {isin: r for isin, r in fetch_concurrently(missing, resolve) if r}
+    currencies = {isin: currency for isin, (_, currency) in resolved.items()}
+    if resolved:
+        # One grouped FX download for every currency involved
+        fx_store.ensure_rates(set(currencies.values()), min(min(missing[i]) for i in resolved), date_strs[-1])
+    
+    # {(range_start, range_end): [isin, ...]}
+    groups: Dict[Tuple[str, str], List[str]] = {}
+    for isin in resolved:
+        for date_range in _group_dates_into_ranges(missing[isin], max_gap_days=30):
+            groups.setdefault(date_range, []).append(isin)
+    batches = [
+        (date_range, isins[i:i + MAX_SYMBOLS_PER_DOWNLOAD])
+        for date_range, isins in groups.items()
+        for i in range(0, len(isins), MAX_SYMBOLS_PER_DOWNLOAD)
+    ]
+    if batches:
+        log.info(f"Backfilling {len(resolved)} instruments with {len(batches)} grouped download(s)")
+    
+    provider = get_provider()
+    
+    def fetch_batch(batch):
+        (range_start, range_end), isins = batch
+        start, end = _range_bounds(range_start, range_end)
+        return provider.history_many(sorted({resolved[i][0] for i in isins}), start=start, end=end)
+    
+    for ((range_start, range_end), isins), histories in fetch_concurrently(batches, fetch_batch):
+        if histories is None:
+            continue
+        closes = {}
+        for isin in isins:
+            in_range = [d for d in missing[isin] if range_start <= d <= range_end]
+            closes[isin] = _closes_on_or_before(histories.get(resolved[isin][0]), in_range)
+        # The whole batch is converted as one (date x ISIN) matrix
+        for isin, prices_eur in _closes_to_eur(closes, currencies).items():
+            price_store.put_prices(isin, prices_eur)
+    price_store.flush()
+    
+    result = {isin: price_store.get_prices(isin, date_strs) for isin in resolved}
+    crypto = [isin for isin in isin_names if isin in CRYPTO_COINGECKO_IDS]
+    if crypto and date_strs[-1] >= datetime.now().strftime("%Y-%m-%d"):
+        quotes = get_crypto_quotes_eur(crypto)
+        for isin, prices in fetch_concurrently(crypto, lambda i: get_crypto_prices_coingecko(i, dates, quote=quotes.get(i))):
+            result[isin] = prices or {}
+    rest = [isin for isin in isin_names if isin not in resolved and isin not in result]
+    for isin, prices in fetch_concurrently(rest, lambda i: get_prices_for_dates(i, isin_names[i], dates)):
+        result[isin] = prices or {}
+    return result
+
+
 def _group_dates_into_ranges(dates: List[str], max_gap_days: int = 30) -> List[Tuple[str, str]]:
     """Group a list of date strings into ranges for efficient fetching.
     
@@ -1126,6 +1287,33 @@ def get_prices_from_transactions(transactions: List[Dict], positions: List[Dict]
     return prices
 
 
+def align_prices(
+    prices_by_isin: Dict[str, Dict[str, float]],
+    target_dates: List[str],
+    isins: List[str] = None
+) -> pd.DataFrame:
+    """
+    Dense (date x ISIN) price matrix over target_dates, forward-filled.
+    
+    Each column holds the ISIN's known price on target dates where it has
+    one, carried forward to later target dates; NaN before the first such
+    date (and for ISINs without prices). Known prices on dates that are not
+    target dates are ignored, as in interpolate_prices.
+    
+    Args:
+        prices_by_isin: {isin: {date_str: price}}
+        target_dates: Date strings (YYYY-MM-DD) for the rows
+        isins: Column order (default: keys of prices_by_isin)
+    """
+    isins = list(prices_by_isin) if isins is None else list(isins)
+    index = pd.Index(sorted(set(target_dates)), name="date")
+    frame = pd.DataFrame(
+        {isin: pd.Series(prices_by_isin.get(isin) or {}, dtype=float) for isin in isins},
+        columns=isins,
+    )
+    return frame.reindex(index).ffill()
+
+
 def interpolate_prices(
     known_prices: Dict[str, float], 
     target_dates: List[str]
@@ -1142,33 +1330,178 @@ def interpolate_prices(
     """
     if not known_prices:
         return {}
+    column = align_prices({"_": known_prices}, target_dates)["_"].dropna()
+    return {d: float(p) for d, p in column.items()}
+
+
+# Bump when the persisted history state changes shape
+HISTORY_STATE_VERSION = 1
+
+_BUY_SUBTITLES = {'Kauforder', 'Sparplan ausgeführt', 'Limit-Buy-Order', 'Bonusaktien', 'Tausch'}
+_SELL_SUBTITLES = {'Verkaufsorder', 'Limit-Sell-Order', 'Stop-Sell-Order'}
+
+
+def _holdings_changes(transactions: List[Dict]) -> Tuple[Dict[str, List[Tuple[datetime, float, float]]], Set]:
+    """{isin: [(date, shares_change, cost_change)]} and the set of change days."""
+    holdings_changes: Dict[str, List[Tuple[datetime, float, float]]] = {}
+    all_dates = set()
     
-    result = {}
-    sorted_known = sorted(known_prices.keys())
-    first_known = sorted_known[0]
-    
-    last_price = None
-    for date_str in sorted(target_dates):
-        # Only start returning prices from first transaction onwards
-        if date_str < first_known:
+    for txn in transactions:
+        subtitle = txn.get("subtitle", "")
+        icon = txn.get("icon", "")
+        timestamp = txn.get("timestamp", "")
+        shares = float(txn.get("shares", 0) or 0)
+        amount = abs(float(txn.get("amount", 0) or 0))
+        
+        if not timestamp or shares <= 0:
+            continue
+        
+        isin = extract_isin_from_icon(icon)
+        if not isin:
+            continue
+        
+        try:
+            date = datetime.fromisoformat(timestamp.replace("+0000", "+00:00")).replace(tzinfo=None)
+        except:
             continue
         
-        # If we have an exact match, use it
-        if date_str in known_prices:
-            last_price = known_prices[date_str]
-            result[date_str] = last_price
-        elif last_price is not None:
-            # Forward fill with last known price
-            result[date_str] = last_price
+        if subtitle in _BUY_SUBTITLES:
+            holdings_changes.setdefault(isin, []).append((date, shares, amount))
+            all_dates.add(date.date())
+        elif subtitle in _SELL_SUBTITLES:
+            holdings_changes.setdefault(isin, []).append((date, -shares, -amount))
+            all_dates.add(date.date())
     
-    return result
+    return holdings_changes, all_dates
+
+
+def _history_dates(start_date, end_date, change_days: Set, since=None) -> List:
+    """Weekly dates from start_date + change days + end_date, from *since* on."""
+    history_dates = set()
+    # Add weekly dates for smoother charts
+    current = start_date
+    while current <= end_date:
+        history_dates.add(current)
+        current += timedelta(days=7)
+    # Add all transaction dates
+    history_dates.update(change_days)
+    # Add today
+    history_dates.add(end_date)
+    return sorted(d for d in history_dates if since is None or d >= since)
+
+
+def _day_digests(transactions: List[Dict], before: str) -> Dict[str, str]:
+    """Hash of each day's transactions (days before *before* only)."""
+    by_day: Dict[str, List[str]] = {}
+    for txn in transactions:
+        day = (txn.get("timestamp") or "")[:10]
+        if day and day < before:
+            by_day.setdefault(day, []).append(json.dumps(txn, sort_keys=True, default=str))
+    return {
+        day: hashlib.sha1("\n".join(sorted(rows)).encode("utf-8")).hexdigest()[:16]
+        for day, rows in by_day.items()
+    }
+
+
+def _history_segment(
+    holdings_changes: Dict[str, List[Tuple[datetime, float, float]]],
+    isin_prices: Dict[str, Dict[str, float]],
+    sorted_dates: List,
+    base: Dict[str, Dict[str, float]],
+) -> Tuple[List[Dict], Dict[str, List[Dict]], Dict[str, Dict[str, float]]]:
+    """
+    History rows for *sorted_dates*, starting from the *base* state.
+    
+    base holds {"holdings", "invested", "prices"} per ISIN as of the day
+    before the first date (empty for a full build); holdings_changes and
+    isin_prices must only contain changes on or after that first date.
+    
+    Returns (history rows, {isin: value history}, state as of yesterday).
+    """
+    date_strs = [d.strftime("%Y-%m-%d") for d in sorted_dates]
+    isins = list(base["holdings"]) + [i for i in holdings_changes if i not in base["holdings"]]
+    
+    # Holdings and invested amount at every date as (date x ISIN) matrices
+    _, holdings, invested = holdings_matrix({i: holdings_changes.get(i, []) for i in isins}, sorted_dates)
+    holdings += np.array([base["holdings"].get(i, 0.0) for i in isins])
+    invested += np.array([base["invested"].get(i, 0.0) for i in isins])
+    
+    # Prices forward-filled onto all dates; before an ISIN's first new price
+    # the last price from the base state applies
+    aligned = align_prices(isin_prices, date_strs, isins)
+    aligned = aligned.fillna(pd.Series(base["prices"], dtype=float).reindex(isins))
+    prices = aligned.to_numpy(dtype=float)
+    
+    history = []
+    position_value_histories: Dict[str, List[Dict]] = {isin: [] for isin in isins}
+    
+    held = (holdings > 0) & (invested > 0)
+    priced = held & (prices > 0)  # NaN (no price) compares False
+    # No price - use invested as fallback
+    values = np.where(priced, holdings * np.nan_to_num(prices), np.where(held, invested, 0.0))
+    unit_prices = np.where(priced, prices, np.divide(invested, holdings, out=np.zeros_like(invested), where=held))
+    total_invested = np.where(held, invested, 0.0).sum(axis=1)
+    total_value = values.sum(axis=1)
+    
+    for i, date_str in enumerate(date_strs):
+        if total_invested[i] > 0:
+            history.append({
+                "date": date_str,
+                "invested": round(float(total_invested[i]), 2),
+                "value": round(float(total_value[i]), 2)
+            })
+    
+    for col, isin in enumerate(isins):
+        for i in np.flatnonzero(held[:, col]):
+            position_value_histories[isin].append({
+                'date': date_strs[i],
+                'value': float(values[i, col]),
+                'holdings': float(holdings[i, col]),
+                'price': float(unit_prices[i, col])
+            })
+    
+    # State as of yesterday: today's transactions may still change
+    yesterday = datetime.now().date() - timedelta(days=1)
+    _, h_y, inv_y = holdings_matrix({i: holdings_changes.get(i, []) for i in isins}, [yesterday])
+    last_prices = aligned[aligned.index <= yesterday.strftime("%Y-%m-%d")].ffill()
+    last_prices = last_prices.iloc[-1] if len(last_prices) else pd.Series(base["prices"], dtype=float)
+    state = {
+        "holdings": {i: float(h_y[0, c] + base["holdings"].get(i, 0.0)) for c, i in enumerate(isins)},
+        "invested": {i: float(inv_y[0, c] + base["invested"].get(i, 0.0)) for c, i in enumerate(isins)},
+        "prices": {i: float(p) for i, p in last_prices.items() if not pd.isna(p)},
+    }
+    return history, position_value_histories, state
+
+
+def _position_histories(position_value_histories: Dict[str, List[Dict]], positions: List[Dict]) -> Dict[str, Dict]:
+    """Position histories in the format stored in the portfolio cache."""
+    pos_lookup = {p.get("isin", ""): p for p in positions}
+    position_histories = {}
+    for isin, value_history in position_value_histories.items():
+        if not value_history:
+            continue
+        
+        pos = pos_lookup.get(isin, {})
+        
+        # Get current holdings from last entry
+        current_holdings = value_history[-1]['holdings'] if value_history else 0
+        
+        position_histories[isin] = {
+            'name': pos.get('name', isin),
+            'instrumentType': pos.get('instrumentType', 'unknown'),
+            'quantity': current_holdings,
+            'history': [{'date': h['date'], 'price': h['price']} for h in value_history],
+            'valueHistory': value_history  # Full value history for calculations
+        }
+    return position_histories
 
 
 def build_portfolio_history_from_transactions(
     transactions: List[Dict],
     positions: List[Dict],
     progress_callback=None,
-    return_position_histories: bool = False
+    return_position_histories: bool = False,
+    return_state: bool = False
 ) -> List[Dict]:
     """
     Build portfolio history using ONLY TR transaction data.
@@ -1189,10 +1522,13 @@ def build_portfolio_history_from_transactions(
         positions: List of current position dicts (for metadata)
         progress_callback: Optional callback(step, total, message)
         return_position_histories: If True, return (history, position_histories) tuple
+        return_state: If True (with return_position_histories), also return the
+            state used by extend_portfolio_history_from_transactions
         
     Returns:
         List of {date, invested, value} dicts
         OR if return_position_histories: Tuple of (history_list, position_histories_dict)
+        OR with return_state as well: (history_list, position_histories_dict, state)
     """
     log.info("Building portfolio history from TR transaction prices (PRIMARY method)...")
     
@@ -1206,132 +1542,25 @@ def build_portfolio_history_from_transactions(
         progress_callback(10, 100, "Building holdings timeline...")
     
     # Step 2: Build holdings timeline
-    BUY_SUBTITLES = {'Kauforder', 'Sparplan ausgeführt', 'Limit-Buy-Order', 'Bonusaktien', 'Tausch'}
-    SELL_SUBTITLES = {'Verkaufsorder', 'Limit-Sell-Order', 'Stop-Sell-Order'}
-    
-    # Track: {isin: [(date, shares_change, cost_change)]}
-    holdings_changes: Dict[str, List[Tuple[datetime, float, float]]] = {}
-    all_dates = set()
-    
-    for txn in transactions:
-        subtitle = txn.get("subtitle", "")
-        icon = txn.get("icon", "")
-        timestamp = txn.get("timestamp", "")
-        shares = float(txn.get("shares", 0) or 0)
-        amount = abs(float(txn.get("amount", 0) or 0))
-        
-        if not timestamp or shares <= 0:
-            continue
-        
-        isin = extract_isin_from_icon(icon)
-        if not isin:
-            continue
-        
-        try:
-            date = datetime.fromisoformat(timestamp.replace("+0000", "+00:00")).replace(tzinfo=None)
-        except:
-            continue
-        
-        if subtitle in BUY_SUBTITLES:
-            holdings_changes.setdefault(isin, []).append((date, shares, amount))
-            all_dates.add(date.date())
-        elif subtitle in SELL_SUBTITLES:
-            holdings_changes.setdefault(isin, []).append((date, -shares, -amount))
-            all_dates.add(date.date())
+    holdings_changes, all_dates = _holdings_changes(transactions)
     
     if not holdings_changes:
         log.warning("No holdings changes found")
-        return ([], {}) if return_position_histories else []
+        if return_position_histories:
+            return ([], {}, None) if return_state else ([], {})
+        return []
     
     # Step 3: Generate history dates (weekly + transaction dates + today)
     start_date = min(all_dates)
     end_date = datetime.now().date()
-    
-    history_dates = set()
-    # Add weekly dates for smoother charts
-    current = start_date
-    while current <= end_date:
-        history_dates.add(current)
-        current += timedelta(days=7)
-    # Add all transaction dates
-    history_dates.update(all_dates)
-    # Add today
-    history_dates.add(end_date)
-    
-    sorted_dates = sorted(history_dates)
-    date_strs = [d.strftime("%Y-%m-%d") for d in sorted_dates]
-    
-    if progress_callback:
-        progress_callback(30, 100, "Interpolating prices...")
-    
-    # Step 4: Interpolate prices for all dates
-    interpolated_prices: Dict[str, Dict[str, float]] = {}
-    for isin, known_prices in isin_prices.items():
-        interpolated_prices[isin] = interpolate_prices(known_prices, date_strs)
+    sorted_dates = _history_dates(start_date, end_date, all_dates)
     
     if progress_callback:
-        progress_callback(50, 100, "Calculating portfolio values...")
+        progress_callback(30, 100, "Calculating portfolio values...")
     
-    # Step 5: Calculate holdings, invested, and value at each date
-    history = []
-    isin_to_name = {p.get("isin", ""): p.get("name", "") for p in positions}
-    pos_lookup = {p.get("isin", ""): p for p in positions}
-    
-    # Track per-position value histories for filtering
-    position_value_histories: Dict[str, List[Dict]] = {isin: [] for isin in holdings_changes.keys()}
-    
-    for i, date in enumerate(sorted_dates):
-        date_str = date.strftime("%Y-%m-%d")
-        
-        total_value = 0.0
-        total_invested = 0.0
-        
-        for isin, changes in holdings_changes.items():
-            # Calculate holdings and invested at this date
-            holdings = 0.0
-            invested = 0.0
-            for change_date, shares_change, cost_change in changes:
-                if change_date.date() <= date:
-                    holdings += shares_change
-                    invested += cost_change
-            
-            # Get price for this date
-            price = interpolated_prices.get(isin, {}).get(date_str)
-            
-            if holdings > 0 and invested > 0:
-                total_invested += invested
-                
-                if price and price > 0:
-                    value = holdings * price
-                    total_value += value
-                    
-                    # Track position history
-                    position_value_histories[isin].append({
-                        'date': date_str,
-                        'value': value,
-                        'holdings': holdings,
-                        'price': price
-                    })
-                else:
-                    # No price - use invested as fallback
-                    total_value += invested
-                    position_value_histories[isin].append({
-                        'date': date_str,
-                        'value': invested,
-                        'holdings': holdings,
-                        'price': invested / holdings if holdings > 0 else 0
-                    })
-        
-        if total_invested > 0:
-            history.append({
-                "date": date_str,
-                "invested": round(total_invested, 2),
-                "value": round(total_value, 2)
-            })
-        
-        if progress_callback and i % 50 == 0:
-            pct = 50 + int(50 * i / len(sorted_dates))
-            progress_callback(pct, 100, f"Processing {date_str}...")
+    # Step 4: Holdings, prices and values at every date, from an empty portfolio
+    empty = {"holdings": {}, "invested": {}, "prices": {}}
+    history, position_value_histories, state = _history_segment(holdings_changes, isin_prices, sorted_dates, empty)
     
     if progress_callback:
         progress_callback(100, 100, "Complete!")
@@ -1342,31 +1571,108 @@ def build_portfolio_history_from_transactions(
         log.info(f"  Last:  {history[-1]['date']} = €{history[-1]['value']:,.2f}")
     
     if return_position_histories:
-        # Build position histories in expected format
-        position_histories = {}
-        for isin, value_history in position_value_histories.items():
-            if not value_history:
-                continue
-            
-            pos = pos_lookup.get(isin, {})
-            
-            # Get current holdings from last entry
-            current_holdings = value_history[-1]['holdings'] if value_history else 0
-            
-            position_histories[isin] = {
-                'name': pos.get('name', isin),
-                'instrumentType': pos.get('instrumentType', 'unknown'),
-                'quantity': current_holdings,
-                'history': [{'date': h['date'], 'price': h['price']} for h in value_history],
-                'valueHistory': value_history  # Full value history for calculations
-            }
-        
+        position_histories = _position_histories(position_value_histories, positions)
         log.info(f"Built position histories for {len(position_histories)} instruments")
+        if return_state:
+            today = end_date.strftime("%Y-%m-%d")
+            state.update(
+                version=HISTORY_STATE_VERSION,
+                as_of=today,
+                start_date=start_date.strftime("%Y-%m-%d"),
+                digests=_day_digests(transactions, today),
+            )
+            return history, position_histories, state
         return history, position_histories
     
     return history
 
 
+def extend_portfolio_history_from_transactions(
+    transactions: List[Dict],
+    positions: List[Dict],
+    history: List[Dict],
+    position_histories: Dict[str, Dict],
+    state: Dict
+) -> Optional[Tuple[List[Dict], Dict[str, Dict], Dict]]:
+    """
+    Bring a transaction-based history up to date without rebuilding it.
+    
+    *state* is the one saved with the previous history. It holds holdings,
+    invested amount and last price per ISIN as of the day before it was
+    computed, plus a hash of each earlier day's transactions. Only dates from
+    the earliest affected day onwards are recomputed: the day the state was
+    taken, or the first earlier day whose transactions changed (in that case
+    the state for that day is rebuilt from the older transactions).
+    
+    Returns (history, position_histories, state) like
+    build_portfolio_history_from_transactions(..., return_position_histories=True,
+    return_state=True), or None when a full rebuild is needed.
+    """
+    if not state or state.get("version") != HISTORY_STATE_VERSION or not history:
+        return None
+    if any("valueHistory" not in p for p in position_histories.values()):
+        return None
+    
+    today = datetime.now().date()
+    today_str = today.strftime("%Y-%m-%d")
+    as_of = state["as_of"]
+    if as_of > today_str:
+        return None
+    
+    # Earliest day whose transactions differ from what the state was built on
+    old_digests = state.get("digests", {})
+    new_digests = _day_digests(transactions, as_of)
+    changed = [d for d in set(old_digests) | set(new_digests) if old_digests.get(d) != new_digests.get(d)]
+    resume = min(changed + [as_of])
+    if resume < state["start_date"]:
+        return None  # new first transaction: the weekly grid moves
+    
+    resume_date = datetime.strptime(resume, "%Y-%m-%d").date()
+    start_date = datetime.strptime(state["start_date"], "%Y-%m-%d").date()
+    if resume == as_of:
+        base = {k: state[k] for k in ("holdings", "invested", "prices")}
+    else:
+        # Rebuild the base state for the day before resume from older transactions
+        older = [t for t in transactions if (t.get("timestamp") or "")[:10] < resume]
+        old_changes, old_days = _holdings_changes(older)
+        old_dates = _history_dates(start_date, resume_date - timedelta(days=1), old_days)
+        old_prices = align_prices(get_prices_from_transactions(older), [d.strftime("%Y-%m-%d") for d in old_dates],
+                                  list(old_changes)).ffill()
+        _, h, inv = holdings_matrix(old_changes, [resume_date - timedelta(days=1)])
+        last = old_prices.iloc[-1] if len(old_prices) else pd.Series(dtype=float)
+        base = {
+            "holdings": {i: float(h[0, c]) for c, i in enumerate(old_changes)},
+            "invested": {i: float(inv[0, c]) for c, i in enumerate(old_changes)},
+            "prices": {i: float(p) for i, p in last.items() if not pd.isna(p)},
+        }
+    
+    newer = [t for t in transactions if (t.get("timestamp") or "")[:10] >= resume]
+    new_changes, new_days = _holdings_changes(newer)
+    sorted_dates = _history_dates(start_date, today, new_days, since=resume_date)
+    rows, value_histories, new_state = _history_segment(
+        new_changes, get_prices_from_transactions(newer), sorted_dates, base
+    )
+    
+    merged: Dict[str, List[Dict]] = {
+        isin: [h for h in p["valueHistory"] if h["date"] < resume] for isin, p in position_histories.items()
+    }
+    for isin, entries in value_histories.items():
+        merged.setdefault(isin, []).extend(entries)
+    
+    new_state.update(
+        version=HISTORY_STATE_VERSION,
+        as_of=today_str,
+        start_date=state["start_date"],
+        digests=_day_digests(transactions, today_str),
+    )
+    log.info(f"Extended portfolio history from {resume}: {len(sorted_dates)} dates recomputed")
+    return (
+        [h for h in history if h["date"] < resume] + rows,
+        _position_histories(merged, positions),
+        new_state,
+    )
+
+
 def build_portfolio_history(
     transactions: List[Dict],
     positions: List[Dict],
@@ -1479,23 +1785,22 @@ def build_portfolio_history(
     # For each ISIN, get prices at all history dates
     isin_prices: Dict[str, Dict[str, float]] = {}
     isins = list(holdings_changes.keys())
+    dates_as_dt = [datetime.combine(d, datetime.min.time()) for d in sorted_dates]
     
-    for idx, isin in enumerate(isins):
+    # Grouped multi-ticker backfill, then per-ISIN lookups for the rest
+    if progress_callback:
+        progress_callback(15, 100, f"Fetching prices for {len(isins)} instruments...")
+    fetched = get_prices_for_isins({i: isin_to_name.get(i, i) for i in isins}, dates_as_dt)
+    for isin in isins:
         name = isin_to_name.get(isin, isin)
-        
-        if progress_callback:
-            pct = 10 + int(60 * (idx + 1) / len(isins))
-            progress_callback(pct, 100, f"Fetching prices for {name[:30]}...")
-        
-        # Get prices for all dates we need
-        dates_as_dt = [datetime.combine(d, datetime.min.time()) for d in sorted_dates]
-        prices = get_prices_for_dates(isin, name, dates_as_dt)
+        prices = fetched.get(isin, {})
         isin_prices[isin] = prices
         
         if prices:
             log.info(f"Got {len(prices)} prices for {name} ({isin})")
         else:
             log.warning(f"No prices found for {name} ({isin})")
+    price_store.flush()
     
     if progress_callback:
         progress_callback(70, 100, "Calculating portfolio values...")
@@ -1618,7 +1923,7 @@ def update_position_values(positions: List[Dict]) -> List[Dict]:
     Update position values with current market prices converted to EUR.
     
     This function:
-    1. Gets current prices from Yahoo Finance
+    1. Gets current prices for all positions at once (get_current_prices_eur)
     2. Converts all prices to EUR using live FX rates
     3. Calculates current value = quantity × price_eur
     4. Calculates profit = value - invested
@@ -1627,11 +1932,13 @@ def update_position_values(positions: List[Dict]) -> List[Dict]:
     """
     log.info("Updating position values with current EUR prices...")
     
-    fx_rates = get_fx_rates()
     updated = []
     total_value = 0
     total_invested = 0
     
+    # Current prices for all positions at once (grouped requests, short-lived cache)
+    quotes = get_current_prices_eur({pos.get("isin", ""): pos.get("name", "") for pos in positions})
+    
     for pos in positions:
         isin = pos.get("isin", "")
         name = pos.get("name", "")
@@ -1640,8 +1947,7 @@ def update_position_values(positions: List[Dict]) -> List[Dict]:
         
         total_invested += invested
         
-        # Try to get current price in EUR
-        result = get_current_price_eur(isin, name)
+        result = quotes.get(isin)
         
         if result:
             price_eur, ticker = result
@@ -1708,6 +2014,7 @@ def calculate_and_save_history(force_rebuild: bool = False) -> Tuple[bool, str,
         return False, "No transactions found. History requires transaction data.", []
     
     # Check if we already have valid cached history
+    cached = {}
     if not force_rebuild and PORTFOLIO_HISTORY_CACHE_FILE.exists():
         try:
             cached = json.loads(PORTFOLIO_HISTORY_CACHE_FILE.read_text(encoding="utf-8"))
@@ -1721,6 +2028,7 @@ def calculate_and_save_history(force_rebuild: bool = False) -> Tuple[bool, str,
                     return True, f"Using cached history ({len(history)} points)", history
         except Exception as e:
             log.warning(f"Failed to load history cache: {e}")
+            cached = {}
     
     # =========================================================================
     # UPDATE CURRENT POSITION VALUES WITH LIVE EUR PRICES
@@ -1738,19 +2046,27 @@ def calculate_and_save_history(force_rebuild: bool = False) -> Tuple[bool, str,
     # =========================================================================
     # BUILD PORTFOLIO HISTORY (PRIMARY: Transaction-based, no external APIs)
     # =========================================================================
-    log.info("Building portfolio history from transaction prices (PRIMARY method)...")
-    
-    result = build_portfolio_history_from_transactions(
-        transactions=transactions,
-        positions=updated_positions,
-        return_position_histories=True
-    )
+    # A stale cache is extended from the state saved with it; only dates from
+    # the earliest new or changed transaction onwards are recomputed
+    result = None
+    if cached.get("state"):
+        result = extend_portfolio_history_from_transactions(
+            transactions=transactions,
+            positions=updated_positions,
+            history=cached.get("history", []),
+            position_histories=cached.get("positionHistories", {}),
+            state=cached["state"]
+        )
+    if result is None:
+        log.info("Building portfolio history from transaction prices (PRIMARY method)...")
+        result = build_portfolio_history_from_transactions(
+            transactions=transactions,
+            positions=updated_positions,
+            return_position_histories=True,
+            return_state=True
+        )
     
-    if isinstance(result, tuple):
-        history, position_histories = result
-    else:
-        history = result
-        position_histories = {}
+    history, position_histories, history_state = result
     
     # Fallback to Yahoo/CoinGecko if transaction-based fails
     if not history:
@@ -1767,6 +2083,7 @@ def calculate_and_save_history(force_rebuild: bool = False) -> Tuple[bool, str,
         else:
             history = result
             position_histories = {}
+        history_state = None
     
     if not history:
         return False, "Failed to build history. Check logs for details.", []
@@ -1791,6 +2108,10 @@ def calculate_and_save_history(force_rebuild: bool = False) -> Tuple[bool, str,
             "cached_at": datetime.now().isoformat(),
             "history": history
         }
+        if history_state:
+            # Lets the next recalculation extend instead of rebuild
+            cache_data["state"] = history_state
+            cache_data["positionHistories"] = position_histories
         _save_json_cache(PORTFOLIO_HISTORY_CACHE_FILE, cache_data)
         
         # Update portfolio_cache.json with updated positions and values
@@ -0,0 +1,162 @@
+"""
+Price Store
+Historical EUR prices per (isin, date) in a local SQLite table.
+
+Replaces ``price_cache.json``, which was parsed and rewritten in full for
+every new price. Reads go through an in-process dict per ISIN, loaded with
+one indexed query the first time the ISIN is used. New prices go into that
+dict at once and are written to SQLite in batches (write-behind): when
+FLUSH_ROWS rows are pending, on :func:`flush`, and at interpreter exit.
+
+The old JSON file is imported once on first use and renamed to
+``price_cache.json.migrated``.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from components.local_db import get_connection
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = Path.home() / ".pytr"
+PRICE_DB_FILE = CACHE_DIR / "price_store.sqlite"
+LEGACY_JSON_FILE = CACHE_DIR / "price_cache.json"  # {isin: {date: price}}
+
+# Pending rows that trigger a write
+FLUSH_ROWS = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    isin  TEXT NOT NULL,
+    date  TEXT NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (isin, date)
+) WITHOUT ROWID
+"""
+
+_lock = threading.RLock()
+_prices: Dict[str, Dict[str, float]] = {}   # read cache, per ISIN
+_pending: Dict[str, Dict[str, float]] = {}  # not yet written
+_pending_rows = 0
+_schema_ready_pid: Optional[int] = None
+
+
+def _conn():
+    global _schema_ready_pid
+    conn = get_connection(PRICE_DB_FILE)
+    if _schema_ready_pid != os.getpid():
+        conn.executescript(_SCHEMA)
+        _schema_ready_pid = os.getpid()
+        _migrate_json(conn)
+    return conn
+
+
+def _migrate_json(conn) -> None:
+    """Import the legacy ``price_cache.json`` once, then move it aside."""
+    if not LEGACY_JSON_FILE.exists():
+        return
+    try:
+        data = json.loads(LEGACY_JSON_FILE.read_text(encoding="utf-8"))
+    except Exception as e:
+        log.warning(f"Could not read {LEGACY_JSON_FILE.name} for migration: {e}")
+        return
+    rows = [
+        (isin, date_str, float(price))
+        for isin, prices in data.items() if isinstance(prices, dict)
+        for date_str, price in prices.items() if price is not None
+    ]
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        # Existing rows win: they are at least as recent as the JSON
+        conn.executemany("INSERT OR IGNORE INTO prices (isin, date, price) VALUES (?, ?, ?)", rows)
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        log.warning(f"Price cache migration failed: {e}")
+        return
+    try:
+        LEGACY_JSON_FILE.replace(LEGACY_JSON_FILE.with_name(LEGACY_JSON_FILE.name + ".migrated"))
+    except OSError:
+        pass  # another worker moved it first
+    log.info(f"Migrated {len(rows)} prices from {LEGACY_JSON_FILE.name}")
+
+
+def _load_isin(isin: str) -> Dict[str, float]:
+    rows = _conn().execute("SELECT date, price FROM prices WHERE isin = ?", (isin,)).fetchall()
+    prices = dict(rows)
+    prices.update(_pending.get(isin, {}))
+    _prices[isin] = prices
+    return prices
+
+
+def get_isin_prices(isin: str) -> Dict[str, float]:
+    """All stored prices of *isin* as ``{date: price}`` (do not modify)."""
+    with _lock:
+        prices = _prices.get(isin)
+        return prices if prices is not None else _load_isin(isin)
+
+
+def get_price(isin: str, date_str: str) -> Optional[float]:
+    return get_prices(isin, [date_str]).get(date_str)
+
+
+def get_prices(isin: str, date_strs: Iterable[str]) -> Dict[str, float]:
+    """Stored prices of *isin* for the requested dates (missing dates are left out).
+
+    On a miss the ISIN is re-read once, in case another worker stored it.
+    """
+    date_strs = list(date_strs)
+    with _lock:
+        prices = _prices.get(isin)
+        fresh = prices is None
+        if fresh:
+            prices = _load_isin(isin)
+        found = {d: prices[d] for d in date_strs if d in prices}
+        if len(found) < len(date_strs) and not fresh:
+            prices = _load_isin(isin)
+            found = {d: prices[d] for d in date_strs if d in prices}
+    return found
+
+
+def put_prices(isin: str, prices: Dict[str, float]) -> None:
+    """Store ``{date: price}`` for *isin*; written to disk in batches."""
+    global _pending_rows
+    if not prices:
+        return
+    with _lock:
+        _prices.setdefault(isin, {}).update(prices)
+        _pending.setdefault(isin, {}).update(prices)
+        _pending_rows += len(prices)
+        if _pending_rows >= FLUSH_ROWS:
+            flush()
+
+
+def flush() -> int:
+    """Write pending prices in one transaction; returns the number of rows."""
+    global _pending_rows
+    with _lock:
+        if not _pending:
+            return 0
+        rows = [(isin, d, p) for isin, prices in _pending.items() for d, p in prices.items()]
+        conn = _conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR REPLACE INTO prices (isin, date, price) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            log.warning(f"Price store write failed, keeping {len(rows)} rows pending: {e}")
+            return 0
+        _pending.clear()
+        _pending_rows = 0
+    log.debug(f"Price store: wrote {len(rows)} rows")
+    return len(rows)
+
+
+atexit.register(flush)
@@ -23,6 +23,9 @@ AVAILABLE_INDICATORS = [
     {"label": "Bollinger Lower", "value": "current('bollinger_lower')"},
     {"label": "Last Highest", "value": "current('last_highest')"},
     {"label": "Last Lowest", "value": "current('last_lowest')"},
+    # Trained price model (see core.prediction)
+    {"label": "Model Prediction", "value": "current('model_pred')"},
+    {"label": "Model Predicted Return", "value": "current('model_pred_return')"},
 ]
 
 COMPARISON_OPERATORS = [
@@ -0,0 +1,167 @@
+"""
+Shared Cache
+Cross-process key/value cache backed by a local SQLite file.
+
+Module-level dicts (benchmarks, FX rates, asset frames, figures) only live in
+one gunicorn worker. This store sits underneath them as a second level so a
+value fetched by one worker is reused by all others, and every worker sees the
+same timestamp for it.
+
+Values are pickled, so DataFrames round-trip without conversion.
+"""
+
+import logging
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from components.local_db import get_connection
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = Path.home() / ".pytr"
+SHARED_CACHE_FILE = CACHE_DIR / "shared_cache.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key       TEXT NOT NULL,
+    value     BLOB NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name       TEXT PRIMARY KEY,
+    holder     INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+)
+"""
+
+_schema_ready_pid: Optional[int] = None
+
+
+def _conn():
+    global _schema_ready_pid
+    conn = get_connection(SHARED_CACHE_FILE)
+    if _schema_ready_pid != os.getpid():
+        conn.executescript(_SCHEMA)
+        _schema_ready_pid = os.getpid()
+    return conn
+
+
+def cache_get_entry(namespace: str, key: str, max_age: float = None) -> Optional[Tuple[Any, float]]:
+    """Return ``(value, stored_at)`` or None if missing, expired or unreadable."""
+    try:
+        row = _conn().execute(
+            "SELECT value, stored_at FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+    except Exception as e:
+        log.debug(f"Shared cache read failed for {namespace}/{key}: {e}")
+        return None
+    if row is None:
+        return None
+    blob, stored_at = row
+    if max_age is not None and time.time() - stored_at > max_age:
+        return None
+    try:
+        return pickle.loads(blob), stored_at
+    except Exception as e:
+        log.debug(f"Shared cache entry {namespace}/{key} is corrupt: {e}")
+        return None
+
+
+def cache_get(namespace: str, key: str, max_age: float = None) -> Optional[Any]:
+    """Return the cached value, or None if missing or older than *max_age* seconds."""
+    entry = cache_get_entry(namespace, key, max_age)
+    return entry[0] if entry else None
+
+
+def cache_stored_at(namespace: str, key: str) -> Optional[float]:
+    """Return when *key* was last written (epoch seconds) without unpickling it."""
+    try:
+        row = _conn().execute(
+            "SELECT stored_at FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        log.debug(f"Shared cache stamp read failed for {namespace}/{key}: {e}")
+        return None
+
+
+def cache_set(namespace: str, key: str, value: Any, max_entries: int = None) -> Optional[float]:
+    """Store *value* and return its timestamp.
+
+    If *max_entries* is given, the oldest entries of the namespace beyond that
+    count are dropped (LRU-by-write, like the in-process figure cache).
+    """
+    stored_at = time.time()
+    try:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn = _conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, blob, stored_at),
+        )
+        if max_entries is not None:
+            conn.execute(
+                """DELETE FROM entries WHERE namespace = ? AND key NOT IN (
+                       SELECT key FROM entries WHERE namespace = ?
+                       ORDER BY stored_at DESC LIMIT ?)""",
+                (namespace, namespace, max_entries),
+            )
+        return stored_at
+    except Exception as e:
+        log.debug(f"Shared cache write failed for {namespace}/{key}: {e}")
+        return None
+
+
+def cache_delete(namespace: str, key: str = None) -> None:
+    """Delete one key, or the whole namespace if *key* is None."""
+    try:
+        if key is None:
+            _conn().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+        else:
+            _conn().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+    except Exception as e:
+        log.debug(f"Shared cache delete failed for {namespace}/{key}: {e}")
+
+
+def try_acquire_lease(name: str, ttl: float) -> bool:
+    """Claim *name* for *ttl* seconds across all workers.
+
+    Used so only one worker runs a given network refresh; the others keep
+    serving what is already cached. Returns True if this process holds the lease.
+    """
+    now = time.time()
+    conn = _conn()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        if row is not None and row[1] > now and row[0] != os.getpid():
+            conn.execute("COMMIT")
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+            (name, os.getpid(), now + ttl),
+        )
+        conn.execute("COMMIT")
+        return True
+    except Exception as e:
+        log.debug(f"Lease {name} could not be acquired: {e}")
+        try:
+            conn.execute("ROLLBACK")
+        except Exception:
+            pass
+        return False
+
+
+def release_lease(name: str) -> None:
+    """Give up a lease held by this process."""
+    try:
+        _conn().execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, os.getpid()))
+    except Exception as e:
+        log.debug(f"Lease {name} could not be released: {e}")
@@ -9,15 +9,28 @@ import os
 import json
 import base64
 import hashlib
+import time
 from pathlib import Path
 from typing import Optional, Dict, Any, Tuple, List
 import threading
 from concurrent.futures import TimeoutError as FuturesTimeoutError
 
+import numpy as np
+import pandas as pd
+
 # Minimum seconds between Trade Republic syncs.
 # Keeps the app responsive and prevents accidental rapid re-syncs.
 MIN_SYNC_INTERVAL_SECONDS = 6 * 60 * 60  # 6 hours
 
+# Instrument details (name, type, image) are fetched again after this long
+INSTRUMENT_DETAILS_TTL = 30 * 24 * 60 * 60  # 30 days
+
+# Subscriptions in flight at once when requests are pipelined over the websocket
+SUBSCRIPTION_WINDOW = 200
+
+# Delta timeline loads stop once this many already-cached transactions were seen
+TIMELINE_OVERLAP_MARGIN = 3
+
 # pytr imports
 from pytr.api import TradeRepublicApi
 from pytr.utils import get_logger
@@ -81,6 +94,16 @@ def decrypt_credentials(encrypted: str) -> Tuple[Optional[str], Optional[str]]:
         return None, None
 
 
+def _as_of(series: Dict[str, Dict[str, float]], date_strs: List[str]) -> pd.DataFrame:
+    """(date x key) frame with each key's last value on or before each date.
+
+    *series* is {key: {date_str: value}}; NaN before a key's first date.
+    """
+    frame = pd.DataFrame({key: pd.Series(values, dtype=float) for key, values in series.items()})
+    frame = frame.sort_index()
+    return frame.reindex(frame.index.union(date_strs)).ffill().reindex(date_strs)
+
+
 class TRConnection:
     """Manages Trade Republic connection state.
 
@@ -102,6 +125,7 @@ class TRConnection:
         self._thread: Optional[threading.Thread] = None
         self._loop_ready = threading.Event()
         self._op_lock = threading.Lock()
+        self._subscription_manager = None  # components.tr_subscriptions.SubscriptionManager
 
         # ── Per-user cache directory ────────────────────────────────────
         self._user_cache_dir = TR_CREDENTIALS_DIR / user_id
@@ -162,32 +186,66 @@ class TRConnection:
     def run_serialized(self, coro, timeout: float = 90):
         """Run a coroutine while holding an operation lock.
 
-        This prevents overlapping websocket recv/unsubscribe calls from multiple Dash callbacks.
+        For operations that replace the api or rewrite the caches. Websocket
+        traffic itself is demultiplexed by the subscription manager, so other
+        operations may overlap freely.
         """
         with self._op_lock:
             return self.run(coro, timeout=timeout)
 
+    def _subscriptions(self):
+        """Subscription manager for the current api (call on the worker loop).
+
+        A new login replaces ``self.api``; its manager is then replaced too.
+        """
+        from components.tr_subscriptions import SubscriptionManager
+        if self._subscription_manager is None or self._subscription_manager.api is not self.api:
+            if self._subscription_manager is not None:
+                self._subscription_manager.close()
+            self._subscription_manager = SubscriptionManager(self.api)
+        return self._subscription_manager
+
     def has_credentials(self) -> bool:
         """Best-effort check for a reusable TR session (keyfile)."""
         return self._keyfile_path.exists()
 
-    def _load_instrument_cache(self) -> Dict[str, str]:
-        try:
-            if self._instrument_cache_path.exists():
-                data = json.loads(self._instrument_cache_path.read_text(encoding="utf-8"))
-                if isinstance(data, dict):
-                    # values should be shortName/name strings
-                    return {str(k): str(v) for k, v in data.items() if k and v}
-        except Exception as e:
-            log.warning(f"Failed to load instrument cache: {e}")
-        return {}
+    def _load_instrument_cache(self) -> Dict[str, Dict[str, str]]:
+        """TR instrument details ({isin: {name, typeId, imageId}}) from the instrument store."""
+        from components import instrument_store
+        self._migrate_instrument_cache()
+        return {
+            isin: {
+                "name": entry["name"], "typeId": entry["type_id"] or "", "imageId": entry["image_id"] or "",
+                "fetchedAt": entry["details_at"],
+            }
+            for isin, entry in instrument_store.all_instruments().items()
+            if entry["name"]
+        }
 
-    def _save_instrument_cache(self, cache: Dict[str, str]) -> None:
+    def _save_instrument_cache(self, cache: Dict[str, Dict[str, str]]) -> None:
+        from components import instrument_store
+        updates = {}
+        for isin, info in cache.items():
+            if isinstance(info, dict) and info.get("name"):
+                updates[isin] = {"name": info.get("name"), "type_id": info.get("typeId"), "image_id": info.get("imageId")}
+                if info.get("fetchedAt"):
+                    updates[isin]["details_at"] = info["fetchedAt"]
+        instrument_store.update_many(updates)
+
+    def _migrate_instrument_cache(self) -> None:
+        """Import this user's old ``instrument_cache.json`` into the instrument store once."""
+        if not self._instrument_cache_path.exists():
+            return
         try:
-            TR_CREDENTIALS_DIR.mkdir(parents=True, exist_ok=True)
-            self._instrument_cache_path.write_text(json.dumps(cache), encoding="utf-8")
+            data = json.loads(self._instrument_cache_path.read_text(encoding="utf-8"))
+            if isinstance(data, dict):
+                # Old entries are just the name string
+                self._save_instrument_cache({
+                    str(k): (v if isinstance(v, dict) else {"name": str(v)}) for k, v in data.items() if k and v
+                })
+            self._instrument_cache_path.replace(self._instrument_cache_path.with_name("instrument_cache.json.migrated"))
         except Exception as e:
-            log.warning(f"Failed to save instrument cache: {e}")
+            log.warning(f"Failed to migrate instrument cache: {e}")
 
     def _download_logos(self, enriched_positions: List[Dict]) -> None:
         """Download position logos into assets/logos/ for local serving.
@@ -314,8 +372,12 @@ class TRConnection:
         Delta loading: Only fetches new transactions since the last sync.
         This significantly speeds up subsequent syncs.
         
+        Pages are fetched one ahead: the next page is requested as soon as the
+        current one arrives, while the current one is processed.
+        
         Args:
-            delta_load: If True, stop when we hit a transaction already in cache.
+            delta_load: If True, stop at the page where TIMELINE_OVERLAP_MARGIN
+                       transactions already in cache have been seen.
                        If False, fetch all transactions from scratch.
         
         Returns:
@@ -333,83 +395,99 @@ class TRConnection:
             log.info(f"Delta loading: {len(cached_txns)} transactions in cache")
         
         new_transactions = []
-        after_cursor = None
         page = 0
         max_pages = 100  # Safety limit
-        found_cached = False
+        overlap = 0  # cached transactions seen again
         
         log.info("Fetching timeline transactions...")
         
-        while page < max_pages:
-            page += 1
-            try:
-                # Subscribe to timeline transactions
-                await self.api.timeline_transactions(after=after_cursor)
-                sub_id, sub_params, response = await self.api.recv()
-                await self.api.unsubscribe(sub_id)
-                
-                # Handle unexpected response types
-                if isinstance(response, list):
-                    log.warning(f"Timeline page {page}: got list instead of dict, skipping")
-                    break
-                if not isinstance(response, dict):
-                    log.warning(f"Timeline page {page}: unexpected response type {type(response)}")
-                    break
-                
-                items = response.get('items', [])
-                if not items:
-                    log.info(f"Timeline page {page}: no more items")
-                    break
+        subs = self._subscriptions()
+        
+        async def fetch_page(cursor):
+            return await subs.request(self.api.timeline_transactions(after=cursor))
+        
+        def request_page(cursor):
+            return asyncio.ensure_future(fetch_page(cursor))
+        
+        next_page = request_page(None)
+        try:
+            while next_page is not None:
+                page += 1
+                try:
+                    response = await next_page
+                    next_page = None
                     
-                page_new_count = 0
-                for item in items:
-                    item_id = item.get('id')
+                    # Handle unexpected response types
+                    if isinstance(response, list):
+                        log.warning(f"Timeline page {page}: got list instead of dict, skipping")
+                        break
+                    if not isinstance(response, dict):
+                        log.warning(f"Timeline page {page}: unexpected response type {type(response)}")
+                        break
                     
-                    # Delta loading: stop if we hit a cached transaction
-                    if delta_load and item_id in cached_ids:
-                        found_cached = True
-                        log.info(f"Timeline page {page}: found cached transaction, stopping delta load")
+                    items = response.get('items', [])
+                    if not items:
+                        log.info(f"Timeline page {page}: no more items")
                         break
                     
-                    # Extract ISIN from icon field (e.g. "logos/IE00B5BMR087/v2")
-                    icon = item.get('icon', '')
-                    isin = None
-                    if icon and 'logos/' in icon:
-                        import re
-                        match = re.search(r'logos/([A-Z0-9]{12})', icon)
-                        if match:
-                            isin = match.group(1)
+                    # Prefetch the next page while this one is processed
+                    after_cursor = response.get('cursors', {}).get('after')
+                    if after_cursor and page < max_pages:
+                        next_page = request_page(after_cursor)
                     
-                    # Extract basic transaction info
-                    txn = {
-                        'id': item_id,
-                        'timestamp': item.get('timestamp'),
-                        'title': item.get('title'),
-                        'subtitle': item.get('subtitle'),
-                        'eventType': item.get('eventType'),
-                        'amount': item.get('amount', {}).get('value'),
-                        'currency': item.get('amount', {}).get('currency'),
-                        'icon': icon,
-                        'isin': isin,  # Add extracted ISIN
-                    }
-                    new_transactions.append(txn)
-                    page_new_count += 1
-                
-                if found_cached:
-                    break
+                    page_new_count = 0
+                    for item in items:
+                        item_id = item.get('id')
+                        
+                        # Delta loading: cached transactions (already enriched) are kept as
+                        # they are; new ones after them on the same page are still taken
+                        if delta_load and item_id in cached_ids:
+                            overlap += 1
+                            continue
+                        
+                        # Extract ISIN from icon field (e.g. "logos/IE00B5BMR087/v2")
+                        icon = item.get('icon', '')
+                        isin = None
+                        if icon and 'logos/' in icon:
+                            import re
+                            match = re.search(r'logos/([A-Z0-9]{12})', icon)
+                            if match:
+                                isin = match.group(1)
+                        
+                        # Extract basic transaction info
+                        txn = {
+                            'id': item_id,
+                            'timestamp': item.get('timestamp'),
+                            'title': item.get('title'),
+                            'subtitle': item.get('subtitle'),
+                            'eventType': item.get('eventType'),
+                            'amount': item.get('amount', {}).get('value'),
+                            'currency': item.get('amount', {}).get('currency'),
+                            'icon': icon,
+                            'isin': isin,  # Add extracted ISIN
+                        }
+                        new_transactions.append(txn)
+                        page_new_count += 1
                     
-                log.info(f"Timeline page {page}: got {page_new_count} new items")
-                
-                # Check for next page
-                cursors = response.get('cursors', {})
-                after_cursor = cursors.get('after')
-                if not after_cursor:
-                    log.info(f"Timeline complete after {page} pages")
-                    break
+                    log.info(f"Timeline page {page}: got {page_new_count} new items")
                     
-            except Exception as e:
-                log.error(f"Error fetching timeline page {page}: {e}")
-                break
+                    # Stop at the page that overlaps the cache by enough transactions
+                    # (a pending transaction may show up just below the newest cached one)
+                    if overlap >= TIMELINE_OVERLAP_MARGIN:
+                        log.info(f"Timeline page {page}: {overlap} cached transactions seen, stopping delta load")
+                        break
+                    if not after_cursor:
+                        log.info(f"Timeline complete after {page} pages")
+                        break
+                        
+                except Exception as e:
+                    log.error(f"Error fetching timeline page {page}: {e}")
+                    break
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+                # Let the cancelled prefetch unsubscribe before the sync sends more requests
+                await asyncio.gather(next_page, return_exceptions=True)
         
         # Merge new transactions with cached ones
         if delta_load and cached_txns and new_transactions:
@@ -446,9 +524,7 @@ class TRConnection:
         
         for attempt in range(retries + 1):
             try:
-                await self.api.timeline_detail_v2(transaction_id)
-                sub_id, sub_params, response = await self.api.recv()
-                await self.api.unsubscribe(sub_id)
+                response = await self._subscriptions().request(self.api.timeline_detail_v2(transaction_id))
                 
                 # Check if we got a valid response
                 if response is None:
@@ -472,11 +548,32 @@ class TRConnection:
                 return None
         return None
 
+    async def _pipelined_subscriptions(self, keys: List[str], subscribe, window: int = SUBSCRIPTION_WINDOW,
+                                       timeout: float = 30.0):
+        """Fire-then-receive over the websocket: yield ``(key, response)`` as responses arrive.
+
+        ``subscribe(key)`` sends one request (e.g. ``self.api.instrument_details``).
+        Up to *window* requests are in flight; the subscription manager matches
+        each response to its key and unsubscribes it. Failed requests, empty and
+        error responses are skipped.
+        """
+        async for key, response in self._subscriptions().request_many(keys, subscribe, window, timeout=timeout):
+            if isinstance(response, asyncio.TimeoutError):
+                log.debug(f"  Timeout waiting for {key}")
+                continue
+            if isinstance(response, Exception):
+                log.debug(f"  Request for {key} failed: {response}")
+                continue
+            if response is None or (isinstance(response, dict) and response.get('errors')):
+                continue
+            yield key, response
+
     async def _enrich_transactions_with_shares(self, transactions: List[Dict]) -> List[Dict]:
         """Fetch shares/quantity for buy/sell transactions from TR.
         
-        Uses pytr's concurrent approach: fire ALL detail requests at once, then
-        receive responses as they arrive. This is MUCH faster than sequential calls.
+        Uses pytr's concurrent approach: fire the detail requests without waiting,
+        then receive responses as they arrive (_pipelined_subscriptions). This is
+        MUCH faster than sequential calls.
         
         Uses pytr's Event.from_dict() for parsing - it handles German number formats
         correctly and is battle-tested code.
@@ -546,9 +643,7 @@ class TRConnection:
         # Test the connection with a simple API call first
         try:
             log.info("Testing TR connection before enrichment...")
-            await self.api.cash()
-            sub_id, _, _ = await self.api.recv()
-            await self.api.unsubscribe(sub_id)
+            await self._subscriptions().request(self.api.cash())
             log.info("TR connection verified")
         except Exception as e:
             log.error(f"TR connection test failed: {e}")
@@ -559,160 +654,96 @@ class TRConnection:
         
         # ============================================================
         # CONCURRENT APPROACH (like pytr's Timeline._request_timeline_details)
-        # Fire ALL requests first, then receive ALL responses
-        # This is MUCH faster than sequential request/response pairs
+        # Keep a window of requests in flight and receive the responses
+        # as they arrive. This is MUCH faster than sequential request/response pairs
         # ============================================================
-        
-        # Step 1: Fire all timeline_detail_v2 requests (no waiting!)
-        pending_subscriptions = {}  # sub_id -> txn_id
-        batch_size = 200  # Process in batches to avoid overwhelming the connection
-        txn_ids = list(txns_needing_details.keys())
-        
-        total_success = 0  # Track across ALL batches
-        
-        for batch_start in range(0, len(txn_ids), batch_size):
-            batch_end = min(batch_start + batch_size, len(txn_ids))
-            batch = txn_ids[batch_start:batch_end]
-            
-            log.info(f"  Firing requests for batch {batch_start//batch_size + 1} ({len(batch)} transactions)...")
+        total_success = 0
+        async for txn_id, response in self._pipelined_subscriptions(
+            list(txns_needing_details), self.api.timeline_detail_v2
+        ):
+            # Get the transaction and add the details
+            txn = txns_needing_details.get(txn_id)
+            if not txn:
+                continue
             
-            # Fire all requests in this batch (no awaiting responses yet!)
-            for txn_id in batch:
-                try:
-                    sub_id = await self.api.timeline_detail_v2(txn_id)
-                    pending_subscriptions[sub_id] = txn_id
-                except Exception as e:
-                    log.debug(f"  Failed to request details for {txn_id}: {e}")
+            # NOTE: Do NOT store txn['details'] = response - it's huge and causes storage issues
+            # We only need to extract the shares from it
             
-            # Step 2: Receive all responses for this batch
-            received = 0
-            batch_success = 0
-            max_retries = len(pending_subscriptions) + 50  # Safety limit
+            # Log the raw shares text for debugging
+            raw_shares_text = self._find_raw_shares_text(response)
+            title = txn.get('title', '')
             
-            while pending_subscriptions and received < max_retries:
-                try:
-                    sub_id, sub_params, response = await asyncio.wait_for(
-                        self.api.recv(), 
-                        timeout=30.0
-                    )
-                    received += 1
-                    
-                    # Check if this is a response we're waiting for
-                    txn_id = pending_subscriptions.pop(sub_id, None)
-                    if txn_id is None:
-                        continue
-                    
-                    # Unsubscribe to clean up
-                    await self.api.unsubscribe(sub_id)
-                    
-                    if response is None or (isinstance(response, dict) and response.get('errors')):
-                        continue
-                    
-                    # Get the transaction and add the details
-                    txn = txns_needing_details.get(txn_id)
-                    if not txn:
-                        continue
-                    
-                    # NOTE: Do NOT store txn['details'] = response - it's huge and causes storage issues
-                    # We only need to extract the shares from it
-                    
-                    # Log the raw shares text for debugging
-                    raw_shares_text = self._find_raw_shares_text(response)
-                    title = txn.get('title', '')
-                    
-                    # Use pytr's Event.from_dict() to parse shares - it handles German numbers correctly!
-                    try:
-                        # Build event dict in the format Event.from_dict expects
-                        event_dict = {
-                            'id': txn_id,
-                            'timestamp': txn.get('timestamp', ''),
-                            'title': txn.get('title', ''),
-                            'subtitle': txn.get('subtitle', ''),
-                            'eventType': txn.get('eventType', ''),
-                            'icon': txn.get('icon', ''),
-                            'details': response,
-                        }
-                        event = Event.from_dict(event_dict)
+            # Use pytr's Event.from_dict() to parse shares - it handles German numbers correctly!
+            try:
+                # Build event dict in the format Event.from_dict expects
+                event_dict = {
+                    'id': txn_id,
+                    'timestamp': txn.get('timestamp', ''),
+                    'title': txn.get('title', ''),
+                    'subtitle': txn.get('subtitle', ''),
+                    'eventType': txn.get('eventType', ''),
+                    'icon': txn.get('icon', ''),
+                    'details': response,
+                }
+                event = Event.from_dict(event_dict)
+                
+                if event.shares is not None and event.shares > 0:
+                    # Validate the parsed shares using price sanity check
+                    validated_shares = self._validate_shares(txn, event.shares)
+                    if validated_shares:
+                        txn['shares'] = validated_shares
+                        total_success += 1
+                    else:
+                        # Validation failed - log details for debugging
+                        ts = txn.get('timestamp', '')[:10]
+                        log.warning(f"⚠️ Shares validation failed: {title} on {ts}")
+                        log.warning(f"    pytr parsed: {event.shares}, raw text: {raw_shares_text}")
                         
-                        if event.shares is not None and event.shares > 0:
-                            # Validate the parsed shares using price sanity check
-                            validated_shares = self._validate_shares(txn, event.shares)
-                            if validated_shares:
-                                txn['shares'] = validated_shares
-                                batch_success += 1
-                                total_success += 1
-                            else:
-                                # Validation failed - log details for debugging
-                                ts = txn.get('timestamp', '')[:10]
-                                log.warning(f"⚠️ Shares validation failed: {title} on {ts}")
-                                log.warning(f"    pytr parsed: {event.shares}, raw text: {raw_shares_text}")
-                                
-                                # Try manual extraction as fallback
-                                new_shares = self._extract_shares_from_details(response)
-                                validated = self._validate_shares(txn, new_shares) if new_shares else None
-                                if validated:
-                                    txn['shares'] = validated
-                                    batch_success += 1
-                                    total_success += 1
-                                    log.info(f"    ✓ Manual extraction succeeded: {validated}")
-                                else:
-                                    # For crypto, try to estimate from price in response
-                                    estimated = self._estimate_crypto_shares(txn, response)
-                                    validated_est = self._validate_shares(txn, estimated) if estimated else None
-                                    if validated_est:
-                                        txn['shares'] = validated_est
-                                        batch_success += 1
-                                        total_success += 1
-                                        log.info(f"    ✓ Estimated from price: {validated_est}")
-                                    else:
-                                        log.warning(f"    ✗ All methods failed, transaction will be skipped")
-                            
-                            # Also extract ISIN if Event found it and we don't have it
-                            if event.isin and not txn.get('isin'):
-                                txn['isin'] = event.isin
-                        else:
-                            # Fallback to our manual extraction
-                            new_shares = self._extract_shares_from_details(response)
-                            if new_shares and new_shares > 0:
-                                validated = self._validate_shares(txn, new_shares)
-                                if validated:
-                                    txn['shares'] = validated
-                                    batch_success += 1
-                                    total_success += 1
-                                
-                    except Exception as parse_err:
-                        log.debug(f"  Event.from_dict failed for {txn_id}, trying manual: {parse_err}")
-                        # Fallback to manual extraction
+                        # Try manual extraction as fallback
                         new_shares = self._extract_shares_from_details(response)
-                        if new_shares and new_shares > 0:
-                            validated = self._validate_shares(txn, new_shares)
-                            if validated:
-                                txn['shares'] = validated
-                                batch_success += 1
+                        validated = self._validate_shares(txn, new_shares) if new_shares else None
+                        if validated:
+                            txn['shares'] = validated
+                            total_success += 1
+                            log.info(f"    ✓ Manual extraction succeeded: {validated}")
+                        else:
+                            # For crypto, try to estimate from price in response
+                            estimated = self._estimate_crypto_shares(txn, response)
+                            validated_est = self._validate_shares(txn, estimated) if estimated else None
+                            if validated_est:
+                                txn['shares'] = validated_est
                                 total_success += 1
+                                log.info(f"    ✓ Estimated from price: {validated_est}")
+                            else:
+                                log.warning(f"    ✗ All methods failed, transaction will be skipped")
                     
-                    if total_success <= 5 or total_success % 100 == 0:
-                        title = txn.get('title', '')[:25]
-                        shares = txn.get('shares', 0)
-                        log.info(f"  [{total_success}/{trade_count}] {title}: {shares:.6f} shares")
+                    # Also extract ISIN if Event found it and we don't have it
+                    if event.isin and not txn.get('isin'):
+                        txn['isin'] = event.isin
+                else:
+                    # Fallback to our manual extraction
+                    new_shares = self._extract_shares_from_details(response)
+                    if new_shares and new_shares > 0:
+                        validated = self._validate_shares(txn, new_shares)
+                        if validated:
+                            txn['shares'] = validated
+                            total_success += 1
                         
-                except asyncio.TimeoutError:
-                    log.warning(f"  Timeout waiting for responses, {len(pending_subscriptions)} remaining")
-                    break
-                except Exception as e:
-                    log.debug(f"  Error receiving response: {e}")
-                    received += 1
-            
-            # Unsubscribe from any remaining pending subscriptions
-            for sub_id in list(pending_subscriptions.keys()):
-                try:
-                    await self.api.unsubscribe(sub_id)
-                except:
-                    pass
-            pending_subscriptions.clear()
-            
-            log.info(f"  Batch complete: {batch_success} successful enrichments")
-        
+            except Exception as parse_err:
+                log.debug(f"  Event.from_dict failed for {txn_id}, trying manual: {parse_err}")
+                # Fallback to manual extraction
+                new_shares = self._extract_shares_from_details(response)
+                if new_shares and new_shares > 0:
+                    validated = self._validate_shares(txn, new_shares)
+                    if validated:
+                        txn['shares'] = validated
+                        total_success += 1
+            
+            if total_success <= 5 or total_success % 100 == 0:
+                title = txn.get('title', '')[:25]
+                shares = txn.get('shares', 0)
+                log.info(f"  [{total_success}/{trade_count}] {title}: {shares:.6f} shares")
+
         # Report enrichment completeness
         success_rate = (total_success / trade_count * 100) if trade_count > 0 else 100
         log.info(f"Enriched {total_success}/{trade_count} transactions ({success_rate:.1f}% success)")
@@ -940,9 +971,7 @@ class TRConnection:
         
         try:
             log.info(f"Fetching portfolio aggregate history (timeframe={timeframe})...")
-            await self.api.portfolio_history(timeframe)
-            sub_id, sub_params, response = await self.api.recv()
-            await self.api.unsubscribe(sub_id)
+            response = await self._subscriptions().request(self.api.portfolio_history(timeframe))
             
             # Response should contain historical data points
             # Expected format: {aggregates: [{time, value, invested}, ...]}
@@ -978,9 +1007,7 @@ class TRConnection:
         
         try:
             log.info(f"Fetching history for {isin}...")
-            await self.api.performance_history(isin, timeframe, exchange="LSX")
-            sub_id, sub_params, response = await self.api.recv()
-            await self.api.unsubscribe(sub_id)
+            response = await self._subscriptions().request(self.api.performance_history(isin, timeframe, exchange="LSX"))
             
             aggregates = response.get('aggregates', response.get('expectedHistoryLight', []))
             log.info(f"Got {len(aggregates)} history points for {isin}")
@@ -1016,9 +1043,9 @@ class TRConnection:
             Dict of {isin: {history: [{date, price}], quantity, instrumentType, name}}
         """
         from components.portfolio_history import (
+            align_prices,
             extract_isin_from_icon,
             get_prices_from_transactions,
-            interpolate_prices,
             set_isin_mappings,
         )
         
@@ -1083,28 +1110,24 @@ class TRConnection:
         # Build position histories
         position_histories = {}
         
+        # All prices forward-filled onto the history dates at once
+        aligned = align_prices(isin_prices, date_strs, isins_with_transactions)
+        
         for isin in isins_with_transactions:
             name = isin_to_name.get(isin, isin)
             pos = pos_lookup.get(isin, {})
             
-            # Get prices for this ISIN
-            known_prices = isin_prices.get(isin, {})
-            if not known_prices:
+            if not isin_prices.get(isin):
                 continue
             
-            # Interpolate prices for all dates
-            prices = interpolate_prices(known_prices, date_strs)
+            prices = aligned[isin].dropna()
             
-            if prices:
+            if len(prices):
                 # Build price history list
-                price_history = []
-                for date_str in sorted(prices.keys()):
-                    price = prices.get(date_str)
-                    if price and price > 0:
-                        price_history.append({
-                            'date': date_str,
-                            'price': price,
-                        })
+                price_history = [
+                    {'date': date_str, 'price': float(price)}
+                    for date_str, price in prices.items() if price > 0
+                ]
                 
                 if price_history:
                     position_histories[isin] = {
@@ -1127,9 +1150,10 @@ class TRConnection:
         Returns:
             Dict of {isin: {history: [{date, price}], quantity, instrumentType, name}}
         """
+        from components import price_store
         from components.portfolio_history import (
             extract_isin_from_icon,
-            get_prices_for_dates,
+            get_prices_for_isins,
         )
         
         # Build position lookup
@@ -1187,15 +1211,15 @@ class TRConnection:
         # Fetch prices for each ISIN
         position_histories = {}
         
-        for idx, isin in enumerate(isins_with_transactions):
+        dates_as_dt = [datetime.combine(d, datetime.min.time()) for d in sorted_dates]
+        log.info(f"Fetching prices for {len(isins_with_transactions)} instruments...")
+        fetched = get_prices_for_isins(
+            {i: isin_to_name.get(i, i) for i in isins_with_transactions}, dates_as_dt,
+        )
+        for isin, prices in fetched.items():
             name = isin_to_name.get(isin, isin)
             pos = pos_lookup.get(isin, {})
             
-            log.info(f"[{idx+1}/{len(isins_with_transactions)}] Fetching prices for {name}...")
-            
-            dates_as_dt = [datetime.combine(d, datetime.min.time()) for d in sorted_dates]
-            prices = get_prices_for_dates(isin, name, dates_as_dt)
-            
             if prices:
                 # Build price history list
                 price_history = []
@@ -1216,6 +1240,7 @@ class TRConnection:
                     }
             else:
                 log.warning(f"  No prices available for {name}")
+        price_store.flush()
         
         return position_histories
 
@@ -1788,60 +1813,24 @@ class TRConnection:
         log.info(f"Calculating history from {first_deposit_date} to {today} ({len(sorted_dates)} dates)")
         
         # STEP 4: Calculate value for each date
-        history = []
+        # As-of lookups for all dates at once (one sort + forward fill per
+        # series instead of a sorted scan per date and ISIN)
+        invested_at = _as_of({'invested': invested_series}, sorted_dates)['invested'].fillna(0.0).to_numpy()
+        cash_at = _as_of({'cash': cash_timeline}, sorted_dates)['cash'].fillna(0.0).to_numpy()
+        
+        # Market value: sum(quantity × price) for each position
+        isins = list(holdings_timeline)
+        quantities = _as_of(holdings_timeline, sorted_dates).reindex(columns=isins).fillna(0.0).to_numpy()
+        prices = _as_of({i: price_lookup.get(i, {}) for i in isins}, sorted_dates).reindex(columns=isins).to_numpy()
+        priced = (quantities > 0) & (prices > 0)  # NaN (no price) compares False
+        securities_at = np.where(priced, quantities * np.nan_to_num(prices), 0.0).sum(axis=1)
         
-        for date_str in sorted_dates:
-            # Get invested amount (cumulative deposits up to this date)
-            invested = 0.0
-            for inv_date in sorted(invested_series.keys()):
-                if inv_date <= date_str:
-                    invested = invested_series[inv_date]
-                else:
-                    break
-            
-            # Get cash balance on this date (or nearest earlier)
-            cash_balance = 0.0
-            for cash_date in sorted(cash_timeline.keys()):
-                if cash_date <= date_str:
-                    cash_balance = cash_timeline[cash_date]
-                else:
-                    break
-            
-            # Calculate market value: sum(quantity × price) for each position
-            securities_value = 0.0
-            missing_prices = []
-            
-            for isin in set(holdings_timeline.keys()) | set(price_lookup.keys()):
-                # Get quantity on this date
-                quantity = 0.0
-                if isin in holdings_timeline:
-                    for h_date in sorted(holdings_timeline[isin].keys()):
-                        if h_date <= date_str:
-                            quantity = holdings_timeline[isin][h_date]
-                        else:
-                            break
-                
-                if quantity <= 0:
-                    continue
-                
-                # Get price on this date (or nearest earlier)
-                price = None
-                if isin in price_lookup:
-                    for p_date in sorted(price_lookup[isin].keys()):
-                        if p_date <= date_str:
-                            price = price_lookup[isin][p_date]
-                        else:
-                            break
-                
-                if price and price > 0:
-                    position_value = quantity * price
-                    securities_value += position_value
-                else:
-                    missing_prices.append(isin_names.get(isin, isin))
-            
+        history = []
+        for i, date_str in enumerate(sorted_dates):
+            invested = float(invested_at[i])
             # Total portfolio value = securities + cash
             # Cash should be positive (it's an asset)
-            total_value = securities_value + max(0, cash_balance)
+            total_value = float(securities_at[i]) + max(0, float(cash_at[i]))
             
             # Only add if we have meaningful data
             if invested > 0 or total_value > 0:
@@ -2238,19 +2227,14 @@ class TRConnection:
             if not self.api or not self.is_connected:
                 return {"success": False, "error": "Not connected"}
             
-            # Get compact portfolio (correct subscription type)
+            # Get compact portfolio and cash balance concurrently
             # WebSocket connects automatically on first subscribe
-            await self.api.compact_portfolio()
-            sub_id, sub_params, portfolio_response = await self.api.recv()
-            await self.api.unsubscribe(sub_id)
+            subs = self._subscriptions()
+            portfolio_response, cash_response = await asyncio.gather(
+                subs.request(self.api.compact_portfolio()), subs.request(self.api.cash())
+            )
             
             log.info(f"Portfolio response: {portfolio_response}")
-            
-            # Get cash balance
-            await self.api.cash()
-            sub_id, sub_params, cash_response = await self.api.recv()
-            await self.api.unsubscribe(sub_id)
-            
             log.info(f"Cash response: {cash_response}")
             
             self.portfolio_data = portfolio_response
@@ -2308,44 +2292,56 @@ class TRConnection:
                 "error": str(e)
             }
     
+    async def _refresh_instrument_details(self, isins: List[str], instrument_cache: Dict[str, Dict]) -> None:
+        """Fetch TR instrument details into *instrument_cache* where needed.
+
+        An instrument is fetched if it has no name or typeId cached (typeId is
+        needed for ETF/stock filtering) or its details are older than
+        INSTRUMENT_DETAILS_TTL. All requests are pipelined.
+        """
+        now = time.time()
+
+        def fresh(isin):
+            info = instrument_cache.get(isin, {})
+            return (info.get("name") not in (None, "", isin) and info.get("typeId")
+                    and now - (info.get("fetchedAt") or 0) < INSTRUMENT_DETAILS_TTL)
+
+        stale = [isin for isin in dict.fromkeys(isins) if isin and not fresh(isin)]
+        if not stale:
+            return
+        log.info(f"Fetching instrument details for {len(stale)}/{len(set(isins))} positions (pipelined)...")
+        async for isin, response in self._pipelined_subscriptions(stale, self.api.instrument_details):
+            cached_info = instrument_cache.get(isin, {})
+            name = response.get('shortName', response.get('name', isin))
+            instrument_type = response.get('typeId', response.get('type', ''))
+            image_id = response.get('imageId', '')
+            # Keep cached values where the response has none
+            instrument_cache[isin] = {
+                "name": name if name and name != isin else cached_info.get("name") or isin,
+                "typeId": instrument_type or cached_info.get("typeId", ""),
+                "imageId": image_id or cached_info.get("imageId", ""),
+                "fetchedAt": now,
+            }
+            info = instrument_cache[isin]
+            log.info(f"  {isin}: {info['name']} (type={info['typeId']}, img={info['imageId']})")
+
     async def _fetch_all_data(self) -> Dict[str, Any]:
         """Fetch all portfolio data with instrument names. Skip ticker prices (too slow)."""
         try:
             if not self.api or not self.is_connected:
                 return {"success": False, "error": "Not connected"}
 
-            log.info("Fetching compact portfolio...")
+            log.info("Fetching compact portfolio and cash...")
             
-            # Get compact portfolio - handle async responses properly
-            await self.api.compact_portfolio()
-            sub_id, sub_params, portfolio_response = await self.api.recv()
-            await self.api.unsubscribe(sub_id)
-            
-            # Check if we got the right response type
-            if sub_params.get('type') != 'compactPortfolio':
-                log.warning(f"Expected compactPortfolio, got {sub_params.get('type')}")
-                # The response might be in the wrong order - check if it has positions
-                if isinstance(portfolio_response, dict) and 'positions' in portfolio_response:
-                    pass  # We got positions, use this
-                else:
-                    # Try to receive again
-                    await self.api.compact_portfolio()
-                    sub_id, sub_params, portfolio_response = await self.api.recv()
-                    await self.api.unsubscribe(sub_id)
+            # Both subscriptions in flight at once; responses are routed by subscription id.
+            # Cash is an array: [{amount, currencyId}, ...]
+            subs = self._subscriptions()
+            portfolio_response, cash_response = await asyncio.gather(
+                subs.request(self.api.compact_portfolio()), subs.request(self.api.cash())
+            )
             
             log.info(f"Got portfolio with {len(portfolio_response.get('positions', []))} positions")
             
-            # Get cash balance - TR returns an array: [{amount, currencyId}, ...]
-            await self.api.cash()
-            sub_id, sub_params, cash_response = await self.api.recv()
-            await self.api.unsubscribe(sub_id)
-            
-            # Handle case where cash response contains portfolio data (async ordering issue)
-            if isinstance(cash_response, dict) and 'positions' in cash_response:
-                log.warning("Cash response contains portfolio data - using it for positions")
-                portfolio_response = cash_response
-                cash_response = []  # Reset cash, will default to 0
-            
             log.info(f"Cash response type: {type(cash_response)}, len: {len(cash_response) if isinstance(cash_response, list) else 'N/A'}")
             
             # Parse portfolio data
@@ -2366,9 +2362,12 @@ class TRConnection:
             
             # Fetch instrument names only (skip ticker - too slow and unreliable)
             instrument_cache = self._load_instrument_cache()
+            await self._refresh_instrument_details(
+                [p.get('instrumentId', '') for p in positions], instrument_cache
+            )
             enriched_positions = []
             
-            for i, p in enumerate(positions):
+            for p in positions:
                 isin = p.get('instrumentId', '')
                 qty = float(p.get('netSize', 0))
                 avg_buy = float(p.get('averageBuyIn', 0))
@@ -2376,45 +2375,12 @@ class TRConnection:
                 # TR provides netValue per position in compact_portfolio
                 position_value = float(p.get('netValue', 0))
                 
-                # Default name is ISIN, check cache first
+                # Default name is ISIN
                 cached_info = instrument_cache.get(isin, {})
-                if isinstance(cached_info, str):
-                    # Old cache format - just name string
-                    cached_info = {"name": cached_info}
-                
                 name = cached_info.get("name") or isin
                 instrument_type = cached_info.get("typeId", "")
                 image_id = cached_info.get("imageId", "")
                 
-                # Fetch instrument details if:
-                # 1. No name cached (name == isin), OR
-                # 2. No typeId cached (needed for ETF/stock filtering)
-                needs_fetch = (name == isin) or (not instrument_type)
-                if needs_fetch:
-                    try:
-                        await self.api.instrument_details(isin)
-                        inst_sub_id, inst_params, inst_response = await self.api.recv()
-                        await self.api.unsubscribe(inst_sub_id)
-                        new_name = inst_response.get('shortName', inst_response.get('name', isin))
-                        new_type = inst_response.get('typeId', inst_response.get('type', ''))
-                        new_image = inst_response.get('imageId', '')
-                        # Update only if we got new data
-                        if new_name and new_name != isin:
-                            name = new_name
-                        if new_type:
-                            instrument_type = new_type
-                        if new_image:
-                            image_id = new_image
-                        # Always save updated cache
-                        instrument_cache[isin] = {
-                            "name": name,
-                            "typeId": instrument_type,
-                            "imageId": image_id,
-                        }
-                        log.info(f"[{i+1}/{len(positions)}] {isin}: {name} (type={instrument_type}, img={image_id})")
-                    except Exception as e:
-                        log.warning(f"[{i+1}/{len(positions)}] Could not get details for {isin}: {e}")
-                
                 # Use TR's netValue if available, otherwise calculate from invested
                 current_value = position_value if position_value > 0 else invested
                 current_price = current_value / qty if qty > 0 else avg_buy
@@ -2725,7 +2691,7 @@ def complete_login(code: str, user_id: str = "_default") -> Dict[str, Any]:
 def fetch_portfolio(user_id: str = "_default") -> Dict[str, Any]:
     """Fetch current portfolio data."""
     conn = get_connection(user_id)
-    return conn.run_serialized(conn._fetch_portfolio())
+    return conn.run(conn._fetch_portfolio())
 
 
 def fetch_all_data(user_id: str = "_default") -> Dict[str, Any]:
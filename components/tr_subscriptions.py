@@ -0,0 +1,136 @@
+"""
+TR Subscription Manager
+Demultiplexes the pytr websocket so many subscriptions can be in flight at once.
+
+pytr's ``recv()`` returns whichever message arrives next, so code that awaited
+``recv()`` right after subscribing had to assume the message was its own and
+every TR operation ran strictly one at a time. Here a single reader task owns
+``recv()`` and routes each message by subscription id to that subscription's
+queue; callers only wait on their own queue. Unsubscribing and timeouts are
+handled in one place, and error messages from TR reach the subscription they
+belong to.
+
+All methods must run on the loop that owns the websocket (the TRConnection
+worker loop).
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Iterable, Optional
+
+log = logging.getLogger(__name__)
+
+# Seconds to wait for a subscription's next message
+DEFAULT_TIMEOUT = 30.0
+
+
+class _Failure:
+    """Queued in place of a message when a subscription (or the reader) failed."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class SubscriptionManager:
+    """Owns the websocket reader for one pytr ``TradeRepublicApi``."""
+
+    def __init__(self, api):
+        self.api = api
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    def _queue(self, sub_id: str) -> asyncio.Queue:
+        # Also called by the reader: a message may arrive before subscribe() returns
+        queue = self._queues.get(sub_id)
+        if queue is None:
+            queue = self._queues[sub_id] = asyncio.Queue()
+        return queue
+
+    def _ensure_reader(self) -> None:
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.get_running_loop().create_task(self._read())
+
+    async def _read(self) -> None:
+        while True:
+            try:
+                sub_id, _, payload = await self.api.recv()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                sub_id = getattr(e, "subscription_id", None)
+                if sub_id is not None:
+                    # TR answered this subscription with an error (pytr unsubscribed it)
+                    self._queue(sub_id).put_nowait(_Failure(e))
+                    continue
+                # The connection itself failed: wake every waiter
+                log.warning(f"TR websocket reader stopped: {e}")
+                for queue in self._queues.values():
+                    queue.put_nowait(_Failure(e))
+                return
+            self._queue(sub_id).put_nowait(payload)
+
+    async def subscribe(self, request: Awaitable[str]) -> str:
+        """Send a subscription request (e.g. ``api.cash()``) and return its id."""
+        sub_id = await request
+        self._queue(sub_id)
+        self._ensure_reader()
+        return sub_id
+
+    async def next(self, sub_id: str, timeout: float = DEFAULT_TIMEOUT) -> Any:
+        """Next message of *sub_id*; raises TR's error or asyncio.TimeoutError."""
+        item = await asyncio.wait_for(self._queue(sub_id).get(), timeout=timeout)
+        if isinstance(item, _Failure):
+            raise item.error
+        return item
+
+    async def unsubscribe(self, sub_id: str) -> None:
+        self._queues.pop(sub_id, None)
+        if sub_id in self.api.subscriptions:
+            try:
+                await self.api.unsubscribe(sub_id)
+            except Exception as e:
+                log.debug(f"Unsubscribe {sub_id} failed: {e}")
+            # A message may have been queued while the unsubscribe was sent
+            self._queues.pop(sub_id, None)
+
+    async def request(self, request: Awaitable[str], timeout: float = DEFAULT_TIMEOUT) -> Any:
+        """Subscribe, wait for the first message, unsubscribe: one request/response."""
+        sub_id = await self.subscribe(request)
+        try:
+            return await self.next(sub_id, timeout=timeout)
+        finally:
+            await self.unsubscribe(sub_id)
+
+    async def request_many(self, keys: Iterable[Any], send, window: int, timeout: float = DEFAULT_TIMEOUT):
+        """Yield ``(key, response or exception)`` as responses arrive.
+
+        ``send(key)`` starts one subscription request. At most *window*
+        requests are in flight at a time.
+        """
+        semaphore = asyncio.Semaphore(window)
+
+        async def one(key):
+            async with semaphore:
+                try:
+                    return key, await self.request(send(key), timeout=timeout)
+                except Exception as e:
+                    return key, e
+
+        tasks = [asyncio.ensure_future(one(key)) for key in keys]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled requests finish their unsubscribe
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self) -> None:
+        """Stop the reader and fail every waiter (the websocket itself belongs to the api)."""
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        for queue in self._queues.values():
+            queue.put_nowait(_Failure(ConnectionError("TR subscription manager closed")))
+        self._queues.clear()
@@ -0,0 +1,196 @@
+"""
+BTC daily price history.
+
+The long history comes from an Investing.com export (``btc_hist_prices.csv``)
+whose numbers are text ("67,361.7", "123.68K", "6.69%"). It is parsed once
+into a typed binary file next to it (same name, ``.npz``); later loads read
+that file and only append the days the provider has published since, after
+checking that the provider's price agrees with ours on the join date.
+"""
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from components.market_data import get_provider
+from core.conf import DATA_DIR
+
+log = logging.getLogger(__name__)
+
+BTC_RAW_CSV = Path(DATA_DIR) / "btc_hist_prices.csv"
+
+COLUMNS = ["Price", "Open", "High", "Low", "volume", "Change %"]
+
+# Seconds between provider checks within one process
+UPDATE_INTERVAL = 3600
+# Max relative price difference on the join date before new rows are rejected
+MAX_JOIN_DEVIATION = 0.05
+
+_VOLUME_SUFFIX = {"K": 1e3, "M": 1e6, "B": 1e9}
+
+_history: Optional[pd.DataFrame] = None
+_history_key: Optional[tuple] = None      # (raw csv path, source signature)
+_checked_at = 0.0
+
+
+def _source_signature(raw_csv: Path) -> str:
+    st = os.stat(raw_csv)
+    return f"{st.st_size}:{int(st.st_mtime)}"
+
+
+def parse_investing_csv(raw_csv: Path) -> pd.DataFrame:
+    """Parse the Investing.com export into typed columns (vectorized)."""
+    raw = pd.read_csv(raw_csv, thousands=",", dtype={"Vol.": str, "Change %": str},
+                      encoding="utf-8-sig")
+    raw["Date"] = pd.to_datetime(raw["Date"], format="%m/%d/%Y")
+    raw = raw.set_index("Date").sort_index()
+
+    vol = raw["Vol."].str.replace(",", "", regex=False).str.upper().str.strip()
+    multiplier = vol.str[-1].map(_VOLUME_SUFFIX).fillna(1.0)
+    volume = pd.to_numeric(vol.str.rstrip("KMB"), errors="coerce") * multiplier
+
+    df = pd.DataFrame({
+        "Price": raw["Price"].astype(float),
+        "Open": raw["Open"].astype(float),
+        "High": raw["High"].astype(float),
+        "Low": raw["Low"].astype(float),
+        "volume": volume.astype(float),
+        "Change %": pd.to_numeric(raw["Change %"].str.rstrip("%"), errors="coerce"),
+    }, index=raw.index)
+    return df[~df.index.duplicated(keep="last")]
+
+
+def _save(df: pd.DataFrame, source: str, path: Path) -> None:
+    # A temp file of its own, so workers saving at the same time cannot mix their writes
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, suffix=".tmp", delete=False) as f:
+            tmp = f.name
+            np.savez(
+                f,
+                dates=df.index.values.astype("datetime64[ns]").astype(np.int64),
+                values=df[COLUMNS].to_numpy(dtype=np.float64),
+                columns=np.array(COLUMNS),
+                source=np.array(source),
+            )
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning(f"Could not write {path.name}: {e}")
+        if tmp is not None:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+def _load(path: Path):
+    """Return ``(frame, source_signature)`` from the binary file, or ``(None, None)``."""
+    if not path.exists():
+        return None, None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            index = pd.DatetimeIndex(z["dates"].astype("datetime64[ns]"), name="Date")
+            df = pd.DataFrame(z["values"], index=index, columns=[str(c) for c in z["columns"]])
+            return df, str(z["source"])
+    except Exception as e:
+        log.warning(f"Could not read {path.name}, recompiling: {e}")
+        return None, None
+
+
+def _fetch_provider_rows(since: pd.Timestamp) -> Optional[pd.DataFrame]:
+    """Daily BTC-USD rows from Yahoo starting at *since* (inclusive)."""
+    try:
+        raw = get_provider().history("BTC-USD", start=since.strftime("%Y-%m-%d"))
+    except Exception as e:
+        log.warning(f"BTC delta download failed: {e}")
+        return None
+    if raw.empty:
+        return None
+    raw.index = raw.index.normalize().rename("Date")
+    price_col = "Adj Close" if "Adj Close" in raw.columns else "Close"
+    return pd.DataFrame({
+        "Price": raw[price_col].astype(float),
+        "Open": raw["Open"].astype(float),
+        "High": raw["High"].astype(float),
+        "Low": raw["Low"].astype(float),
+        "volume": raw["Volume"].astype(float),
+    })
+
+
+def join_delta(history: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Append the rows of *delta* after the last date of *history*.
+
+    *delta* should start on (or before) that last date: the last day both
+    cover is used to check they report the same price. Without a common day
+    the first new price is compared with our last one. If they disagree by
+    more than MAX_JOIN_DEVIATION the new rows are rejected and *history* is
+    returned unchanged, so a provider switching to a different series cannot
+    silently splice it onto ours.
+    """
+    last_date = history.index[-1]
+    new_rows = delta[delta.index > last_date]
+    if new_rows.empty:
+        return history
+    overlap = history.index.intersection(delta.index)
+    if len(overlap):
+        check_date = overlap[-1]
+        ours = history.at[check_date, "Price"]
+        theirs = delta.at[check_date, "Price"]
+    else:
+        check_date = new_rows.index[0]
+        ours = history["Price"].iloc[-1]
+        theirs = new_rows["Price"].iloc[0]
+    if ours > 0 and abs(theirs / ours - 1) > MAX_JOIN_DEVIATION:
+        log.warning(f"BTC history join rejected on {check_date.date()}: "
+                    f"stored {ours:,.2f} vs provider {theirs:,.2f}")
+        return history
+    gap = (new_rows.index[0] - last_date).days
+    if gap > 1:
+        log.warning(f"BTC history has a {gap - 1}-day gap after {last_date.date()}")
+
+    new_rows = new_rows.copy()
+    prev = pd.concat([history["Price"].iloc[-1:], new_rows["Price"]])
+    new_rows["Change %"] = (prev.pct_change() * 100).iloc[1:].round(2)
+    return pd.concat([history, new_rows[COLUMNS]])
+
+
+def load_btc_history(raw_csv: Path = BTC_RAW_CSV, update: bool = True) -> Optional[pd.DataFrame]:
+    """BTC daily history with columns COLUMNS, indexed by Date.
+
+    Compiles *raw_csv* on first use (or when it changes), then appends
+    provider rows at most every UPDATE_INTERVAL seconds. Returns a new frame
+    the caller may modify, or None if no history is available.
+    """
+    global _history, _history_key, _checked_at
+    raw_csv = Path(raw_csv)
+    binary = raw_csv.with_suffix(".npz")
+
+    source = _source_signature(raw_csv) if raw_csv.exists() else None
+    if _history is None or _history_key[0] != raw_csv or (source is not None and source != _history_key[1]):
+        df, stored_source = _load(binary)
+        if df is None or (source is not None and stored_source != source):
+            if source is None:
+                return None
+            log.info(f"Compiling {raw_csv.name} -> {binary.name}")
+            df = parse_investing_csv(raw_csv)
+            stored_source = source
+            _save(df, stored_source, binary)
+        _history, _history_key = df, (raw_csv, stored_source)
+        _checked_at = 0.0
+
+    if update and time.time() - _checked_at > UPDATE_INTERVAL:
+        _checked_at = time.time()
+        delta = _fetch_provider_rows(_history.index[-1])
+        if delta is not None:
+            joined = join_delta(_history, delta)
+            if len(joined) > len(_history):
+                log.info(f"BTC history: appended {len(joined) - len(_history)} rows")
+                _history = joined
+                _save(_history, _history_key[1], binary)
+
+    return _history.ffill()
@@ -5,4 +5,9 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
 
 PREPROC_FILENAME = os.path.join(DATA_DIR, "btc_data_preprocessed.csv")
-PREPROC_OVERWRITE = False
\ No newline at end of file
+PREPROC_OVERWRITE = False
+
+# Price model written by the hyperparameter tuning page, read by core.prediction
+MODEL_FILENAME = os.path.join(DATA_DIR, "trained_model.joblib")
+MODEL_META_FILENAME = os.path.join(DATA_DIR, "trained_model.json")
+BEST_PARAMS_FILENAME = os.path.join(DATA_DIR, "best_params.csv")
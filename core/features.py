@@ -0,0 +1,123 @@
+"""
+Lagged feature matrix for the price model.
+
+Builds the model input (selected indicator columns plus ``<feature>_lag<n>``
+shifts) once as a contiguous float32 array and caches it on disk, keyed by a
+hash of the source data and the feature spec. Tuning runs, training and the
+prediction service all read the same matrix instead of re-shifting columns.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+FEATURE_CACHE_DIR = Path.home() / ".pytr" / "feature_cache"
+TARGET_COLUMN = "price"
+
+
+def lag_columns(features: List[str], lags: List[int]) -> List[str]:
+    """Column names of the matrix, in order: base features, then their lags."""
+    return list(features) + [f"{f}_lag{lag}" for f in features for lag in lags]
+
+
+def parse_lags(lags) -> List[int]:
+    """Accept "1, 7,30", [1, 7], or None."""
+    if lags is None:
+        return []
+    if isinstance(lags, str):
+        lags = lags.split(",")
+    return [int(str(lag).strip()) for lag in lags if str(lag).strip()]
+
+
+def matrix_key(df: pd.DataFrame, features: List[str], lags: List[int], horizon: int) -> str:
+    """Hash of the source columns' content plus the feature spec."""
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(df[list(features) + [TARGET_COLUMN]], index=True).values.tobytes())
+    h.update(f"{','.join(features)}|{','.join(map(str, lags))}|h={horizon}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _compute(df: pd.DataFrame, features: List[str], lags: List[int], horizon: int) -> Dict:
+    base = df[features].to_numpy(dtype=np.float32)
+    n = len(df)
+    X = np.full((n, len(features) * (1 + len(lags))), np.nan, dtype=np.float32)
+    X[:, :len(features)] = base
+    col = len(features)
+    for i in range(len(features)):
+        for lag in lags:
+            if 0 <= lag < n:
+                X[lag:, col] = base[:n - lag, i]
+            elif -n < lag < 0:
+                X[:lag, col] = base[-lag:, i]
+            col += 1
+    y = df[TARGET_COLUMN].shift(-horizon).to_numpy(dtype=np.float64)
+    return {"X": X, "y": y, "columns": lag_columns(features, lags), "index": df.index}
+
+
+def build_lag_matrix(df: pd.DataFrame, features: List[str], lags=None, horizon: int = 1) -> Dict:
+    """Return ``{"X", "y", "columns", "index", "key"}`` for *features* and *lags*.
+
+    X is a C-contiguous float32 array (NaN where a lag reaches before the
+    first row); y is the target ``price`` shifted by -*horizon* (NaN at the
+    tail). The result is cached in FEATURE_CACHE_DIR by content hash.
+    """
+    features = list(features)
+    lags = parse_lags(lags)
+    horizon = int(horizon or 1)
+    key = matrix_key(df, features, lags, horizon)
+    path = FEATURE_CACHE_DIR / f"{key}.npz"
+
+    cached = _load(path)
+    if cached is not None:
+        cached["key"] = key
+        return cached
+
+    matrix = _compute(df, features, lags, horizon)
+    matrix["key"] = key
+    # A temp file per save: the job worker and web workers may build the same key at once
+    tmp = None
+    try:
+        FEATURE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=FEATURE_CACHE_DIR, prefix=path.name, suffix=".tmp", delete=False) as f:
+            tmp = f.name
+            np.savez(f, X=matrix["X"], y=matrix["y"], columns=np.array(matrix["columns"]),
+                     dates=matrix["index"].values.astype("datetime64[ns]").astype(np.int64))
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning(f"Could not cache feature matrix {key}: {e}")
+        if tmp is not None:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+    return matrix
+
+
+def _load(path: Path) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            return {
+                "X": np.ascontiguousarray(z["X"]),
+                "y": z["y"],
+                "columns": [str(c) for c in z["columns"]],
+                "index": pd.DatetimeIndex(z["dates"].astype("datetime64[ns]"), name="Date"),
+            }
+    except Exception as e:
+        log.warning(f"Feature matrix cache {path.name} unreadable: {e}")
+        return None
+
+
+def matrix_frames(matrix: Dict):
+    """``(X, y)`` as DataFrame / Series sharing the matrix's index."""
+    X = pd.DataFrame(matrix["X"], index=matrix["index"], columns=matrix["columns"])
+    y = pd.Series(matrix["y"], index=matrix["index"], name=TARGET_COLUMN)
+    return X, y
@@ -1,50 +1,23 @@
 import pandas as pd
-import lightgbm as lgb
-from sklearn.model_selection import TimeSeriesSplit, cross_val_score, train_test_split
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from dash.exceptions import PreventUpdate
-from dash import dcc, html, ctx
+from dash import dcc, html, ctx, no_update
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State, MATCH, ALL, ALLSMALLER
-import optuna
 import plotly.graph_objs as go
-import joblib
 import json
-from multiprocessing import Pool
-from core.conf import PREPROC_FILENAME
+from core.datasets import get_btc_preprocessed
+from core.features import parse_lags
+from core.jobs import cancel_job, get_job, list_models, submit_job
+from core.tuning import DEFAULT_TRIALS
 
-# Load the data
-btc_data = pd.read_csv(PREPROC_FILENAME, parse_dates=['Date'], index_col='Date')
-print(f"Hyperparam data loaded from {PREPROC_FILENAME}.")
+# Shared read-only frame (see core.datasets); copy before adding columns
+btc_data = get_btc_preprocessed()
 
 # Define available features
 available_features = btc_data.columns.tolist()
 
-# Define the hyperparameter tuning function using optuna
-def tune_hyperparameters(X_train, y_train, n_jobs=-1):
-    def objective(trial, X_train, y_train):
-        max_depth = trial.suggest_int("max_depth", 3, 10)
-        num_leaves = trial.suggest_int("num_leaves", 31, 255)
-        learning_rate = trial.suggest_float("learning_rate", 1e-3, 1e-1, log=True)
-
-        params = {
-            "max_depth": max_depth,
-            "num_leaves": num_leaves,
-            "learning_rate": learning_rate,
-        }
-
-        model = lgb.LGBMRegressor(**params)
-        scores = cross_val_score(model, X_train, y_train, scoring="neg_mean_squared_error", cv=TimeSeriesSplit(n_splits=5), n_jobs=n_jobs)
-        avg_score = -scores.mean()
-
-        return avg_score
-
-    sampler = optuna.samplers.TPESampler(seed=42)
-    study = optuna.create_study(direction="minimize", sampler=sampler)
-    study.optimize(lambda trial: objective(trial, X_train, y_train), n_trials=100, n_jobs=n_jobs)
-
-    best_params = study.best_params
-    return best_params
+# Tuning itself (persistent, prunable Optuna studies) lives in core.tuning and
+# runs in the background job worker (core.jobs)
 
 # Define the layout
 layout = dbc.Container(
@@ -96,6 +69,16 @@ layout = dbc.Container(
                                         color="primary",
                                         className="mt-3",
                                     ),
+                                    dbc.Button(
+                                        "Cancel",
+                                        id="cancel-training-button",
+                                        color="secondary",
+                                        className="mt-3 ms-2",
+                                    ),
+                                    dcc.Store(id="training-job-id"),
+                                    dcc.Interval(id="training-job-poll", interval=2000, disabled=True),
+                                    dbc.Progress(id="training-progress", value=0, className="mt-3"),
+                                    html.Div(id="training-status", className="mt-2 small"),
                                 ]
                             ),
                         ]
@@ -111,7 +94,8 @@ layout = dbc.Container(
                                     dcc.Loading(
                                         id="prediction-loading",
                                         children=[
-                                            dcc.Graph(id="prediction-graph",\n                                                     config={\"displayModeBar\": False, \"displaylogo\": False}),
+                                            dcc.Graph(id="prediction-graph",
+                                                      config={"displayModeBar": False, "displaylogo": False}),
                                             dbc.Card(
                                                 [
                                                     dbc.CardHeader("Evaluation Metrics"),
@@ -123,6 +107,13 @@ layout = dbc.Container(
                                                 ],
                                                 className="mt-3",
                                             ),
+                                            dbc.Card(
+                                                [
+                                                    dbc.CardHeader("Model Registry"),
+                                                    dbc.CardBody(dbc.ListGroup(id="model-registry")),
+                                                ],
+                                                className="mt-3",
+                                            ),
                                         ],
                                         type="default",
                                     ),
@@ -218,64 +209,92 @@ def register_callbacks(app):
         return current_values
 
     @app.callback(
-        Output("prediction-graph", "figure"),
-        Output("evaluation-metrics", "children"),
+        Output("training-job-id", "data"),
+        Output("training-job-poll", "disabled"),
         Input("train-button", "n_clicks"),
-        State("features-store", "value"),
+        State("features-store", "data"),
         State("lag-input", "value"),
         State("prediction-horizon", "value"),
+        prevent_initial_call=True,
     )
-    def train_and_predict(n_clicks, selected_features, lags, prediction_horizon):
-        if n_clicks is None:
+    def start_training(n_clicks, selected_features, lags, prediction_horizon):
+        if not n_clicks or not selected_features:
             raise PreventUpdate
-        
-        selected_features = [feature["props"]["children"] for feature in selected_features]
+        selected_features = [f if isinstance(f, str) else f["props"]["children"] for f in selected_features]
 
-        # Prepare the data
-        X = btc_data[selected_features]
-        for feature in selected_features:
-            for lag in lags:
-                X[f"{feature}_lag{lag}"] = X[feature].shift(int(lag))
+        # Tuning and training run in the job worker process (see core.jobs),
+        # this callback only queues the job.
+        job_id = submit_job("train", {
+            "features": selected_features,
+            "lags": parse_lags(lags),
+            "horizon": int(prediction_horizon or 1),
+            "n_trials": DEFAULT_TRIALS,
+        })
+        return job_id, False
 
-        y = btc_data["price"].shift(-prediction_horizon)  # Shift the target variable for prediction
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
-
-        # Hyperparameter tuning
-        with Pool() as pool:
-            best_params = tune_hyperparameters(X_train, y_train, n_jobs=pool._processes)
-
-        # Train the model with the best hyperparameters
-        model = lgb.LGBMRegressor(**best_params)
-        model.fit(X_train, y_train)
-
-        # Make predictions
-        y_pred = model.predict(X_test)
-
-        # Calculate evaluation metrics
-        mse = mean_squared_error(y_test, y_pred)
-        rmse = mean_squared_error(y_test, y_pred, squared=False)
-        mae = mean_absolute_error(y_test, y_pred)
-        r2 = r2_score(y_test, y_pred)
+    @app.callback(
+        Output("training-job-id", "data", allow_duplicate=True),
+        Input("cancel-training-button", "n_clicks"),
+        State("training-job-id", "data"),
+        prevent_initial_call=True,
+    )
+    def cancel_training(n_clicks, job_id):
+        if not n_clicks or job_id is None:
+            raise PreventUpdate
+        cancel_job(job_id)
+        return job_id
 
-        # Save the best hyperparameters to a CSV file
-        best_params_df = pd.DataFrame([best_params])
-        best_params_df.to_csv("best_params.csv", index=False)
+    @app.callback(
+        Output("training-progress", "value"),
+        Output("training-progress", "label"),
+        Output("training-status", "children"),
+        Output("prediction-graph", "figure"),
+        Output("evaluation-metrics", "children"),
+        Output("model-registry", "children"),
+        Output("training-job-poll", "disabled", allow_duplicate=True),
+        Input("training-job-poll", "n_intervals"),
+        Input("training-job-id", "data"),
+        prevent_initial_call=True,
+    )
+    def poll_training(n_intervals, job_id):
+        job = get_job(job_id) if job_id is not None else None
+        if job is None:
+            raise PreventUpdate
 
-        # Save the trained model
-        joblib.dump(model, "trained_model.joblib")
+        total = job["total"] or 1
+        pct = min(100, int(100 * job["progress"] / total))
+        status = f"Job {job['id']}: {job['status']} - {job['progress']}/{job['total']} trials"
+        if job["best_value"] is not None:
+            status += f", best CV MSE so far {job['best_value']:.4f}"
+        if job["status"] == "failed" and job["message"]:
+            status += f" ({job['message'].splitlines()[0]})"
 
-        # Plot the predictions
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=y_test.index, y=y_test, mode="lines", name="Actual"))
-        fig.add_trace(go.Scatter(x=y_test.index, y=y_pred, mode="lines", name="Predicted"))
-        fig.update_layout(title="Bitcoin Price Prediction", xaxis_title="Date", yaxis_title="Price")
+        finished = job["status"] in ("done", "failed", "cancelled")
+        fig, metrics_text = no_update, no_update
+        result = job["result"] or {}
+        if job["status"] == "done" and "test" in result:
+            test, metrics = result["test"], result["metrics"]
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(x=test["dates"], y=test["actual"], mode="lines", name="Actual"))
+            fig.add_trace(go.Scatter(x=test["dates"], y=test["predicted"], mode="lines", name="Predicted"))
+            fig.update_layout(title="Bitcoin Price Prediction", xaxis_title="Date", yaxis_title="Price")
+            metrics_text = [
+                html.H6("Mean Squared Error (MSE): {:.4f}".format(metrics["mse"])),
+                html.H6("Root Mean Squared Error (RMSE): {:.4f}".format(metrics["rmse"])),
+                html.H6("Mean Absolute Error (MAE): {:.4f}".format(metrics["mae"])),
+                html.H6("R-squared (R²): {:.4f}".format(metrics["r2"])),
+            ]
+        return pct, f"{pct}%", status, fig, metrics_text, _registry_list(), finished
 
-        # Display evaluation metrics
-        metrics_text = [
-            html.H6("Mean Squared Error (MSE): {:.4f}".format(mse)),
-            html.H6("Root Mean Squared Error (RMSE): {:.4f}".format(rmse)),
-            html.H6("Mean Absolute Error (MAE): {:.4f}".format(mae)),
-            html.H6("R-squared (R²): {:.4f}".format(r2)),
-        ]
 
-        return fig, metrics_text
\ No newline at end of file
+def _registry_list():
+    """Past training runs from the model registry, newest (active) first."""
+    items = []
+    for m in list_models():
+        spec, metrics = m["spec"], m["metrics"]
+        created = pd.Timestamp(m["created_at"], unit="s").strftime("%Y-%m-%d %H:%M")
+        items.append(dbc.ListGroupItem(
+            f"#{m['id']} {created} - {', '.join(spec['features'])} "
+            f"(lags {spec['lags'] or '-'}, h={spec['horizon']}) RMSE {metrics['rmse']:.2f}, R² {metrics['r2']:.3f}"
+        ))
+    return items or [dbc.ListGroupItem("No trained models yet.")]
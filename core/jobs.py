@@ -0,0 +1,374 @@
+"""
+Background job queue for tuning and training runs.
+
+Jobs are rows in a local SQLite file. The web workers only submit jobs and
+read their status; the CPU work runs in a separate worker process
+(``python -m core.jobs``), started on demand by :func:`ensure_worker`, so a
+tuning run is never bound by the gunicorn request timeout.
+
+While a job runs, an Optuna callback writes the number of finished trials and
+the best CV error so far to the job row and stops the study when the job is
+cancelled. Every finished training job is added to the model registry; the
+newest one becomes the active model read by core.prediction.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import optuna
+
+from components.local_db import get_connection
+from core.conf import BEST_PARAMS_FILENAME, PROJECT_ROOT
+
+log = logging.getLogger(__name__)
+
+JOBS_DIR = Path.home() / ".pytr"
+JOBS_DB = JOBS_DIR / "jobs.sqlite"
+MODELS_DIR = JOBS_DIR / "models"
+
+JOB_KINDS = ("tune", "train")
+POLL_INTERVAL = 1.0
+# A worker with no heartbeat for this long is considered dead
+HEARTBEAT_TIMEOUT = 30
+# Spawned workers exit after this long without work
+IDLE_EXIT = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind        TEXT NOT NULL,
+    params      TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    progress    INTEGER NOT NULL DEFAULT 0,
+    total       INTEGER NOT NULL DEFAULT 0,
+    best_value  REAL,
+    message     TEXT,
+    result      TEXT,
+    cancel      INTEGER NOT NULL DEFAULT 0,
+    pid         INTEGER,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS models (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id     INTEGER,
+    path       TEXT NOT NULL,
+    sha1       TEXT NOT NULL,
+    spec       TEXT NOT NULL,
+    params     TEXT NOT NULL,
+    metrics    TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    pid       INTEGER PRIMARY KEY,
+    heartbeat REAL NOT NULL
+)
+"""
+
+_schema_ready_pid: Optional[int] = None
+
+
+def _conn():
+    global _schema_ready_pid
+    conn = get_connection(JOBS_DB)
+    if _schema_ready_pid != os.getpid():
+        conn.executescript(_SCHEMA)
+        _schema_ready_pid = os.getpid()
+    return conn
+
+
+def _row_to_job(row) -> Dict:
+    keys = ("id", "kind", "params", "status", "progress", "total", "best_value", "message",
+            "result", "cancel", "pid", "created_at", "started_at", "finished_at")
+    job = dict(zip(keys, row))
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel"] = bool(job["cancel"])
+    return job
+
+
+# ============================================================================
+# QUEUE API (used from the web workers)
+# ============================================================================
+
+def submit_job(kind: str, params: Dict, start_worker: bool = True) -> int:
+    """Queue a job and return its id. Starts a worker process if none is alive."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    cur = _conn().execute(
+        "INSERT INTO jobs (kind, params, status, total, created_at) VALUES (?, ?, 'queued', ?, ?)",
+        (kind, json.dumps(params), int(params.get("n_trials") or 0), time.time()),
+    )
+    job_id = cur.lastrowid
+    log.info(f"Queued {kind} job {job_id}")
+    if start_worker:
+        ensure_worker()
+    return job_id
+
+
+def get_job(job_id: int) -> Optional[Dict]:
+    row = _conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(limit: int = 20) -> List[Dict]:
+    rows = _conn().execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [_row_to_job(r) for r in rows]
+
+
+def cancel_job(job_id: int) -> None:
+    """Cancel a queued job now, or ask the worker to stop a running one."""
+    conn = _conn()
+    conn.execute(
+        "UPDATE jobs SET status = 'cancelled', cancel = 1, finished_at = ? WHERE id = ? AND status = 'queued'",
+        (time.time(), job_id),
+    )
+    conn.execute("UPDATE jobs SET cancel = 1 WHERE id = ? AND status = 'running'", (job_id,))
+
+
+def list_models(limit: int = 20) -> List[Dict]:
+    """Registered models, newest first."""
+    rows = _conn().execute(
+        "SELECT id, job_id, path, sha1, spec, params, metrics, created_at FROM models ORDER BY id DESC LIMIT ?",
+        (limit,),
+    ).fetchall()
+    return [
+        {"id": r[0], "job_id": r[1], "path": r[2], "sha1": r[3], "spec": json.loads(r[4]),
+         "params": json.loads(r[5]), "metrics": json.loads(r[6]), "created_at": r[7]}
+        for r in rows
+    ]
+
+
+def activate_model(model_id: int) -> bool:
+    """Make a registered model the one used for the prediction columns."""
+    import joblib
+    from core.prediction import save_model
+
+    model = next((m for m in list_models(limit=-1) if m["id"] == model_id), None)
+    if model is None or not os.path.exists(model["path"]):
+        return False
+    spec = model["spec"]
+    save_model(joblib.load(model["path"]), spec["features"], spec["lags"], spec["horizon"])
+    return True
+
+
+# ============================================================================
+# WORKER PROCESS
+# ============================================================================
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def worker_running() -> bool:
+    cutoff = time.time() - HEARTBEAT_TIMEOUT
+    rows = _conn().execute("SELECT pid FROM workers WHERE heartbeat > ?", (cutoff,)).fetchall()
+    return any(_alive(pid) for (pid,) in rows)
+
+
+def ensure_worker() -> None:
+    """Start a detached worker process unless one is already polling the queue."""
+    if worker_running():
+        return
+    subprocess.Popen(
+        [sys.executable, "-m", "core.jobs"],
+        cwd=PROJECT_ROOT,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    log.info("Started job worker process")
+
+
+def _heartbeat() -> None:
+    _conn().execute("INSERT OR REPLACE INTO workers (pid, heartbeat) VALUES (?, ?)", (os.getpid(), time.time()))
+
+
+def _heartbeat_loop(stop: threading.Event) -> None:
+    # Keeps the worker visible to ensure_worker() while a long job runs
+    while not stop.wait(HEARTBEAT_TIMEOUT / 3):
+        _heartbeat()
+
+
+def _reap_stale() -> None:
+    """Fail jobs left 'running' by a worker process that no longer exists."""
+    conn = _conn()
+    for job_id, pid in conn.execute("SELECT id, pid FROM jobs WHERE status = 'running'").fetchall():
+        if pid is None or not _alive(pid):
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', message = 'worker died', finished_at = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+
+
+def _claim_next() -> Optional[Dict]:
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', pid = ?, started_at = ? WHERE id = ?",
+                (os.getpid(), time.time(), row[0]),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return get_job(row[0]) if row is not None else None
+
+
+def _finish(job_id: int, status: str, message: str = None, result: Dict = None) -> None:
+    _conn().execute(
+        "UPDATE jobs SET status = ?, message = ?, result = ?, finished_at = ? WHERE id = ?",
+        (status, message, json.dumps(result) if result is not None else None, time.time(), job_id),
+    )
+
+
+def _cancel_requested(job_id: int) -> bool:
+    row = _conn().execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return bool(row and row[0])
+
+
+class JobCallback:
+    """Optuna callback recording progress of *job_id*; stops the study on cancel.
+
+    Module-level class so it can be pickled into the tuning worker processes.
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+
+    def __call__(self, study: optuna.Study, trial: optuna.trial.FrozenTrial) -> None:
+        finished = (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+        done = sum(1 for t in study.get_trials(deepcopy=False) if t.state in finished)
+        try:
+            best = study.best_value
+        except ValueError:
+            best = None
+        _conn().execute("UPDATE jobs SET progress = ?, best_value = ? WHERE id = ?", (done, best, self.job_id))
+        if _cancel_requested(self.job_id):
+            study.stop()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _run_job(job: Dict) -> Dict:
+    """Tune (and for 'train' jobs fit, evaluate and register) a price model."""
+    import lightgbm as lgb
+    import pandas as pd
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    from sklearn.model_selection import train_test_split
+
+    from core.datasets import get_btc_preprocessed
+    from core.features import build_lag_matrix, matrix_frames, parse_lags
+    from core.tuning import DEFAULT_TRIALS, tune_hyperparameters
+
+    params = job["params"]
+    features, lags = list(params["features"]), parse_lags(params.get("lags"))
+    horizon = int(params.get("horizon") or 1)
+    n_trials = int(params.get("n_trials") or DEFAULT_TRIALS)
+
+    matrix = build_lag_matrix(get_btc_preprocessed(), features, lags, horizon)
+    X, y = matrix_frames(matrix)
+    X, y = X[y.notna()], y[y.notna()]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+
+    best_params = tune_hyperparameters(X_train, y_train, n_trials=n_trials, horizon=horizon,
+                                       callbacks=[JobCallback(job["id"])])
+    if _cancel_requested(job["id"]):
+        raise JobCancelled()
+    pd.DataFrame([best_params]).to_csv(BEST_PARAMS_FILENAME, index=False)
+    result = {"best_params": best_params}
+    if job["kind"] == "tune":
+        return result
+
+    model = lgb.LGBMRegressor(**best_params, verbosity=-1)
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    mse = mean_squared_error(y_test, y_pred)
+    metrics = {
+        "mse": float(mse),
+        "rmse": float(mse ** 0.5),
+        "mae": float(mean_absolute_error(y_test, y_pred)),
+        "r2": float(r2_score(y_test, y_pred)),
+    }
+    result.update(
+        metrics=metrics,
+        model_id=_register_model(job["id"], model, features, lags, horizon, best_params, metrics),
+        test={"dates": [d.strftime("%Y-%m-%d") for d in y_test.index],
+              "actual": y_test.tolist(), "predicted": [float(v) for v in y_pred]},
+    )
+    return result
+
+
+def _register_model(job_id: int, model, features, lags, horizon, best_params, metrics) -> int:
+    """Store the model under MODELS_DIR, add it to the registry and make it active."""
+    import joblib
+    from core.prediction import save_model
+
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    path = MODELS_DIR / f"job_{job_id}.joblib"
+    joblib.dump(model, path)
+    sha1 = save_model(model, features, lags, horizon)
+    spec = {"features": list(features), "lags": list(lags), "horizon": horizon}
+    cur = _conn().execute(
+        "INSERT INTO models (job_id, path, sha1, spec, params, metrics, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (job_id, str(path), sha1, json.dumps(spec), json.dumps(best_params), json.dumps(metrics), time.time()),
+    )
+    return cur.lastrowid
+
+
+def run_worker(idle_exit: Optional[float] = IDLE_EXIT) -> None:
+    """Process queued jobs one at a time until idle for *idle_exit* seconds (None: forever)."""
+    log.info(f"Job worker {os.getpid()} started")
+    _heartbeat()
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat_loop, args=(stop,), daemon=True).start()
+    idle_since = time.time()
+    try:
+        while True:
+            _reap_stale()
+            job = _claim_next()
+            if job is None:
+                if idle_exit is not None and time.time() - idle_since > idle_exit:
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+            log.info(f"Running {job['kind']} job {job['id']}")
+            try:
+                _finish(job["id"], "done", result=_run_job(job))
+            except JobCancelled:
+                _finish(job["id"], "cancelled")
+            except Exception as e:
+                log.error(f"Job {job['id']} failed: {e}")
+                _finish(job["id"], "failed", message=f"{e}\n{traceback.format_exc()}")
+            idle_since = time.time()
+    finally:
+        stop.set()
+        _conn().execute("DELETE FROM workers WHERE pid = ?", (os.getpid(),))
+    log.info(f"Job worker {os.getpid()} exiting")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued tuning/training jobs.")
+    parser.add_argument("--forever", action="store_true", help="keep polling instead of exiting when idle")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    run_worker(idle_exit=None if args.forever else IDLE_EXIT)
@@ -0,0 +1,133 @@
+"""
+On-chain indicator store.
+
+The on-chain data is a directory tree of small CSVs, one series per file
+(``<source>/<group>/<name>.csv`` with ``date`` and a value column). They are
+merged once into a single date-aligned float64 block saved as ``_store.npz``
+in the same directory, together with a manifest of each file's size and
+mtime. Later loads only re-read the files whose entry in the manifest no
+longer matches, so adding sources does not slow down every load.
+"""
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.conf import DATA_DIR
+
+log = logging.getLogger(__name__)
+
+ONCHAIN_DIR = Path(DATA_DIR) / "indicators"
+STORE_NAME = "_store.npz"
+
+# Price series duplicated from the main BTC history
+SKIP_FILES = {"price.csv", "30d_sma.csv", "365d_sma.csv"}
+
+
+def _column_name(base_dir: Path, file_path: Path) -> str:
+    return "__".join(file_path.relative_to(base_dir).with_suffix("").parts[1:])
+
+
+def _scan(base_dir: Path) -> Dict[str, Tuple[str, str]]:
+    """{relative path: (column name, "size:mtime_ns")} for every source CSV."""
+    sources = {}
+    for file_path in base_dir.rglob("*.csv"):
+        if file_path.name in SKIP_FILES:
+            continue
+        st = file_path.stat()
+        rel = file_path.relative_to(base_dir).as_posix()
+        sources[rel] = (_column_name(base_dir, file_path), f"{st.st_size}:{st.st_mtime_ns}")
+    return sources
+
+
+def _read_source(file_path: Path, column: str) -> pd.Series:
+    df = pd.read_csv(file_path, parse_dates=["date"], index_col="date")
+    series = pd.to_numeric(df.iloc[:, 0], errors="coerce").astype(np.float64)
+    series = series[~series.index.duplicated(keep="last")].sort_index()
+    series.index = series.index.astype("datetime64[ns]")  # the unit the store keeps
+    series.name = column
+    return series
+
+
+def _load_store(path: Path) -> Tuple[Optional[pd.DataFrame], Dict[str, List[str]]]:
+    if not path.exists():
+        return None, {}
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            index = pd.DatetimeIndex(z["dates"].astype("datetime64[ns]"), name="date")
+            df = pd.DataFrame(z["values"], index=index, columns=[str(c) for c in z["columns"]])
+            manifest = json.loads(str(z["manifest"]))
+        return df, manifest
+    except Exception as e:
+        log.warning(f"On-chain store unreadable, rebuilding: {e}")
+        return None, {}
+
+
+def _save_store(path: Path, df: pd.DataFrame, manifest: Dict[str, List[str]]) -> None:
+    # A temp file of its own, so workers rebuilding at the same time cannot mix their writes
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, suffix=".tmp", delete=False) as f:
+            tmp = f.name
+            np.savez(
+                f,
+                dates=df.index.values.astype("datetime64[ns]").astype(np.int64),
+                values=df.to_numpy(dtype=np.float64),
+                columns=np.array(df.columns.tolist(), dtype=str),
+                manifest=np.array(json.dumps(manifest)),
+            )
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning(f"Could not write on-chain store: {e}")
+        if tmp is not None:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+
+def load_onchain_indicators(base_dir: Path = ONCHAIN_DIR) -> pd.DataFrame:
+    """All on-chain series as one frame indexed by date (outer-aligned).
+
+    Returns an empty frame if the directory has no source files.
+    """
+    base_dir = Path(base_dir)
+    if not base_dir.is_dir():
+        return pd.DataFrame()
+
+    store_path = base_dir / STORE_NAME
+    sources = _scan(base_dir)
+    df, manifest = _load_store(store_path)
+    if df is None:
+        df, manifest = pd.DataFrame(), {}
+
+    changed = [rel for rel, (col, stamp) in sources.items() if manifest.get(rel) != [col, stamp]]
+    removed = [rel for rel in manifest if rel not in sources]
+    if not changed and not removed:
+        return df
+
+    stale_columns = {manifest[rel][0] for rel in removed + changed if rel in manifest}
+    df = df.drop(columns=[c for c in stale_columns if c in df.columns]).dropna(how="all")
+    fresh = []
+    for rel in changed:
+        column = sources[rel][0]
+        try:
+            fresh.append(_read_source(base_dir / rel, column))
+        except Exception as e:
+            log.warning(f"Skipping on-chain source {rel}: {e}")
+            continue
+    if fresh:
+        df = pd.concat([df] + fresh, axis=1) if not df.empty else pd.concat(fresh, axis=1)
+        df = df.sort_index()
+        df.index.name = "date"
+
+    manifest = {rel: [col, stamp] for rel, (col, stamp) in sources.items() if col in df.columns}
+    log.info(f"On-chain store: {len(changed)} source(s) re-ingested, {len(removed)} removed, "
+             f"{df.shape[1]} series total")
+    _save_store(store_path, df, manifest)
+    return df
@@ -0,0 +1,114 @@
+"""
+Model-prediction columns for backtest rules.
+
+Loads the model saved by the hyperparameter tuning page once per process and
+predicts over the whole indicator frame in a single batched call, adding
+
+- ``model_pred``: the predicted price *horizon* days ahead
+- ``model_pred_return``: ``model_pred / price - 1``
+
+so rules can use ``current('model_pred')`` without per-row inference. The
+columns are cached by the SHA-1 of the model file and the feature matrix
+key; saving a retrained model changes the hash and invalidates them.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from core.conf import MODEL_FILENAME, MODEL_META_FILENAME
+from core.features import TARGET_COLUMN, build_lag_matrix
+
+log = logging.getLogger(__name__)
+
+PRED_COLUMNS = ["model_pred", "model_pred_return"]
+
+# (path, size, mtime_ns) -> (model, metadata, sha1); one model per process
+_model_state: Dict[str, Tuple] = {}
+# (model sha1, matrix key) -> prediction array
+_pred_cache: Dict[Tuple[str, str], np.ndarray] = {}
+_PRED_CACHE_MAX = 8
+
+
+def save_model(model, features, lags, horizon: int,
+               path: str = MODEL_FILENAME, meta_path: str = MODEL_META_FILENAME) -> str:
+    """Save *model* with the feature spec it was trained on; returns the file hash."""
+    joblib.dump(model, path)
+    meta = {"features": list(features), "lags": list(lags or []), "horizon": int(horizon or 1)}
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return _file_hash(path)
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_model(path: str = MODEL_FILENAME, meta_path: str = MODEL_META_FILENAME) -> Optional[Tuple]:
+    """``(model, metadata, sha1)`` of the saved model, or None if there is none.
+
+    Re-read only when the file's size or mtime changes.
+    """
+    try:
+        st = os.stat(path)
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stamp = (st.st_size, st.st_mtime_ns)
+    state = _model_state.get(path)
+    if state is not None and state[0] == stamp:
+        return state[1]
+    try:
+        loaded = (joblib.load(path), meta, _file_hash(path))
+    except Exception as e:
+        log.warning(f"Could not load model {path}: {e}")
+        return None
+    _model_state[path] = (stamp, loaded)
+    log.info(f"Loaded price model {loaded[2][:10]} ({len(meta.get('features', []))} features)")
+    return loaded
+
+
+def predict_frame(df: pd.DataFrame, path: str = MODEL_FILENAME,
+                  meta_path: str = MODEL_META_FILENAME) -> Optional[pd.DataFrame]:
+    """``model_pred`` / ``model_pred_return`` for every row of *df*, or None."""
+    loaded = load_model(path, meta_path)
+    if loaded is None:
+        return None
+    model, meta, model_hash = loaded
+    features = meta.get("features", [])
+    if not features or any(f not in df.columns for f in features + [TARGET_COLUMN]):
+        log.warning("Saved model features are not in the indicator frame; skipping predictions")
+        return None
+
+    matrix = build_lag_matrix(df, features, meta.get("lags"), meta.get("horizon", 1))
+    key = (model_hash, matrix["key"])
+    pred = _pred_cache.get(key)
+    if pred is None:
+        X = pd.DataFrame(matrix["X"], index=matrix["index"], columns=matrix["columns"])
+        pred = np.asarray(model.predict(X), dtype=np.float64)
+        if len(_pred_cache) >= _PRED_CACHE_MAX:
+            _pred_cache.pop(next(iter(_pred_cache)))
+        _pred_cache[key] = pred
+
+    price = df[TARGET_COLUMN].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = pred / price - 1.0
+    return pd.DataFrame({"model_pred": pred, "model_pred_return": ret}, index=df.index)
+
+
+def add_model_predictions(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the prediction columns to *df* in place (no-op without a saved model)."""
+    preds = predict_frame(df)
+    if preds is not None:
+        df[PRED_COLUMNS] = preds[PRED_COLUMNS].to_numpy()
+    return df
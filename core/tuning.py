@@ -0,0 +1,253 @@
+"""
+LightGBM hyperparameter tuning with persistent Optuna studies.
+
+Studies are stored in a local SQLite file and named after the feature set and
+a hash of the training data, so re-running the same tuning resumes where it
+stopped, and tuning on a new data version warm-starts from the best
+parameters found for the same features before.
+
+Each trial reports its running cross-validation error after every
+TimeSeriesSplit fold; the median pruner stops trials that are already worse
+than the median after the first folds.
+
+Each process bins the training data once: the per-fold ``lightgbm.Dataset``
+objects are built on first use (``free_raw_data=False``) and every later
+trial in that process trains on them directly.
+
+Parallelism is planned from a single CPU budget: the budget is split into
+concurrent trials (separate worker processes sharing the study through the
+SQLite storage) times LightGBM threads per trial, so nothing is nested and
+cores are never oversubscribed.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import optuna
+import pandas as pd
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import TimeSeriesSplit
+
+log = logging.getLogger(__name__)
+
+TUNING_DIR = Path.home() / ".pytr"
+STUDY_DB = TUNING_DIR / "optuna_studies.sqlite"
+
+N_SPLITS = 5
+DEFAULT_TRIALS = 100
+SAMPLER_SEED = 42
+
+# LGBMRegressor's default n_estimators, kept so scores stay comparable
+NUM_BOOST_ROUND = 100
+
+# LightGBM on a few thousand rows gains little from more threads than this;
+# the rest of the budget is better spent on concurrent trials.
+MAX_THREADS_PER_TRIAL = 4
+
+
+def feature_key(columns: List[str], horizon: Optional[int] = None) -> str:
+    """Short stable id of a feature set (and prediction horizon)."""
+    text = ",".join(sorted(map(str, columns))) + f"|h={horizon}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+
+def dataset_hash(X: pd.DataFrame, y: pd.Series) -> str:
+    """Content hash of the training data (values, index and column names)."""
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(X, index=True).values.tobytes())
+    h.update(pd.util.hash_pandas_object(y, index=True).values.tobytes())
+    h.update(",".join(map(str, X.columns)).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def get_storage() -> optuna.storages.RDBStorage:
+    TUNING_DIR.mkdir(parents=True, exist_ok=True)
+    return optuna.storages.RDBStorage(
+        url=f"sqlite:///{STUDY_DB}",
+        engine_kwargs={"connect_args": {"timeout": 30}},
+    )
+
+
+def make_sampler(worker: int = 0) -> optuna.samplers.BaseSampler:
+    # Distinct seeds, otherwise parallel workers would propose identical trials
+    return optuna.samplers.TPESampler(seed=SAMPLER_SEED + worker)
+
+
+def make_pruner() -> optuna.pruners.BasePruner:
+    return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=0)
+
+
+def suggest_params(trial: optuna.Trial) -> Dict:
+    return {
+        "max_depth": trial.suggest_int("max_depth", 3, 10),
+        "num_leaves": trial.suggest_int("num_leaves", 31, 255),
+        "learning_rate": trial.suggest_float("learning_rate", 1e-3, 1e-1, log=True),
+    }
+
+
+# {study name: [(train Dataset, X_valid, y_valid), ...]}, one entry per process
+_fold_cache: Dict[str, List[Tuple[lgb.Dataset, np.ndarray, np.ndarray]]] = {}
+
+
+def fold_datasets(X: np.ndarray, y: np.ndarray, key: str) -> List[Tuple[lgb.Dataset, np.ndarray, np.ndarray]]:
+    """Binned training Dataset and validation arrays for each TimeSeriesSplit fold."""
+    folds = _fold_cache.get(key)
+    if folds is None:
+        folds = []
+        for train_idx, valid_idx in TimeSeriesSplit(n_splits=N_SPLITS).split(X):
+            # Folds are contiguous ranges: slice instead of copying with fancy indexing
+            train = slice(train_idx[0], train_idx[-1] + 1)
+            valid = slice(valid_idx[0], valid_idx[-1] + 1)
+            train_set = lgb.Dataset(X[train], label=y[train], free_raw_data=False,
+                                    params={"verbosity": -1}).construct()
+            folds.append((train_set, X[valid], y[valid]))
+        _fold_cache.clear()  # only the study being tuned is kept
+        _fold_cache[key] = folds
+    return folds
+
+
+def cv_objective(trial: optuna.Trial, folds: List[Tuple[lgb.Dataset, np.ndarray, np.ndarray]],
+                 n_jobs: int = 1) -> float:
+    """Mean fold MSE; reports after each fold so the pruner can stop early."""
+    params = suggest_params(trial)
+    params.update(objective="regression", num_threads=n_jobs, verbosity=-1)
+    scores = []
+    for step, (train_set, X_valid, y_valid) in enumerate(folds):
+        booster = lgb.train(params, train_set, num_boost_round=NUM_BOOST_ROUND)
+        scores.append(mean_squared_error(y_valid, booster.predict(X_valid, num_threads=n_jobs)))
+        trial.report(float(np.mean(scores)), step)
+        if trial.should_prune():
+            raise optuna.TrialPruned()
+    return float(np.mean(scores))
+
+
+def _warm_start(study: optuna.Study, storage, prefix: str) -> None:
+    """Seed a new study with the best params of the latest study for the same features."""
+    previous = [
+        s for s in optuna.get_all_study_summaries(storage)
+        if s.study_name.startswith(prefix) and s.study_name != study.study_name and s.best_trial is not None
+    ]
+    if not previous:
+        return
+    latest = max(previous, key=lambda s: s.datetime_start or pd.Timestamp.min)
+    study.enqueue_trial(latest.best_trial.params)
+    log.info(f"Warm-starting {study.study_name} from {latest.study_name}")
+
+
+def open_study(X: pd.DataFrame, y: pd.Series, horizon: Optional[int] = None) -> optuna.Study:
+    """Create or resume the study for this feature set and data version."""
+    storage = get_storage()
+    prefix = f"lgbm-{feature_key(X.columns, horizon)}-"
+    name = prefix + dataset_hash(X, y)
+    study = optuna.create_study(
+        study_name=name,
+        storage=storage,
+        load_if_exists=True,
+        direction="minimize",
+        sampler=make_sampler(),
+        pruner=make_pruner(),
+    )
+    if not study.trials:
+        _warm_start(study, storage, prefix)
+    return study
+
+
+def remaining_trials(study: optuna.Study, n_trials: int) -> int:
+    """Trials still to run for a budget of *n_trials* finished (complete or pruned) trials."""
+    done = sum(
+        1 for t in study.get_trials(deepcopy=False)
+        if t.state in (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)
+    )
+    return max(0, n_trials - done)
+
+
+# ============================================================================
+# PARALLEL SCHEDULING
+# ============================================================================
+
+def plan_parallelism(n_trials: int, cpu_budget: Optional[int] = None,
+                     threads_per_trial: Optional[int] = None) -> Tuple[int, int]:
+    """Split *cpu_budget* cores into ``(concurrent_trials, threads_per_trial)``.
+
+    The product never exceeds the budget. Defaults come from
+    TUNING_CPU_BUDGET / TUNING_THREADS_PER_TRIAL, then os.cpu_count().
+    """
+    budget = cpu_budget or int(os.environ.get("TUNING_CPU_BUDGET", 0)) or os.cpu_count() or 1
+    threads = threads_per_trial or int(os.environ.get("TUNING_THREADS_PER_TRIAL", 0))
+    if not threads:
+        # One thread per trial until there are more cores than trials to run
+        threads = min(MAX_THREADS_PER_TRIAL, max(1, budget // max(1, n_trials)))
+    threads = max(1, min(threads, budget))
+    workers = max(1, min(budget // threads, n_trials))
+    return workers, threads
+
+
+def _run_worker(study_name: str, X: np.ndarray, y: np.ndarray, n_trials: int,
+                threads: int, worker: int, callbacks: Optional[List] = None) -> int:
+    """Entry point of one tuning process: run *n_trials* of the shared study."""
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.load_study(study_name=study_name, storage=get_storage(),
+                              sampler=make_sampler(worker), pruner=make_pruner())
+    folds = fold_datasets(X, y, study_name)
+    study.optimize(lambda trial: cv_objective(trial, folds, n_jobs=threads), n_trials=n_trials,
+                   callbacks=callbacks)
+    return n_trials
+
+
+def run_trials(study: optuna.Study, X: np.ndarray, y: np.ndarray, n_trials: int,
+               cpu_budget: Optional[int] = None, threads_per_trial: Optional[int] = None,
+               callbacks: Optional[List] = None) -> Dict:
+    """Run *n_trials* of *study* within the CPU budget and report throughput.
+
+    *callbacks* are passed to ``study.optimize`` in every worker process, so
+    they must be picklable.
+    """
+    workers, threads = plan_parallelism(n_trials, cpu_budget, threads_per_trial)
+    start = time.perf_counter()
+    if workers == 1:
+        folds = fold_datasets(X, y, study.study_name)
+        study.optimize(lambda trial: cv_objective(trial, folds, n_jobs=threads), n_trials=n_trials,
+                       callbacks=callbacks)
+    else:
+        share = [n_trials // workers + (1 if i < n_trials % workers else 0) for i in range(workers)]
+        # spawn: never fork a (possibly multi-threaded) web worker
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = [pool.submit(_run_worker, study.study_name, X, y, k, threads, i + 1, callbacks)
+                       for i, k in enumerate(share) if k]
+            for f in futures:
+                f.result()
+    elapsed = time.perf_counter() - start
+    stats = {
+        "trials": n_trials,
+        "workers": workers,
+        "threads_per_trial": threads,
+        "seconds": round(elapsed, 2),
+        "trials_per_minute": round(n_trials / elapsed * 60, 2) if elapsed > 0 else None,
+    }
+    log.info(f"Tuning throughput: {stats['trials_per_minute']} trials/min "
+             f"({workers} workers x {threads} threads, {n_trials} trials in {stats['seconds']}s)")
+    return stats
+
+
+def tune_hyperparameters(X_train: pd.DataFrame, y_train: pd.Series, n_trials: int = DEFAULT_TRIALS,
+                         cpu_budget: Optional[int] = None, threads_per_trial: Optional[int] = None,
+                         horizon: Optional[int] = None, callbacks: Optional[List] = None) -> Dict:
+    """Run (or resume) the tuning study and return the best parameters."""
+    mask = y_train.notna().to_numpy()
+    X_train, y_train = X_train[mask], y_train[mask]
+    study = open_study(X_train, y_train, horizon)
+    todo = remaining_trials(study, n_trials)
+    if todo:
+        X = np.ascontiguousarray(X_train.to_numpy(dtype=np.float32))
+        y = y_train.to_numpy(dtype=np.float64)
+        log.info(f"Study {study.study_name}: running {todo} of {n_trials} trials")
+        run_trials(study, X, y, todo, cpu_budget, threads_per_trial, callbacks)
+    return study.best_params
@@ -2,9 +2,10 @@ import json
 from pathlib import Path
 from datetime import datetime, date
 
+from components.price_store import get_isin_prices
+
 # Load caches
 cache_dir = Path.home() / '.pytr'
-price_cache = json.loads((cache_dir / 'price_cache.json').read_text()) if (cache_dir / 'price_cache.json').exists() else {}
 tx_cache = json.loads((cache_dir / 'transactions_cache.json').read_text()) if (cache_dir / 'transactions_cache.json').exists() else []
 
 # Handle both list and dict formats
@@ -59,7 +60,7 @@ for isin, data in holdings.items():
     shares = data['shares']
     name = data['name'][:38]
     
-    isin_prices = price_cache.get(isin, {})
+    isin_prices = get_isin_prices(isin)
     price = isin_prices.get(target_str)
     
     if price is None:
@@ -25,6 +25,11 @@ from components.settings_modal import (
 from components.rule_builder import register_rule_builder_callbacks
 from components.auth import login_modal, user_store, register_auth_callbacks
 from components.i18n import t, get_lang
+from components.benchmark_data import initialize_benchmarks
+from components.portfolio_history import initialize_fx_rates
+from pages.backtesting_sim import warm_up_assets
+from core import datasets
+from core.btc_history import load_btc_history
 
 print("STARTING APP")
 
@@ -344,6 +349,33 @@ rc6(app)  # Bank Account Sync callbacks
 # Expose WSGI server for gunicorn (gunicorn main:server)
 server = app.server
 
+
+# Warm-up: with `gunicorn --preload` this runs once in the master, so the
+# workers share the parsed datasets copy-on-write. No network here.
+def warm_up():
+    datasets.get_btc_preprocessed()
+    load_btc_history(update=False)
+    n_assets = warm_up_assets()
+    initialize_benchmarks(fetch=False)
+    print(f"Warm-up: BTC frame, {n_assets} asset frames, benchmark cache loaded")
+    datasets.freeze()
+
+
+warm_up()
+
+# Network activity (benchmark pre-fetch, FX snapshot) starts after fork, once per worker
+# process — threads started in the master would not survive the fork.
+_background_pid = None
+
+
+@server.before_request
+def _start_background_tasks():
+    global _background_pid
+    if _background_pid != os.getpid():
+        _background_pid = os.getpid()
+        initialize_benchmarks()
+        initialize_fx_rates()
+
 # Run
 if __name__ == '__main__':
     debug = os.environ.get("DASH_DEBUG", "1") == "1"
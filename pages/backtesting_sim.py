@@ -7,12 +7,18 @@ import plotly.graph_objs as go
 from dash.exceptions import PreventUpdate
 import ta
 import os
+import warnings
 from core.utils import *
-import yfinance as yf
 
 from pathlib import Path
 from core.conf import *
 from components.i18n import t, get_lang
+from components.market_data import get_provider
+from components.shared_cache import cache_get, cache_set
+from core.datasets import get_btc_preprocessed, read_frame
+from core.btc_history import BTC_RAW_CSV, load_btc_history
+from core.onchain_store import ONCHAIN_DIR, load_onchain_indicators
+from core.prediction import add_model_predictions
 
 from components.gpt_functionality import context_description
 
@@ -133,108 +139,44 @@ _POPULAR_ASSETS = [
 ]
 
 # Function to fetch historical data for Bitcoin
-def convert_volume(value):
-    if isinstance(value, str):
-        value = value.replace(',', '').upper()  # Remove commas and standardize to uppercase
-        if 'K' in value:
-            return float(value.replace('K', '')) * 1e3
-        elif 'M' in value:
-            return float(value.replace('M', '')) * 1e6
-        elif 'B' in value:
-            return float(value.replace('B', '')) * 1e9
-    return pd.to_numeric(value, errors='coerce')  # Convert safely if the value is numeric
-    
-def fetch_historical_data(csv_file_path):
-    # Load data from CSV
-    btc_data_raw = pd.read_csv(csv_file_path, parse_dates=['Date'], index_col='Date', dtype={'Vol.': str})
-    btc_data_raw.sort_index(inplace=True)
-
-    # Clean up numeric columns in btc_data_raw (remove commas and convert to float)
-    btc_data_raw['Price'] = btc_data_raw['Price'].str.replace(',', '').astype(float)
-    btc_data_raw['Open'] = btc_data_raw['Open'].str.replace(',', '').astype(float)
-    btc_data_raw['High'] = btc_data_raw['High'].str.replace(',', '').astype(float)
-    btc_data_raw['Low'] = btc_data_raw['Low'].str.replace(',', '').astype(float)
-    btc_data_raw['Vol.'] = btc_data_raw['Vol.'].apply(convert_volume)
-    
-    # Convert 'Change %' to numeric by removing '%' and converting to float
-    btc_data_raw['Change %'] = btc_data_raw['Change %'].str.replace('%', '').astype(float)
-
-    # Download recent data from Yahoo Finance
-    btc_data_yahoo = yf.download('BTC-USD', start=btc_data_raw.index[-1] + pd.to_timedelta(1, unit='D'), progress=False)
-
-    # If Yahoo data is empty, just use the CSV data
-    if btc_data_yahoo.empty:
-        return btc_data_raw
-
-    # Adjust Yahoo data to match your CSV format
-    btc_data_yahoo.reset_index(inplace=True)
-    btc_data_yahoo.rename(columns={
-        'Date': 'Date',
-        'Adj Close': 'Price',
-        'Open': 'Open',
-        'High': 'High',
-        'Low': 'Low',
-        'Volume': 'Vol.'
-    }, inplace=True)
-
-    btc_data_yahoo.set_index('Date', inplace=True)
-
-    # Remove unnecessary columns and ensure consistency with historical data
-    btc_data_yahoo = btc_data_yahoo[['Price', 'Open', 'High', 'Low', 'Vol.']]
-
-    # Convert Yahoo data columns to appropriate types
-    btc_data_yahoo['Price'] = btc_data_yahoo['Price'].astype(float)
-    btc_data_yahoo['Open'] = btc_data_yahoo['Open'].astype(float)
-    btc_data_yahoo['High'] = btc_data_yahoo['High'].astype(float)
-    btc_data_yahoo['Low'] = btc_data_yahoo['Low'].astype(float)
-    btc_data_yahoo['Vol.'] = btc_data_yahoo['Vol.'].astype(float)
-
-    # Concatenate the historical and Yahoo data
-    btc_data_combined = pd.concat([btc_data_raw, btc_data_yahoo])
-
-    # Sort the index to maintain chronological order
-    btc_data_combined.sort_index(inplace=True)
-
-    # Rename 'Vol.' to 'volume' for consistency
-    btc_data_combined.rename(columns={'Vol.': 'volume'}, inplace=True)
-
-    # Fill missing values if there are any gaps
-    btc_data_combined.ffill(inplace=True)
-
-    return btc_data_combined
-
-def fetch_onchain_indicators(csv_file_path):
-    base_dir = Path(csv_file_path)
-    data_frames = []
+def fetch_historical_data(csv_file_path=BTC_RAW_CSV):
+    # Parsed once into a binary file, then only new provider rows are appended
+    # (see core.btc_history)
+    btc_data = load_btc_history(csv_file_path)
+    if btc_data is None:
+        return pd.DataFrame()
+    return btc_data
 
-    for file_path in base_dir.rglob('*.csv'):
-        if file_path.name == 'price.csv' or file_path.name == '30d_sma.csv' or file_path.name == '365d_sma.csv':
-            continue  # Skip these files
-        column_name = '__'.join(file_path.relative_to(base_dir).with_suffix('').parts[1:])
-        df = pd.read_csv(file_path, parse_dates=['date'])
-        df.set_index('date', inplace=True)
-        df.columns = [column_name]
-        data_frames.append(df)
+def fetch_onchain_indicators(csv_file_path=ONCHAIN_DIR):
+    # Merged once into a columnar store; only changed CSVs are re-read
+    # (see core.onchain_store)
+    return load_onchain_indicators(csv_file_path)
 
-    full_df = pd.concat(data_frames, axis=1)
-    return full_df
+_OSCILLATOR_QUANTILES = {
+    '1st_quantile_oscillators': 0.01,
+    '4th_quantile_oscillators': 0.25,
+    '50th_quantile_oscillators': 0.5,
+    '96th_quantile_oscillators': 0.96,
+    '99th_quantile_oscillators': 0.99,
+}
 
 def add_oscillators_quantiles(btc_data):
     # Filter columns with "oscillator" in the name
     oscillator_columns = btc_data.filter(like='oscillator')
 
     # Normalize these columns to range 0:1
-    normalized_oscillators = oscillator_columns.apply(lambda x: (x - x.min()) / (x.max() - x.min()))
-    # plt.figure(figsize=(10, 8))
-    # sns.heatmap(normalized_oscillators, cmap="YlGnBu", cbar_kws={'label': 'Normalized Value'})
-    # plt.show()
-
-    # Calculate new columns as specified quantiles
-    btc_data['1st_quantile_oscillators'] = normalized_oscillators.quantile(0.01, axis=1)
-    btc_data['4th_quantile_oscillators'] = normalized_oscillators.quantile(0.25, axis=1)
-    btc_data['50th_quantile_oscillators'] = normalized_oscillators.quantile(0.5, axis=1)
-    btc_data['96th_quantile_oscillators'] = normalized_oscillators.quantile(0.96, axis=1)
-    btc_data['99th_quantile_oscillators'] = normalized_oscillators.quantile(0.99, axis=1)
+    normalized_oscillators = (oscillator_columns - oscillator_columns.min()) / (oscillator_columns.max() - oscillator_columns.min())
+
+    # Cross-sectional quantiles for all rows at once (NaNs ignored, like DataFrame.quantile)
+    block = normalized_oscillators.to_numpy(dtype=float)
+    if block.shape[1] == 0:
+        quantiles = np.full((len(_OSCILLATOR_QUANTILES), len(btc_data)), np.nan)
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows -> NaN
+            quantiles = np.nanquantile(block, list(_OSCILLATOR_QUANTILES.values()), axis=1)
+    for name, row in zip(_OSCILLATOR_QUANTILES, quantiles):
+        btc_data[name] = row
 
     return btc_data
 
@@ -656,6 +598,28 @@ def layout(lang="en"):
 
 _asset_cache: dict = {}                    # {ticker: DataFrame}
 _ASSET_CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "asset_cache"
+_ASSET_SHARED_MAX_AGE = 6 * 3600           # seconds a worker trusts another worker's download
+
+
+def _asset_csv_path(asset_ticker):
+    safe_name = asset_ticker.replace("^", "_").replace("/", "_")
+    return _ASSET_CACHE_DIR / f"{safe_name}.csv"
+
+
+def warm_up_assets():
+    """Parse the local CSV cache of the popular assets (no network).
+
+    Run before gunicorn forks so workers share the parsed frames; the Yahoo
+    delta is still fetched on first use inside each worker.
+    """
+    loaded = 0
+    for asset in _POPULAR_ASSETS:
+        try:
+            if read_frame(_asset_csv_path(asset['value'])) is not None:
+                loaded += 1
+        except Exception as e:
+            print(f"[{asset['value']}] warm-up read failed: {e}")
+    return loaded
 
 def _download_asset(asset_ticker):
     """Download price data for *any* ticker via yfinance.
@@ -664,7 +628,10 @@ def _download_asset(asset_ticker):
 
     Caching hierarchy:
       1. In-memory dict (_asset_cache) — instant, per-session.
-      2. Local CSV file (data/asset_cache/<TICKER>.csv) — persistent across restarts.
+      1b. Shared cross-worker cache — a frame another gunicorn worker
+         already downloaded and cleaned in the last few hours.
+      2. Local CSV file (data/asset_cache/<TICKER>.csv) — persistent across restarts,
+         parsed once per file version (pre-fork for popular assets).
          On subsequent calls only the *delta* (new rows since last saved date)
          is fetched from Yahoo Finance and appended to the local file.
     """
@@ -672,33 +639,29 @@ def _download_asset(asset_ticker):
     if asset_ticker in _asset_cache:
         return _asset_cache[asset_ticker].copy()
 
+    shared = cache_get("asset", asset_ticker, max_age=_ASSET_SHARED_MAX_AGE)
+    if shared is not None:
+        _asset_cache[asset_ticker] = shared
+        return shared.copy()
+
     # --- Try loading from local CSV first ---
     _ASSET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    safe_name = asset_ticker.replace("^", "_").replace("/", "_")
-    csv_path = _ASSET_CACHE_DIR / f"{safe_name}.csv"
+    csv_path = _asset_csv_path(asset_ticker)
 
     local_df = None
     if csv_path.exists():
         try:
-            local_df = pd.read_csv(csv_path, parse_dates=["Date"], index_col="Date")
+            # Copy: the parsed frame is shared read-only (see core.datasets)
+            local_df = read_frame(csv_path).copy()
             local_df.sort_index(inplace=True)
             # Fetch only the delta — rows after the last date we already have
             last_date = local_df.index[-1]
             delta_start = (last_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
             try:
-                delta = yf.download(asset_ticker, start=delta_start, progress=False)
+                delta = get_provider().history(asset_ticker, start=delta_start)
             except Exception:
                 delta = None
             if delta is not None and not delta.empty:
-                if isinstance(delta.columns, pd.MultiIndex):
-                    delta.columns = [c[0] for c in delta.columns]
-                if 'Date' in delta.columns:
-                    delta['Date'] = pd.to_datetime(delta['Date'])
-                    delta.set_index('Date', inplace=True)
-                elif not isinstance(delta.index, pd.DatetimeIndex):
-                    delta.index = pd.to_datetime(delta.index)
-                if hasattr(delta.index, 'tz') and delta.index.tz is not None:
-                    delta.index = delta.index.tz_localize(None)
                 delta.columns = delta.columns.str.lower()
                 if not delta.empty:
                     local_df = pd.concat([local_df, delta])
@@ -715,7 +678,8 @@ def _download_asset(asset_ticker):
     # --- Full download if no local cache ---
     if local_df is None:
         try:
-            yf_data = yf.download(asset_ticker, period="max", progress=False)
+            # Provider returns a sorted, tz-naive, flat-column frame
+            yf_data = get_provider().history(asset_ticker, period="max")
         except Exception as e:
             print(f"yfinance download error for {asset_ticker}: {e}")
             return None
@@ -723,21 +687,6 @@ def _download_asset(asset_ticker):
             print(f"No data returned for {asset_ticker}")
             return None
 
-        # Flatten MultiIndex columns (yfinance >= 0.2)
-        if isinstance(yf_data.columns, pd.MultiIndex):
-            yf_data.columns = [c[0] for c in yf_data.columns]
-
-        # Ensure DatetimeIndex
-        if 'Date' in yf_data.columns:
-            yf_data['Date'] = pd.to_datetime(yf_data['Date'])
-            yf_data.set_index('Date', inplace=True)
-        elif not isinstance(yf_data.index, pd.DatetimeIndex):
-            yf_data.index = pd.to_datetime(yf_data.index)
-
-        # Strip timezone info (some tickers return tz-aware dates)
-        if hasattr(yf_data.index, 'tz') and yf_data.index.tz is not None:
-            yf_data.index = yf_data.index.tz_localize(None)
-
         yf_data.columns = yf_data.columns.str.lower()
         yf_data.sort_index(inplace=True)
         yf_data = yf_data[~yf_data.index.duplicated(keep='last')]
@@ -778,6 +727,7 @@ def _download_asset(asset_ticker):
           f"price {yf_data['price'].iloc[0]:.2f} → {yf_data['price'].iloc[-1]:.2f}")
 
     _asset_cache[asset_ticker] = yf_data.copy()
+    cache_set("asset", asset_ticker, yf_data)
     return yf_data
 
 
@@ -791,13 +741,13 @@ def _load_asset_data(asset_ticker):
         if not os.path.exists(PREPROC_FILENAME) or PREPROC_OVERWRITE:
             print("Reloading all historical BTC data.")
             try:
-                data = fetch_historical_data('./btc_hist_prices.csv')
+                data = fetch_historical_data()
                 if data.empty:
                     raise ValueError("BTC CSV is empty.")
                 data.columns = data.columns.str.lower()
                 data = add_historical_indicators(data, is_btc=True)
                 try:
-                    onchain = fetch_onchain_indicators('./indicators')
+                    onchain = fetch_onchain_indicators()
                     if not onchain.empty:
                         onchain.columns = onchain.columns.str.lower()
                         data = data.join(onchain, how='left')
@@ -809,8 +759,9 @@ def _load_asset_data(asset_ticker):
                 print(f"Error loading BTC data: {e}")
                 return None
         else:
-            data = pd.read_csv(PREPROC_FILENAME, parse_dates=['Date'], index_col='Date')
-        return data
+            data = get_btc_preprocessed().copy()
+        # model_pred / model_pred_return for rules (no-op without a trained model)
+        return add_model_predictions(data)
     else:
         yf_data = _download_asset(asset_ticker)
         if yf_data is None:
@@ -902,12 +853,12 @@ def register_callbacks(app):
         # _load_asset_data runs add_historical_indicators which is slow
         # and only needed when the user clicks "Run Backtest".
         is_btc = ticker.upper() in ("BTC-USD", "BTC")
+        data = None
         if is_btc:
-            if os.path.exists(PREPROC_FILENAME):
-                data = pd.read_csv(PREPROC_FILENAME, parse_dates=['Date'], index_col='Date')
-            else:
-                data = _download_asset(ticker)
-        else:
+            data = load_btc_history()
+            if data is not None:
+                data.columns = data.columns.str.lower()
+        if data is None:
             data = _download_asset(ticker)
         if data is None or data.empty or 'price' not in data.columns:
             return ticker, _error_fig(t("bt.no_data_error", lang).format(ticker=ticker))
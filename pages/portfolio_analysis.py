@@ -21,11 +21,9 @@ from collections import OrderedDict
 # Import the TR connector component
 from components.tr_connector import create_tr_connector_card, register_tr_callbacks
 from components.tr_api import fetch_all_data, is_connected, reconnect, drop_connection
-from components.benchmark_data import get_benchmark_data, initialize_benchmarks, BENCHMARKS
+from components.benchmark_data import get_benchmark_data, BENCHMARKS
 from components.i18n import t, get_lang
-
-# Initialize benchmark cache on module load
-initialize_benchmarks()
+from components.shared_cache import cache_get, cache_set
 
 # ── Demo account data ────────────────────────────────────────────────
 _DEMO_JSON_PATH = Path(__file__).resolve().parent.parent / "data" / "demo_portfolio.json"
@@ -43,7 +41,8 @@ _TF_IDS  = ["tf-1w", "tf-1m", "tf-ytd", "tf-1y", "tf-3y", "tf-5y", "tf-max"]
 _TF_VALS = ["1W",    "1M",    "YTD",    "1Y",    "3Y",    "5Y",    "MAX"]
 
 
-# Small in-memory cache to avoid re-building identical figures on page refresh.
+# Small in-memory cache to avoid re-building identical figures on page refresh,
+# backed by the shared cache so all gunicorn workers reuse each other's builds.
 # Keyed by (cached_at, chart_type, range, benchmarks, include_benchmarks).
 _FIG_CACHE: "OrderedDict[str, dict]" = OrderedDict()
 _FIG_CACHE_MAX = 24
@@ -54,7 +53,13 @@ def _fig_cache_get(key: str):
     try:
         fig_dict = _FIG_CACHE.get(key)
         if fig_dict is None:
-            return None
+            # Another worker may have built the same figure
+            fig_dict = cache_get("figure", key)
+            if fig_dict is None:
+                return None
+            _FIG_CACHE[key] = fig_dict
+            while len(_FIG_CACHE) > _FIG_CACHE_MAX:
+                _FIG_CACHE.popitem(last=False)
         _FIG_CACHE.move_to_end(key)
         return fig_dict
     except Exception:
@@ -67,6 +72,7 @@ def _fig_cache_set(key: str, fig_dict: dict):
         _FIG_CACHE.move_to_end(key)
         while len(_FIG_CACHE) > _FIG_CACHE_MAX:
             _FIG_CACHE.popitem(last=False)
+        cache_set("figure", key, fig_dict, max_entries=_FIG_CACHE_MAX)
     except Exception:
         pass
 
@@ -1646,7 +1652,7 @@ def register_callbacks(app):
         
         return history
     
-    def build_portfolio_chart(data_json, chart_type, selected_range, benchmarks, pathname, include_benchmarks, asset_class=None, use_deposits=False, lang="en"):
+    def build_portfolio_chart(data_json, chart_type, selected_range, benchmarks, pathname, include_benchmarks, asset_class=None, use_deposits=False, lang="en", user_id=None):
         # Only render chart on /compare page
         if not pathname or pathname != "/compare":
             return go.Figure()  # Return empty figure instead of raising exception
@@ -1685,7 +1691,10 @@ def register_callbacks(app):
             cached_at = data.get("cached_at") or ""
             # Include asset filter in cache key
             asset_filter_str = ",".join(sorted(selected_classes)) if selected_classes else "all"
+            # The figure cache is shared by all workers: key it by user and language too
             cache_key = "|".join([
+                str(user_id or "_anonymous"),
+                str(lang),
                 str(cached_at),
                 str(chart_type),
                 str(selected_range),
@@ -2120,10 +2129,11 @@ def register_callbacks(app):
          Input("benchmark-selector", "value"),
          Input("asset-class-filter", "value")],
         [State("url", "pathname"),
-         State("lang-store", "data")],
+         State("lang-store", "data"),
+         State("current-user-store", "data")],
         prevent_initial_call=False
     )
-    def update_chart(data_json, chart_type, selected_range, benchmarks, asset_class, pathname, lang_data):
+    def update_chart(data_json, chart_type, selected_range, benchmarks, asset_class, pathname, lang_data, current_user):
         lang = get_lang(lang_data)
         # Use deposits for benchmark simulation if "cash" is included in asset filter
         use_deposits = "cash" in (asset_class or [])
@@ -2137,6 +2147,7 @@ def register_callbacks(app):
             asset_class=asset_class,
             use_deposits=use_deposits,
             lang=lang,
+            user_id=current_user,
         )
 
     # Performance chart (benchmarks only here)
@@ -2147,10 +2158,11 @@ def register_callbacks(app):
          Input("benchmark-selector", "value"),
          Input("asset-class-filter", "value")],
         [State("url", "pathname"),
-         State("lang-store", "data")],
+         State("lang-store", "data"),
+         State("current-user-store", "data")],
         prevent_initial_call=False
     )
-    def update_performance_chart(data_json, selected_range, benchmarks, asset_class, pathname, lang_data):
+    def update_performance_chart(data_json, selected_range, benchmarks, asset_class, pathname, lang_data, current_user):
         lang = get_lang(lang_data)
         # Use deposits for benchmark simulation if "cash" is included in asset filter
         use_deposits = "cash" in (asset_class or [])
@@ -2164,6 +2176,7 @@ def register_callbacks(app):
             asset_class=asset_class,
             use_deposits=use_deposits,
             lang=lang,
+            user_id=current_user,
         )
 
     # Privacy mode toggle (clientside so it reacts instantly)
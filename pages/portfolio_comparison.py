@@ -11,7 +11,7 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import yfinance as yf
+from components.market_data import get_provider
 import json
 
 # Import the TR connector component
@@ -66,8 +66,7 @@ def get_ticker_for_isin(isin):
 def fetch_index_data(symbol, start_date, end_date):
     """Fetch historical data for a market index."""
     try:
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(start=start_date, end=end_date)
+        df = get_provider().history(symbol, start=start_date, end=end_date)
         if len(df) > 0:
             df = df.reset_index()
             df = df.rename(columns={"Close": symbol})
@@ -84,16 +83,14 @@ def fetch_position_history(isin, name, start_date, end_date):
     if not ticker:
         # Try searching by name
         try:
-            search = yf.Ticker(name.split()[0])
-            if search.info:
+            if get_provider().metadata(name.split()[0]):
                 ticker = name.split()[0]
         except:
             pass
     
     if ticker:
         try:
-            t = yf.Ticker(ticker)
-            df = t.history(start=start_date, end=end_date)
+            df = get_provider().history(ticker, start=start_date, end=end_date)
             if len(df) > 0:
                 df = df.reset_index()
                 return df[["Date", "Close"]], ticker
@@ -4,7 +4,7 @@ from dash.dependencies import Input, Output, State
 import pandas as pd
 import plotly.graph_objs as go
 from dash.exceptions import PreventUpdate
-import yfinance as yf
+from components.market_data import get_provider
 import traceback
 from components.i18n import t, get_lang
 
@@ -14,8 +14,7 @@ from components.i18n import t, get_lang
 def simulate_portfolio(current_value, annual_growth_rate, withdrawal_type, annual_withdrawal,
                        years_to_simulate, tax_rate=0.25, tax_method='FIFO', sp500_start_year=None):
     if sp500_start_year:
-        sp500 = yf.Ticker("^GSPC")
-        sp500_data = sp500.history(start=f"{sp500_start_year}-01-01")
+        sp500_data = get_provider().history("^GSPC", start=f"{sp500_start_year}-01-01")
         annual_returns = sp500_data['Close'].resample('YE').last().pct_change().dropna()
         years_to_simulate = len(annual_returns)
 
@@ -0,0 +1,24 @@
+"""align_prices keeps interpolate_prices' forward-fill semantics."""
+
+import numpy as np
+
+from components.portfolio_history import align_prices, interpolate_prices
+
+
+def test_align_prices_forward_fills_from_target_dates():
+    known = {
+        "A": {"2024-01-02": 10.0, "2024-01-05": 12.0, "2024-01-06": 99.0},
+        "B": {"2023-12-30": 5.0, "2024-01-04": 6.0},
+    }
+    targets = ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"]
+    aligned = align_prices(known, targets, ["A", "B", "C"])
+
+    assert list(aligned.index) == targets
+    np.testing.assert_array_equal(aligned["A"].to_numpy(), [np.nan, 10.0, 10.0, 10.0, 12.0])
+    # B's 2023-12-30 price is not a target date, so it is not carried forward
+    np.testing.assert_array_equal(aligned["B"].to_numpy(), [np.nan, np.nan, np.nan, 6.0, 6.0])
+    assert aligned["C"].isna().all()
+
+    assert interpolate_prices(known["A"], targets) == {
+        "2024-01-02": 10.0, "2024-01-03": 10.0, "2024-01-04": 10.0, "2024-01-05": 12.0,
+    }
@@ -0,0 +1,68 @@
+"""Unit tests for the compiled BTC history (parsing and provider join)."""
+
+import pandas as pd
+
+from core.btc_history import COLUMNS, join_delta, parse_investing_csv
+
+
+def _write_export(path):
+    path.write_text(
+        '﻿"Date","Price","Open","High","Low","Vol.","Change %"\n'
+        '"01/03/2024","42,836.1","44,946.0","45,503.2","40,813.5","1.02M","-4.69%"\n'
+        '"01/02/2024","44,946.0","44,183.2","45,899.7","44,176.9","98.56K","1.73%"\n'
+        '"01/01/2024","44,183.2","42,272.5","44,187.1","42,196.7","35.08K","4.52%"\n',
+        encoding="utf-8",
+    )
+
+
+def test_parse_investing_csv(tmp_path):
+    csv = tmp_path / "btc.csv"
+    _write_export(csv)
+    df = parse_investing_csv(csv)
+
+    assert list(df.columns) == COLUMNS
+    assert df.index.is_monotonic_increasing
+    assert df.loc["2024-01-03", "Price"] == 42836.1
+    assert df.loc["2024-01-03", "volume"] == 1.02e6
+    assert df.loc["2024-01-02", "volume"] == 98560.0
+    assert df.loc["2024-01-03", "Change %"] == -4.69
+
+
+def test_join_delta_checks_continuity(tmp_path):
+    csv = tmp_path / "btc.csv"
+    _write_export(csv)
+    history = parse_investing_csv(csv)
+
+    dates = pd.to_datetime(["2024-01-03", "2024-01-04"])
+    delta = pd.DataFrame({
+        "Price": [42900.0, 44000.0], "Open": [1.0, 1.0], "High": [1.0, 1.0],
+        "Low": [1.0, 1.0], "volume": [1.0, 1.0],
+    }, index=dates)
+
+    joined = join_delta(history, delta)
+    assert len(joined) == 4
+    assert joined.index[-1] == pd.Timestamp("2024-01-04")
+    assert round(joined["Change %"].iloc[-1], 2) == round((44000.0 / 42836.1 - 1) * 100, 2)
+
+    # Provider disagrees with the stored close on the join day -> rejected
+    delta["Price"] = [60000.0, 61000.0]
+    assert len(join_delta(history, delta)) == 3
+
+
+def test_join_delta_checks_last_common_day(tmp_path):
+    csv = tmp_path / "btc.csv"
+    _write_export(csv)
+    history = parse_investing_csv(csv)
+
+    # The provider has no row for the join day (01-03), but has 01-02
+    dates = pd.to_datetime(["2024-01-02", "2024-01-04"])
+    delta = pd.DataFrame({
+        "Price": [60000.0, 61000.0], "Open": [1.0, 1.0], "High": [1.0, 1.0],
+        "Low": [1.0, 1.0], "volume": [1.0, 1.0],
+    }, index=dates)
+    assert len(join_delta(history, delta)) == 3
+
+    # No common day at all: the first new price must continue ours
+    assert len(join_delta(history, delta.iloc[1:])) == 3
+    delta["Price"] = [44946.0, 43500.0]
+    assert len(join_delta(history, delta.iloc[1:])) == 4
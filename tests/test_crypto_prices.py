@@ -0,0 +1,82 @@
+"""Batched CoinGecko quotes and crypto history kept in the price store."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import components.portfolio_history as ph
+import components.price_store as price_store
+import components.shared_cache as shared_cache
+from components.market_data import CoinGeckoProvider, ThrottledProvider, set_provider
+
+BTC, ETH = "XF000BTC0017", "XF000ETH0019"
+
+
+class _CoinGecko(CoinGeckoProvider):
+    def __init__(self, listed_days=None):
+        self.requests = []
+        self.listed_days = listed_days
+
+    def _get(self, path, params, timeout):
+        self.requests.append((path, params))
+        if path == "/simple/price":
+            return {coin: {"eur": 100.0 + i} for i, coin in enumerate(params["ids"].split(","))}
+        days = params["days"]
+        if self.listed_days is not None:
+            days = min(days, self.listed_days)
+        now = datetime.now()
+        return {"prices": [[(now - timedelta(days=d)).timestamp() * 1000, 1000.0 - d] for d in range(days, -1, -1)]}
+
+
+@pytest.fixture
+def coingecko(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, "PRICE_DB_FILE", tmp_path / "prices.sqlite")
+    monkeypatch.setattr(price_store, "LEGACY_JSON_FILE", tmp_path / "price_cache.json")
+    monkeypatch.setattr(price_store, "_schema_ready_pid", None)
+    monkeypatch.setattr(price_store, "_prices", {})
+    monkeypatch.setattr(price_store, "_pending", {})
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_FILE", tmp_path / "shared.sqlite")
+    monkeypatch.setattr(shared_cache, "_schema_ready_pid", None)
+    provider = _CoinGecko()
+    set_provider(ThrottledProvider(provider), kind="crypto")
+    yield provider
+    set_provider(None, kind="crypto")
+
+
+def test_quotes_for_all_coins_in_one_request(coingecko):
+    quotes = ph.get_crypto_quotes_eur([BTC, ETH, "DE0005140008"])
+    assert set(quotes) == {BTC, ETH}
+    assert len(coingecko.requests) == 1
+    assert set(coingecko.requests[0][1]["ids"].split(",")) == {"bitcoin", "ethereum"}
+
+
+def test_history_is_stored_and_only_new_days_fetched(coingecko):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [today - timedelta(days=d) for d in (30, 10, 1)]
+
+    prices = ph.get_crypto_prices_coingecko(BTC, dates)
+    assert len(prices) == 3 and len(coingecko.requests) == 1
+    # The whole daily series was stored, today excluded
+    stored = price_store.get_isin_prices(BTC)
+    assert len(stored) >= 30 and today.strftime("%Y-%m-%d") not in stored
+
+    # Covered dates come from the store; today is the live quote
+    coingecko.requests.clear()
+    prices = ph.get_crypto_prices_coingecko(BTC, dates + [today], quote=123.0)
+    assert coingecko.requests == []
+    assert prices[today.strftime("%Y-%m-%d")] == 123.0
+
+
+def test_days_before_the_listing_are_not_refetched(coingecko):
+    coingecko.listed_days = 10
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [today - timedelta(days=d) for d in range(30, 0, -1)]
+
+    prices = ph.get_crypto_prices_coingecko(BTC, dates)
+    assert len(coingecko.requests) == 1
+    assert min(prices) == (today - timedelta(days=10)).strftime("%Y-%m-%d")
+
+    # CoinGecko has nothing before the listing: no second request for it
+    coingecko.requests.clear()
+    assert ph.get_crypto_prices_coingecko(BTC, dates) == prices
+    assert coingecko.requests == []
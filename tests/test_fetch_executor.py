@@ -0,0 +1,55 @@
+"""Unit tests for the concurrent, rate-limited fetch executor."""
+
+import time
+
+import components.fetch_executor as fx
+
+
+def test_fetch_concurrently_overlaps_calls():
+    start = time.perf_counter()
+    results = dict(fx.fetch_concurrently(range(8), lambda i: time.sleep(0.2) or i * i, max_workers=8))
+    assert results == {i: i * i for i in range(8)}
+    assert time.perf_counter() - start < 1.0
+
+
+def test_token_bucket_limits_rate():
+    bucket = fx.TokenBucket(rate=20, burst=2)
+    start = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+    # 2 from the burst, 4 more at 20/s
+    assert time.perf_counter() - start >= 0.18
+
+
+def test_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(fx, "RETRY_BASE_DELAY", 0.001)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise fx.RateLimited("429")
+        return "ok"
+
+    assert fx.call_with_retries(flaky) == "ok"
+    assert len(calls) == 3
+
+
+def test_rate_limit_halves_budget_until_calls_succeed(monkeypatch):
+    monkeypatch.setattr(fx, "RETRY_BASE_DELAY", 0.001)
+    bucket = fx.TokenBucket(rate=100, burst=5)
+    monkeypatch.setitem(fx._buckets, "fake", bucket)
+    monkeypatch.setitem(fx.RATE_LIMITS, "fake", (100, 5))
+    calls = []
+
+    def limited():
+        calls.append(1)
+        if len(calls) < 3:
+            raise fx.RateLimited("429")
+        return "ok"
+
+    assert fx.call_with_retries(limited, provider="fake") == "ok"
+    assert bucket.rate == 25 + 100 * fx.RATE_RECOVERY  # halved twice, one success back
+    for _ in range(100):
+        bucket.reward()
+    assert bucket.rate == 100
@@ -0,0 +1,166 @@
+"""Daily FX series and date-wise conversion of price matrices."""
+
+import pandas as pd
+import pytest
+
+import components.fx_store as fx_store
+from components.market_data import MarketDataError, MarketDataProvider, set_provider
+import components.portfolio_history as ph
+from components.portfolio_history import convert_to_eur
+
+
+class _FxProvider(MarketDataProvider):
+    name = "fake"
+
+    def __init__(self):
+        self.downloads = []
+
+    def history_many(self, symbols, start=None, end=None):
+        self.downloads.append(sorted(symbols))
+        index = pd.date_range("2024-01-01", "2024-01-05", freq="D")
+        closes = {
+            "EURUSD=X": [1.0, 1.25, 2.0, 1.6, 1.0],  # USD per EUR
+            "GBPEUR=X": [1.1, 1.2, 1.3, 1.4, 1.5],   # EUR per GBP
+        }
+        # Symbols without rates come back empty, as from a failed yf.download
+        return {s: pd.DataFrame({"Close": closes.get(s, [])}, index=index if s in closes else None) for s in symbols}
+
+    def history(self, symbol, start=None, end=None, period=None):
+        raise MarketDataError("not served")
+
+    def quote(self, symbol):
+        raise MarketDataError("not served")
+
+    def fx_rate(self, pair):
+        raise MarketDataError("not served")
+
+    def metadata(self, symbol):
+        return {}
+
+
+@pytest.fixture
+def provider(tmp_path, monkeypatch):
+    monkeypatch.setattr(fx_store, "FX_DB_FILE", tmp_path / "fx.sqlite")
+    monkeypatch.setattr(fx_store, "_schema_ready_pid", None)
+    monkeypatch.setattr(fx_store, "_series", {})
+    monkeypatch.setattr(fx_store, "_series_coverage", {})
+    monkeypatch.setattr(fx_store, "_failed_at", {})
+    provider = _FxProvider()
+    set_provider(provider)
+    yield provider
+    set_provider(None)
+
+
+def test_to_eur_uses_each_dates_rate(provider):
+    dates = ["2024-01-02", "2024-01-03", "2024-01-06"]  # the 6th has no rate: last one applies
+    prices = pd.DataFrame({"US1": [10.0, 10.0, 10.0], "GB1": [200.0, 200.0, 200.0], "DE1": [5.0, 6.0, 7.0]},
+                          index=dates)
+
+    converted = fx_store.to_eur(prices, {"US1": "USD", "GB1": "GBp"})
+
+    assert converted["US1"].tolist() == pytest.approx([8.0, 5.0, 10.0])
+    assert converted["GB1"].tolist() == pytest.approx([2.4, 2.6, 3.0])
+    assert converted["DE1"].tolist() == [5.0, 6.0, 7.0]
+    assert provider.downloads == [["EURUSD=X", "GBPEUR=X"]]
+
+    # Covered now: no second download
+    fx_store.to_eur(prices.iloc[:2], {"US1": "USD"})
+    assert len(provider.downloads) == 1
+
+
+def test_currency_without_rates_stays_uncovered(provider, monkeypatch):
+    fx_store.ensure_rates(["USD", "CHF"], "2024-01-02", "2024-01-05")
+    assert provider.downloads == [["CHFEUR=X", "EURUSD=X"]]
+    assert set(fx_store._coverage(["USD", "CHF"])) == {"USD"}
+
+    # Not asked for again right away...
+    fx_store.ensure_rates(["USD", "CHF"], "2024-01-02", "2024-01-05")
+    assert len(provider.downloads) == 1
+
+    # ...but once the retry delay is over
+    monkeypatch.setattr(fx_store, "FAILED_RETRY_AFTER", 0)
+    fx_store.ensure_rates(["USD", "CHF"], "2024-01-02", "2024-01-05")
+    assert provider.downloads[-1] == ["CHFEUR=X"]
+
+
+def test_coverage_stops_at_the_last_returned_rate():
+    # Rates up to Jan 5 cover a gap ending on Sunday the 7th, not one ending on the 20th
+    dates = ["2024-01-02", "2024-01-05"]
+    assert fx_store._covered_range(dates, ("2024-01-02", "2024-01-07"), None) == ("2024-01-02", "2024-01-07")
+    assert fx_store._covered_range(dates, ("2024-01-02", "2024-01-20"), None) == ("2024-01-02", "2024-01-05")
+    assert fx_store._covered_range(dates, ("2024-01-02", "2024-01-20"), ("2023-06-01", "2023-12-01")) is None
+
+
+def test_convert_to_eur_lookup():
+    rates = {"EURUSD": 1.25, "GBPEUR": 1.2}
+    assert convert_to_eur(10.0, "USD", rates) == pytest.approx(8.0)
+    assert convert_to_eur(200.0, "GBp", rates) == pytest.approx(2.4)
+    assert convert_to_eur(10.0, "EUR", rates) == 10.0
+    assert convert_to_eur(10.0, "XYZ", rates) == 10.0  # unknown: left as is
+
+
+def test_spot_keys_follow_the_daily_symbols():
+    # One currency table: spot conversion knows exactly the daily-series currencies
+    assert set(ph.FX_RATE_KEYS) == set(fx_store.FX_SYMBOLS)
+    assert set(ph.FX_FALLBACK_RATES) == set(ph.FX_RATE_KEYS.values())
+    for currency, (symbol, inverted) in fx_store.FX_SYMBOLS.items():
+        key = ph.FX_RATE_KEYS[currency]
+        assert symbol == f"{key}=X"
+        assert ph.eur_per_unit(currency, {key: 2.0}) == (0.5 if inverted else 2.0)
+
+
+class _SpotProvider(MarketDataProvider):
+    name = "fake"
+
+    def __init__(self, rates):
+        self.rates = rates
+        self.calls = 0
+
+    def fx_rates(self, pairs):
+        self.calls += 1
+        return {p: r for p, r in self.rates.items() if p in pairs}
+
+    def history(self, symbol, start=None, end=None, period=None):
+        raise MarketDataError("not served")
+
+    def quote(self, symbol):
+        raise MarketDataError("not served")
+
+    def fx_rate(self, pair):
+        raise MarketDataError("not served")
+
+    def metadata(self, symbol):
+        return {}
+
+
+@pytest.fixture
+def spot_snapshot(tmp_path, monkeypatch):
+    import components.portfolio_history as ph
+    import components.shared_cache as shared_cache
+    monkeypatch.setattr(shared_cache, "SHARED_CACHE_FILE", tmp_path / "shared.sqlite")
+    monkeypatch.setattr(shared_cache, "_schema_ready_pid", None)
+    monkeypatch.setattr(ph, "_fx_rates_cache", {})
+    monkeypatch.setattr(ph, "_fx_rates_timestamp", 0)
+    yield ph
+    set_provider(None)
+
+
+def test_spot_snapshot_serves_last_known_rates(spot_snapshot, monkeypatch):
+    ph = spot_snapshot
+    provider = _SpotProvider({"EURUSD": 1.2, "GBPEUR": 1.15})
+    set_provider(provider)
+    first = ph.get_fx_rates()  # no snapshot yet: fetched once, synchronously
+    assert first["EURUSD"] == 1.2 and first["JPYEUR"] == ph.FX_FALLBACK_RATES["JPYEUR"]
+
+    # A due snapshot is returned as is while a background refresh is started
+    refreshes = []
+    monkeypatch.setattr(ph, "refresh_fx_rates_async", lambda: refreshes.append(1))
+    monkeypatch.setattr(ph, "_fx_rates_timestamp", ph._fx_rates_timestamp - ph.FX_REFRESH_AFTER)
+    monkeypatch.setattr(ph, "cache_get_entry", lambda *a, **k: None)
+    assert ph.get_fx_rates() is first
+    assert refreshes == [1] and provider.calls == 1
+
+    # A refresh that misses a pair keeps its last known rate
+    provider.rates = {"EURUSD": 1.3}
+    rates = ph.refresh_fx_rates()
+    assert rates["EURUSD"] == 1.3 and rates["GBPEUR"] == 1.15
@@ -0,0 +1,39 @@
+"""The vectorized holdings engine matches the per-date summation it replaced."""
+
+import random
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from components.holdings_engine import holdings_matrix
+
+
+def _loop_holdings(changes, query_dates):
+    shares = np.zeros((len(query_dates), len(changes)))
+    invested = np.zeros_like(shares)
+    for i, day in enumerate(query_dates):
+        for j, isin_changes in enumerate(changes.values()):
+            for when, shares_change, cost_change in isin_changes:
+                if when.date() <= day:
+                    shares[i, j] += shares_change
+                    invested[i, j] += cost_change
+    return shares, invested
+
+
+def test_matches_loop():
+    rng = random.Random(7)
+    changes = {}
+    for isin in ("DE0001", "IE0002", "US0003", "LU0004"):
+        changes[isin] = [
+            (datetime(2021, 1, 1) + timedelta(days=rng.randint(0, 700), hours=rng.randint(0, 23)),
+             rng.choice([0.25, 0.5, 1.0, -0.5]), rng.choice([25.0, 50.0, -12.5]))
+            for _ in range(rng.randint(1, 60))
+        ]
+    query = [date(2020, 12, 1) + timedelta(days=d) for d in range(0, 800, 3)]
+
+    isins, shares, invested = holdings_matrix(changes, query)
+    ref_shares, ref_invested = _loop_holdings(changes, query)
+    assert isins == list(changes)
+    np.testing.assert_allclose(shares, ref_shares, atol=1e-9)
+    np.testing.assert_allclose(invested, ref_invested, atol=1e-9)
+    assert not shares[0].any()  # before the first transaction
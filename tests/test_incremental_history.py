@@ -0,0 +1,79 @@
+"""Extending a saved portfolio history gives the same result as rebuilding it."""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from components.portfolio_history import (
+    build_portfolio_history_from_transactions,
+    extend_portfolio_history_from_transactions,
+)
+
+ISINS = ("DE000A0F5UF5", "IE00B4L5Y983", "US0378331005")
+
+
+def _txn(day, isin, shares, price, sell=False):
+    return {
+        "timestamp": f"{day.isoformat()}T10:00:00.000+0000",
+        "subtitle": "Verkaufsorder" if sell else "Kauforder",
+        "icon": f"logos/{isin}/v2",
+        "title": isin,
+        "shares": shares,
+        "amount": round(shares * price, 2) * (1 if sell else -1),
+    }
+
+
+def _transactions(days_back, count, seed):
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    txns = []
+    for _ in range(count):
+        day = today - timedelta(days=rng.randint(*days_back))
+        txns.append(_txn(day, rng.choice(ISINS), rng.choice([1.0, 2.0, 0.5]), rng.uniform(20, 200)))
+    return sorted(txns, key=lambda t: t["timestamp"])
+
+
+def _full(txns):
+    return build_portfolio_history_from_transactions(txns, [], return_position_histories=True, return_state=True)
+
+
+def _assert_same(result, expected):
+    history, positions, state = result
+    exp_history, exp_positions, exp_state = expected
+    assert history == exp_history
+    assert {i: p["valueHistory"] for i, p in positions.items()} == \
+        {i: p["valueHistory"] for i, p in exp_positions.items()}
+    for key in ("holdings", "invested", "prices"):
+        assert state[key] == pytest.approx(exp_state[key])
+    assert state["digests"] == exp_state["digests"]
+
+
+def test_extend_with_new_transactions():
+    old = _transactions((30, 400), 40, seed=1)
+    saved = _full(old)
+    # Pretend the state was saved 20 days ago: the new transactions come after it
+    state = dict(saved[2], as_of=(datetime.now().date() - timedelta(days=20)).isoformat())
+    state["digests"] = {d: h for d, h in state["digests"].items() if d < state["as_of"]}
+    new = old + _transactions((0, 10), 5, seed=2)
+
+    result = extend_portfolio_history_from_transactions(new, [], saved[0], saved[1], state)
+    _assert_same(result, _full(new))
+
+
+def test_extend_after_backdated_change():
+    old = _transactions((30, 400), 40, seed=3)
+    saved = _full(old)
+    # A transaction inserted in the middle of the saved range
+    new = sorted(old + [_txn(datetime.now().date() - timedelta(days=100), ISINS[0], 3.0, 90.0)],
+                 key=lambda t: t["timestamp"])
+
+    result = extend_portfolio_history_from_transactions(new, [], saved[0], saved[1], saved[2])
+    _assert_same(result, _full(new))
+
+
+def test_new_first_transaction_needs_rebuild():
+    old = _transactions((30, 400), 10, seed=4)
+    saved = _full(old)
+    earlier = [_txn(datetime.now().date() - timedelta(days=500), ISINS[1], 1.0, 50.0)] + old
+    assert extend_portfolio_history_from_transactions(earlier, [], saved[0], saved[1], saved[2]) is None
@@ -0,0 +1,39 @@
+"""Instrument store: legacy symbol cache import, names and currencies."""
+
+import json
+
+import pytest
+
+import components.instrument_store as instrument_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrument_store, "INSTRUMENT_DB_FILE", tmp_path / "instruments.sqlite")
+    monkeypatch.setattr(instrument_store, "LEGACY_SYMBOL_FILE", tmp_path / "isin_symbol_cache.json")
+    monkeypatch.setattr(instrument_store, "_schema_ready_pid", None)
+    monkeypatch.setattr(instrument_store, "_loaded_pid", None)
+    return instrument_store
+
+
+def test_migrates_legacy_symbol_cache(store, tmp_path):
+    legacy = tmp_path / "isin_symbol_cache.json"
+    legacy.write_text(json.dumps({"IE00B5BMR087": "CSPX.L", "XF000BTC0017": None}), encoding="utf-8")
+
+    assert store.get("IE00B5BMR087")["symbol"] == "CSPX.L"
+    assert store.get("XF000BTC0017")["symbol_failed_at"] == 0.0  # retried once
+    assert not legacy.exists() and (tmp_path / "isin_symbol_cache.json.migrated").exists()
+
+
+def test_updates_survive_reload(store):
+    store.update("DE0007030009", name="Rheinmetall", type_id="STOCK")
+    store.update("DE0007030009", symbol="RHM.DE")
+    store.add_names({"Rheinmetall  AG": "DE0007030009"})
+    store.set_symbol_currency("RHM.DE", "EUR")
+
+    store._loaded_pid = None  # as in a fresh worker
+    entry = store.get("DE0007030009")
+    assert (entry["name"], entry["type_id"], entry["symbol"]) == ("Rheinmetall", "STOCK", "RHM.DE")
+    assert store.isin_for_name("rheinmetall ag") == "DE0007030009"
+    assert store.symbol_currency("RHM.DE") == "EUR"
+    assert store.get("US0000000000") is None
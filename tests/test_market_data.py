@@ -0,0 +1,68 @@
+"""Unit tests for the market-data record/replay backends."""
+
+import pandas as pd
+import pytest
+
+from components.market_data import (
+    FixtureStore, MarketDataError, MarketDataProvider, RecordingProvider, ReplayProvider,
+)
+
+
+class _StaticProvider(MarketDataProvider):
+    name = "static"
+
+    def __init__(self):
+        self.calls = 0
+
+    def history(self, symbol, start=None, end=None, period=None):
+        self.calls += 1
+        index = pd.date_range("2024-01-01", periods=10, name="Date")
+        df = pd.DataFrame({"Close": range(10)}, index=index, dtype=float)
+        if start is not None:
+            df = df[df.index >= pd.Timestamp(start)]
+        return df
+
+    def quote(self, symbol):
+        self.calls += 1
+        return 42.0
+
+    def metadata(self, symbol):
+        return {"currency": "USD"}
+
+    def fx_rate(self, pair):
+        raise MarketDataError("not served")
+
+
+def test_record_then_replay(tmp_path):
+    fixtures = FixtureStore(tmp_path)
+    live = _StaticProvider()
+    recorder = RecordingProvider(live, fixtures)
+
+    recorder.history("AAPL", start="2024-01-05")
+    recorder.history("AAPL")  # wider range is merged into the same fixture
+    assert recorder.quote("AAPL") == 42.0
+    assert recorder.metadata("AAPL") == {"currency": "USD"}
+
+    replay = ReplayProvider("static", fixtures)
+    assert len(replay.history("AAPL")) == 10
+    window = replay.history("AAPL", start="2024-01-03", end="2024-01-06")
+    assert list(window.index.day) == [3, 4, 5]
+    assert len(replay.history("AAPL", period="5d")) == 6
+    assert replay.quote("AAPL") == 42.0
+    assert replay.metadata("AAPL")["currency"] == "USD"
+
+
+def test_replay_miss_is_deterministic(tmp_path):
+    replay = ReplayProvider("static", FixtureStore(tmp_path))
+    assert replay.history("MSFT").empty
+    with pytest.raises(MarketDataError):
+        replay.quote("MSFT")
+
+
+def test_providers_must_implement_the_interface():
+    class _HistoryOnly(MarketDataProvider):
+        def history(self, symbol, start=None, end=None, period=None):
+            return pd.DataFrame()
+
+    with pytest.raises(TypeError):
+        _HistoryOnly()
@@ -0,0 +1,98 @@
+"""The incremental on-chain store and the oscillator quantiles built on it."""
+
+import numpy as np
+import pandas as pd
+
+import core.onchain_store as onchain_store
+from core.onchain_store import STORE_NAME, load_onchain_indicators
+
+
+def _write_series(path, values, start="2024-01-01"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    dates = pd.date_range(start, periods=len(values), freq="D")
+    pd.DataFrame({"date": dates.strftime("%Y-%m-%d"), "value": values}).to_csv(path, index=False)
+
+
+def _tree(tmp_path):
+    _write_series(tmp_path / "glassnode" / "market" / "mvrv.csv", [1.0, 2.0, 3.0])
+    _write_series(tmp_path / "glassnode" / "market" / "nupl.csv", [0.1, 0.2])
+    _write_series(tmp_path / "glassnode" / "market" / "price.csv", [9.0, 9.0])  # skipped
+    return tmp_path
+
+
+def _count_reads(monkeypatch):
+    reads = []
+    read_source = onchain_store._read_source
+
+    def counting(file_path, column):
+        reads.append(column)
+        return read_source(file_path, column)
+
+    monkeypatch.setattr(onchain_store, "_read_source", counting)
+    return reads
+
+
+def test_only_changed_sources_are_reread(tmp_path, monkeypatch):
+    base = _tree(tmp_path)
+    reads = _count_reads(monkeypatch)
+
+    df = load_onchain_indicators(base)
+    assert sorted(df.columns) == ["market__mvrv", "market__nupl"]
+    assert sorted(reads) == ["market__mvrv", "market__nupl"]
+    assert (base / STORE_NAME).exists()
+
+    # Unchanged tree: everything comes from the store
+    reads.clear()
+    pd.testing.assert_frame_equal(load_onchain_indicators(base), df, check_freq=False)
+    assert reads == []
+
+    # One file changed: only that one is read again
+    _write_series(base / "glassnode" / "market" / "nupl.csv", [0.5, 0.6, 0.7])
+    df = load_onchain_indicators(base)
+    assert reads == ["market__nupl"]
+    assert df["market__nupl"].tolist() == [0.5, 0.6, 0.7]
+    assert df["market__mvrv"].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_removed_sources_drop_their_columns(tmp_path):
+    base = _tree(tmp_path)
+    load_onchain_indicators(base)
+
+    (base / "glassnode" / "market" / "mvrv.csv").unlink()
+    df = load_onchain_indicators(base)
+    assert df.columns.tolist() == ["market__nupl"]
+    # Rows only the removed source had are gone too
+    assert len(df) == 2
+
+
+def test_unreadable_store_is_rebuilt(tmp_path, monkeypatch):
+    base = _tree(tmp_path)
+    expected = load_onchain_indicators(base)
+
+    (base / STORE_NAME).write_bytes(b"not an npz file")
+    reads = _count_reads(monkeypatch)
+    df = load_onchain_indicators(base)
+    assert sorted(reads) == ["market__mvrv", "market__nupl"]
+    pd.testing.assert_frame_equal(df, expected, check_freq=False)
+
+    reads.clear()
+    load_onchain_indicators(base)
+    assert reads == []
+    assert [p.name for p in base.iterdir() if p.suffix == ".tmp"] == []
+
+
+def test_oscillator_quantiles_match_dataframe_quantile():
+    from pages.backtesting_sim import _OSCILLATOR_QUANTILES, add_oscillators_quantiles
+
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(50, 4)), columns=[f"x_oscillator_{i}" for i in range(4)])
+    data.iloc[::7, 1] = np.nan
+    data.iloc[3, :] = np.nan  # a row without any oscillator value
+    data["price"] = 1.0
+
+    oscillators = data.filter(like="oscillator")
+    normalized = (oscillators - oscillators.min()) / (oscillators.max() - oscillators.min())
+    result = add_oscillators_quantiles(data.copy())
+    for name, q in _OSCILLATOR_QUANTILES.items():
+        expected = normalized.quantile(q, axis=1)
+        np.testing.assert_allclose(result[name].to_numpy(), expected.to_numpy(), equal_nan=True)
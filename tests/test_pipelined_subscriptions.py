@@ -0,0 +1,74 @@
+"""Fire-then-receive over the TR websocket, bounded by a window."""
+
+import asyncio
+import time
+
+from components.tr_api import INSTRUMENT_DETAILS_TTL, TRConnection
+
+
+class _FakeApi:
+    """Answers subscriptions newest first, like a server that is slow on old requests."""
+
+    def __init__(self):
+        self.requested = []
+        self.in_flight = []
+        self.max_in_flight = 0
+        self.subscriptions = {}
+        self.unsubscribed = []
+        self._sent = asyncio.Event()
+
+    async def instrument_details(self, isin):
+        sub_id = str(len(self.requested))
+        self.requested.append(isin)
+        self.subscriptions[sub_id] = {"type": "instrument", "id": isin}
+        self.in_flight.append((sub_id, isin))
+        self.max_in_flight = max(self.max_in_flight, len(self.in_flight))
+        self._sent.set()
+        return sub_id
+
+    async def recv(self):
+        while not self.in_flight:
+            self._sent.clear()
+            await self._sent.wait()
+        await asyncio.sleep(0)  # let the other requests be sent first
+        sub_id, isin = self.in_flight.pop()
+        return sub_id, {}, {"shortName": f"Name {isin}", "typeId": "stock", "imageId": f"logos/{isin}/v2"}
+
+    async def unsubscribe(self, sub_id):
+        self.subscriptions.pop(sub_id, None)
+        self.unsubscribed.append(sub_id)
+
+
+def _connection():
+    conn = TRConnection.__new__(TRConnection)
+    conn.api = _FakeApi()
+    conn._subscription_manager = None
+    return conn
+
+
+def test_responses_are_matched_by_subscription_id():
+    conn = _connection()
+    keys = [f"ISIN{i}" for i in range(7)]
+
+    async def collect():
+        return {k: r async for k, r in conn._pipelined_subscriptions(keys, conn.api.instrument_details, window=3)}
+
+    results = asyncio.run(collect())
+    assert {k: r["shortName"] for k, r in results.items()} == {k: f"Name {k}" for k in keys}
+    assert conn.api.max_in_flight == 3
+    assert len(conn.api.unsubscribed) == 7
+
+
+def test_only_missing_or_expired_instruments_are_fetched():
+    conn = _connection()
+    now = time.time()
+    cache = {
+        "FRESH": {"name": "Fresh", "typeId": "fund", "imageId": "", "fetchedAt": now},
+        "OLD": {"name": "Old", "typeId": "fund", "imageId": "", "fetchedAt": now - INSTRUMENT_DETAILS_TTL - 1},
+        "NOTYPE": {"name": "No type", "typeId": "", "imageId": "", "fetchedAt": now},
+    }
+    asyncio.run(conn._refresh_instrument_details(["FRESH", "OLD", "NOTYPE", "NEW", "NEW"], cache))
+
+    assert sorted(conn.api.requested) == ["NEW", "NOTYPE", "OLD"]
+    assert cache["NEW"]["name"] == "Name NEW" and cache["NEW"]["typeId"] == "stock"
+    assert cache["FRESH"]["name"] == "Fresh"
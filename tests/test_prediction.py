@@ -0,0 +1,37 @@
+"""Unit tests for the model-prediction columns."""
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+import core.features
+from core.prediction import predict_frame, save_model
+
+
+def _frame(n=200):
+    rng = np.random.default_rng(0)
+    price = 100 + np.cumsum(rng.normal(size=n))
+    return pd.DataFrame({"price": price, "sma_20": pd.Series(price).rolling(20, min_periods=1).mean().values},
+                        index=pd.date_range("2020-01-01", periods=n, name="Date"))
+
+
+def test_predictions_follow_saved_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.features, "FEATURE_CACHE_DIR", tmp_path / "features")
+    df = _frame()
+    model_path, meta_path = str(tmp_path / "model.joblib"), str(tmp_path / "model.json")
+    assert predict_frame(df, model_path, meta_path) is None
+
+    X, y = df[["price", "sma_20"]].iloc[:-1], df["price"].shift(-1).iloc[:-1]
+    model = lgb.LGBMRegressor(n_estimators=10, verbosity=-1).fit(X, y)
+    save_model(model, ["price", "sma_20"], [], 1, model_path, meta_path)
+
+    preds = predict_frame(df, model_path, meta_path)
+    assert list(preds.columns) == ["model_pred", "model_pred_return"]
+    np.testing.assert_allclose(preds["model_pred"].values, model.predict(df[["price", "sma_20"]]), rtol=1e-5)
+    np.testing.assert_allclose(preds["model_pred_return"], preds["model_pred"] / df["price"] - 1)
+
+    # Retraining replaces the file -> new hash, new predictions
+    model = lgb.LGBMRegressor(n_estimators=3, verbosity=-1).fit(X, y)
+    save_model(model, ["price", "sma_20"], [], 1, model_path, meta_path)
+    retrained = predict_frame(df, model_path, meta_path)
+    np.testing.assert_allclose(retrained["model_pred"].values, model.predict(df[["price", "sma_20"]]), rtol=1e-5)
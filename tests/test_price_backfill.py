@@ -0,0 +1,59 @@
+"""Grouped multi-ticker backfill in get_prices_for_isins."""
+
+from datetime import datetime
+
+import pandas as pd
+
+import components.instrument_store as instrument_store
+import components.portfolio_history as ph
+import components.price_store as price_store
+from components.market_data import MarketDataError, MarketDataProvider, set_provider
+
+
+class _CountingProvider(MarketDataProvider):
+    name = "fake"
+
+    def __init__(self):
+        self.batches = []
+
+    def history(self, symbol, start=None, end=None, period=None):
+        raise AssertionError("backfill should use history_many")
+
+    def history_many(self, symbols, start=None, end=None):
+        self.batches.append(list(symbols))
+        index = pd.date_range("2024-01-01", "2024-01-10", freq="B")
+        return {s: pd.DataFrame({"Close": [float(i + 10 * k) for i in range(len(index))]}, index=index)
+                for k, s in enumerate(symbols)}
+
+    def metadata(self, symbol):
+        return {"currency": "EUR"}
+
+    def quote(self, symbol):
+        raise MarketDataError("not served")
+
+    def fx_rate(self, pair):
+        raise MarketDataError("not served")
+
+
+def test_backfill_groups_symbols(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, "PRICE_DB_FILE", tmp_path / "prices.sqlite")
+    monkeypatch.setattr(price_store, "LEGACY_JSON_FILE", tmp_path / "price_cache.json")
+    monkeypatch.setattr(price_store, "_schema_ready_pid", None)
+    monkeypatch.setattr(price_store, "_prices", {})
+    monkeypatch.setattr(price_store, "_pending", {})
+    monkeypatch.setattr(instrument_store, "INSTRUMENT_DB_FILE", tmp_path / "instruments.sqlite")
+    monkeypatch.setattr(instrument_store, "_schema_ready_pid", None)
+    monkeypatch.setattr(instrument_store, "_loaded_pid", None)
+    monkeypatch.setattr(ph, "resolve_isin_symbols", lambda names: {isin: f"SYM{isin[-1]}" for isin in names})
+    provider = _CountingProvider()
+    set_provider(provider)
+    try:
+        isins = {"DE000000000A": "A", "DE000000000B": "B", "DE000000000C": "C"}
+        dates = [datetime(2024, 1, 3), datetime(2024, 1, 6)]  # the 6th is a Saturday
+        prices = ph.get_prices_for_isins(isins, dates)
+    finally:
+        set_provider(None)
+
+    assert provider.batches == [["SYMA", "SYMB", "SYMC"]]
+    assert prices["DE000000000A"] == {"2024-01-03": 2.0, "2024-01-06": 4.0}
+    assert prices["DE000000000C"]["2024-01-06"] == 24.0
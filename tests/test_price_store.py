@@ -0,0 +1,37 @@
+"""Unit tests for the SQLite price store (write-behind and JSON migration)."""
+
+import json
+
+import components.price_store as price_store
+
+
+def _use_tmp_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, "PRICE_DB_FILE", tmp_path / "prices.sqlite")
+    monkeypatch.setattr(price_store, "LEGACY_JSON_FILE", tmp_path / "price_cache.json")
+    monkeypatch.setattr(price_store, "_schema_ready_pid", None)
+    monkeypatch.setattr(price_store, "_prices", {})
+    monkeypatch.setattr(price_store, "_pending", {})
+    monkeypatch.setattr(price_store, "_pending_rows", 0)
+
+
+def test_migrates_legacy_json(tmp_path, monkeypatch):
+    _use_tmp_store(tmp_path, monkeypatch)
+    legacy = tmp_path / "price_cache.json"
+    legacy.write_text(json.dumps({"IE00B5BMR087": {"2024-01-15": 501.61, "2024-06-15": 571.56}}))
+
+    assert price_store.get_prices("IE00B5BMR087", ["2024-01-15", "2024-02-01"]) == {"2024-01-15": 501.61}
+    assert not legacy.exists()
+    assert (tmp_path / "price_cache.json.migrated").exists()
+
+
+def test_write_behind(tmp_path, monkeypatch):
+    _use_tmp_store(tmp_path, monkeypatch)
+    price_store.put_prices("DE0007030009", {"2024-01-02": 250.0, "2024-01-03": 251.5})
+    # Visible immediately in this process, not yet on disk
+    assert price_store.get_price("DE0007030009", "2024-01-03") == 251.5
+    rows = price_store._conn().execute("SELECT COUNT(*) FROM prices").fetchone()[0]
+    assert rows == 0
+
+    assert price_store.flush() == 2
+    monkeypatch.setattr(price_store, "_prices", {})
+    assert price_store.get_isin_prices("DE0007030009") == {"2024-01-02": 250.0, "2024-01-03": 251.5}
@@ -0,0 +1,63 @@
+"""Live quotes for many positions: grouped requests and a short-lived cache."""
+
+import pytest
+
+import components.portfolio_history as ph
+from components.market_data import MarketDataError, MarketDataProvider, set_provider
+
+
+class _QuoteProvider(MarketDataProvider):
+    name = "fake"
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.requests = []
+
+    def quote_many(self, symbols):
+        self.requests.append(sorted(symbols))
+        return {s: self.prices[s] for s in symbols if s in self.prices}
+
+    def history(self, symbol, start=None, end=None, period=None):
+        raise MarketDataError("not served")
+
+    def quote(self, symbol):
+        raise MarketDataError("not served")
+
+    def fx_rate(self, pair):
+        raise MarketDataError("not served")
+
+    def metadata(self, symbol):
+        return {}
+
+
+@pytest.fixture
+def quotes(monkeypatch):
+    monkeypatch.setattr(ph, "_quote_cache", {})
+    monkeypatch.setattr(ph, "get_fx_rates", lambda: {"EURUSD": 1.25})
+    monkeypatch.setattr(ph, "_yahoo_currency", lambda symbol: "EUR")
+    provider = _QuoteProvider({"AAPL": 200.0, "IE00B4L5Y983": 90.0})
+    set_provider(provider)
+    yield provider
+    set_provider(None)
+
+
+def test_positions_are_quoted_in_one_request(quotes, monkeypatch):
+    positions = [
+        {"isin": "US0378331005", "name": "Apple", "quantity": 2, "invested": 300},
+        {"isin": "IE00B4L5Y983", "name": "MSCI World", "quantity": 10, "invested": 800},
+        {"isin": "XX0000000000", "name": "Unknown", "quantity": 1, "invested": 50},
+    ]
+    updated = ph.update_position_values(positions)
+
+    assert quotes.requests == [["AAPL", "IE00B4L5Y983", "XX0000000000"]]
+    assert [p["value"] for p in updated] == [320.0, 900.0, 50]  # USD converted; no quote: invested
+
+    # Within QUOTE_TTL every caller reuses the quotes, failures included
+    assert ph.get_current_price_eur("IE00B4L5Y983") == (90.0, "IE00B4L5Y983")
+    assert ph.get_current_price_eur("XX0000000000") is None
+    assert len(quotes.requests) == 1
+
+    # Expired quotes are fetched again
+    monkeypatch.setattr(ph, "QUOTE_TTL", 0)
+    ph.get_current_price_eur("IE00B4L5Y983")
+    assert quotes.requests[-1] == ["IE00B4L5Y983"]
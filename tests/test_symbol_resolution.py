@@ -0,0 +1,132 @@
+"""Grouped OpenFIGI lookups, concurrent suffix probing and cached failures."""
+
+import time
+
+import pandas as pd
+import pytest
+
+import components.instrument_store as instrument_store
+import components.portfolio_history as ph
+from components.market_data import MarketDataError, MarketDataProvider, set_provider
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class _ProbeProvider(MarketDataProvider):
+    name = "fake"
+
+    def __init__(self, listed, slow=(), broken=()):
+        self.listed = listed
+        self.slow = slow
+        self.broken = broken
+        self.probed = []
+
+    def metadata(self, symbol):
+        return {}
+
+    def history(self, symbol, start=None, end=None, period=None):
+        self.probed.append(symbol)
+        if symbol in self.slow:
+            time.sleep(0.2)
+        if symbol in self.broken:
+            raise MarketDataError("exchange down")
+        if symbol in self.listed:
+            return pd.DataFrame({"Close": [1.0]}, index=pd.to_datetime(["2024-01-02"]))
+        return pd.DataFrame({"Close": []})
+
+    def quote(self, symbol):
+        raise MarketDataError("not served")
+
+    def fx_rate(self, pair):
+        raise MarketDataError("not served")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrument_store, "INSTRUMENT_DB_FILE", tmp_path / "instruments.sqlite")
+    monkeypatch.setattr(instrument_store, "LEGACY_SYMBOL_FILE", tmp_path / "isin_symbol_cache.json")
+    monkeypatch.setattr(instrument_store, "_schema_ready_pid", None)
+    monkeypatch.setattr(instrument_store, "_loaded_pid", None)
+
+
+def test_resolve_batches_and_caches_failures(store, monkeypatch):
+    posts = []
+
+    def post(url, headers=None, json=None, timeout=None):
+        posts.append([job["idValue"] for job in json])
+        return _Response([
+            {"data": [{"ticker": "AAA", "exchCode": "GY"}]} if job["idValue"] == "DE000000000A" else {"warning": "No identifier found."}
+            for job in json
+        ])
+
+    monkeypatch.setattr(ph.requests, "post", post)
+    provider = _ProbeProvider(listed={"FR000000000B.PA"})
+    set_provider(provider)
+    try:
+        names = {"DE000000000A": "A", "FR000000000B": "B", "XX000000000C": "C"}
+        assert ph.resolve_isin_symbols(names) == {
+            "DE000000000A": "AAA.DE", "FR000000000B": "FR000000000B.PA", "XX000000000C": None,
+        }
+        assert posts == [list(names)]  # one request for all three
+        # The likely suffix hit first, so the other exchanges were never probed
+        assert [p for p in provider.probed if p.startswith("FR")] == ["FR000000000B.PA"]
+
+        # Everything is cached now, including the failure
+        provider.probed.clear()
+        assert ph.resolve_isin_symbols(names)["XX000000000C"] is None
+        assert posts == [list(names)] and provider.probed == []
+
+        # An expired failure is looked up again
+        instrument_store.update("XX000000000C", symbol_failed_at=time.time() - ph.NEGATIVE_SYMBOL_TTL - 1)
+        ph.resolve_isin_symbols(names)
+        assert posts[-1] == ["XX000000000C"]
+    finally:
+        set_provider(None)
+
+
+def test_probe_prefers_the_higher_priority_exchange():
+    # .L answers first, but .DE comes first in the priority list
+    provider = _ProbeProvider(listed={"IE000000000D.DE", "IE000000000D.L"}, slow={"IE000000000D.DE"})
+    set_provider(provider)
+    try:
+        assert ph._probe_suffixes("IE000000000D", [".DE", ".L", ".AS"]) == "IE000000000D.DE"
+    finally:
+        set_provider(None)
+
+
+def test_request_failures_are_not_cached_as_missing(store, monkeypatch):
+    figi_down = []
+
+    def post(url, headers=None, json=None, timeout=None):
+        if figi_down:
+            raise ConnectionError("OpenFIGI down")
+        return _Response([{"warning": "No identifier found."} for _ in json])
+
+    monkeypatch.setattr(ph.requests, "post", post)
+    monkeypatch.setattr(ph, "call_with_retries", lambda fn, provider=None: fn())
+    set_provider(_ProbeProvider(listed=set(), broken={"XX000000000C.L"}))
+    try:
+        # One exchange failed: the ISIN may be listed there
+        assert ph.resolve_isin_symbols({"XX000000000C": "C"}) == {"XX000000000C": None}
+        assert instrument_store.get("XX000000000C") is None
+
+        # Every exchange answered, but OpenFIGI did not
+        set_provider(_ProbeProvider(listed=set()))
+        figi_down.append(True)
+        ph.resolve_isin_symbols({"XX000000000C": "C"})
+        assert instrument_store.get("XX000000000C") is None
+
+        # Both answered: now the failure is remembered
+        figi_down.clear()
+        ph.resolve_isin_symbols({"XX000000000C": "C"})
+        assert instrument_store.get("XX000000000C")["symbol_failed_at"] is not None
+    finally:
+        set_provider(None)
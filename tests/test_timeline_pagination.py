@@ -0,0 +1,76 @@
+"""Delta timeline loads stop at the cache overlap and prefetch the next page."""
+
+import asyncio
+
+from components.tr_api import TIMELINE_OVERLAP_MARGIN, TRConnection
+
+PAGE_SIZE = 4
+
+
+class _TimelineApi:
+    """Serves a timeline of numbered transactions, newest first, PAGE_SIZE per page."""
+
+    def __init__(self, count):
+        self.items = [{"id": f"t{i}", "timestamp": f"2024-01-01T00:00:{i:02d}", "title": "x"}
+                      for i in range(count, 0, -1)]
+        self.subscriptions = {}
+        self.requested_pages = []
+        self.unsubscribed = []
+        self._answers = asyncio.Queue()
+
+    async def timeline_transactions(self, after=None):
+        start = int(after or 0)
+        sub_id = str(len(self.requested_pages))
+        self.requested_pages.append(start // PAGE_SIZE)
+        self.subscriptions[sub_id] = {"type": "timelineTransactions"}
+        end = start + PAGE_SIZE
+        page = {"items": self.items[start:end], "cursors": {"after": str(end) if end < len(self.items) else None}}
+        self._answers.put_nowait((sub_id, page))
+        return sub_id
+
+    async def recv(self):
+        sub_id, page = await self._answers.get()
+        return sub_id, self.subscriptions.get(sub_id), page
+
+    async def unsubscribe(self, sub_id):
+        self.subscriptions.pop(sub_id, None)
+        self.unsubscribed.append(sub_id)
+
+
+def _connection(api, cached):
+    conn = TRConnection.__new__(TRConnection)
+    conn.api = api
+    conn.is_connected = True
+    conn._subscription_manager = None
+    conn._load_transactions_cache = lambda: cached
+    return conn
+
+
+def test_delta_load_stops_at_the_overlap():
+    api = _TimelineApi(40)
+    cached = [dict(item, shares=1.0) for item in api.items[6:]]  # 6 new transactions since last sync
+    conn = _connection(api, cached)
+
+    async def sync():
+        transactions = await conn._fetch_timeline_transactions(delta_load=True)
+        return transactions, dict(api.subscriptions)
+
+    transactions, open_subscriptions = asyncio.run(sync())
+
+    # Page 0: 4 new; page 1: 2 new + 2 cached; page 2 reaches the margin
+    assert TIMELINE_OVERLAP_MARGIN <= 2 + PAGE_SIZE
+    assert api.requested_pages[:3] == [0, 1, 2]
+    assert len(api.requested_pages) <= 4  # at most one prefetched page beyond
+    assert open_subscriptions == {}  # the prefetch was cancelled and unsubscribed before returning
+    assert [t["id"] for t in transactions] == [item["id"] for item in api.items]
+    assert all(t.get("shares") == 1.0 for t in transactions[6:])  # cached copies kept
+
+
+def test_full_load_reads_every_page():
+    api = _TimelineApi(10)
+    conn = _connection(api, [])
+
+    transactions = asyncio.run(conn._fetch_timeline_transactions(delta_load=False))
+
+    assert api.requested_pages == [0, 1, 2]
+    assert len(transactions) == 10
@@ -0,0 +1,100 @@
+"""Routing pytr websocket messages to their subscriptions."""
+
+import asyncio
+
+from components.tr_subscriptions import SubscriptionManager
+
+
+class _TRError(ValueError):
+    def __init__(self, subscription_id):
+        self.subscription_id = subscription_id
+
+
+class _Socket:
+    """A fake pytr api whose test code decides when each message arrives."""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.unsubscribed = []
+        self.incoming = asyncio.Queue()
+
+    async def send(self, name):
+        sub_id = str(len(self.subscriptions) + len(self.unsubscribed))
+        self.subscriptions[sub_id] = {"type": name}
+        return sub_id
+
+    async def recv(self):
+        sub_id, payload = await self.incoming.get()
+        if isinstance(payload, Exception):
+            self.subscriptions.pop(sub_id, None)  # pytr unsubscribes on "E"
+            raise payload
+        return sub_id, self.subscriptions.get(sub_id), payload
+
+    async def unsubscribe(self, sub_id):
+        self.subscriptions.pop(sub_id, None)
+        self.unsubscribed.append(sub_id)
+
+
+def test_concurrent_requests_get_their_own_responses():
+    async def scenario():
+        socket = _Socket()
+        subs = SubscriptionManager(socket)
+        portfolio = asyncio.ensure_future(subs.request(socket.send("compactPortfolio")))
+        cash = asyncio.ensure_future(subs.request(socket.send("cash")))
+        await asyncio.sleep(0.01)
+        # Answers arrive in the opposite order of the requests
+        socket.incoming.put_nowait(("1", [{"amount": 5}]))
+        socket.incoming.put_nowait(("0", {"positions": []}))
+        result = await asyncio.gather(portfolio, cash)
+        subs.close()
+        return socket, result
+
+    socket, (portfolio, cash) = asyncio.run(scenario())
+    assert portfolio == {"positions": []} and cash == [{"amount": 5}]
+    assert sorted(socket.unsubscribed) == ["0", "1"] and socket.subscriptions == {}
+
+
+def test_errors_and_timeouts_stay_with_their_subscription():
+    async def scenario():
+        socket = _Socket()
+        subs = SubscriptionManager(socket)
+        failing = asyncio.ensure_future(subs.request(socket.send("instrument")))
+        slow = asyncio.ensure_future(subs.request(socket.send("timeline"), timeout=0.05))
+        fine = asyncio.ensure_future(subs.request(socket.send("cash")))
+        await asyncio.sleep(0.01)
+        socket.incoming.put_nowait(("0", _TRError("0")))
+        socket.incoming.put_nowait(("2", []))
+        results = await asyncio.gather(failing, slow, fine, return_exceptions=True)
+        subs.close()
+        return socket, results
+
+    socket, (failing, slow, fine) = asyncio.run(scenario())
+    assert isinstance(failing, _TRError)
+    assert isinstance(slow, asyncio.TimeoutError)
+    assert fine == []
+    assert "1" in socket.unsubscribed and socket.subscriptions == {}  # the timed-out one too
+
+
+def test_close_wakes_waiters_and_request_many_unsubscribes():
+    async def scenario():
+        socket = _Socket()
+        subs = SubscriptionManager(socket)
+        waiting = asyncio.ensure_future(subs.request(socket.send("cash")))
+        await asyncio.sleep(0.01)
+        subs.close()
+        waited = await asyncio.wait_for(asyncio.gather(waiting, return_exceptions=True), timeout=1)
+
+        # Leaving request_many early still unsubscribes the requests in flight
+        responses = subs.request_many(["a", "b"], lambda key: socket.send(key), window=2)
+        first = asyncio.ensure_future(responses.__anext__())
+        await asyncio.sleep(0.01)
+        socket.incoming.put_nowait(("1", "A"))
+        await first
+        await responses.aclose()
+        subs.close()
+        return socket, waited[0], first.result()
+
+    socket, waited, first = asyncio.run(scenario())
+    assert isinstance(waited, ConnectionError)
+    assert first == ("a", "A")
+    assert sorted(socket.unsubscribed) == ["0", "1", "2"] and socket.subscriptions == {}